@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Vectorized Alpha Shapes
+Concave boundaries of 2D surface clusters (roads, sidewalks) from a single
+Delaunay triangulation, replacing the pure-Python alphashape package
+
+1. scipy.spatial.Delaunay over the cluster points
+2. Circumradius of every triangle in NumPy; triangles wider than the alpha
+   radius are dropped
+3. Edges used by exactly one kept triangle form the boundary
+4. Boundary edges are chained into shells and holes (polygon_rings)
+
+The alpha parameter is a circumradius in meters: larger values give a
+tighter-fitting (less concave) boundary. Note that alphashape.alphashape
+used alpha = 1 / radius.
+"""
+
+import numpy as np
+from scipy.spatial import Delaunay
+from shapely.geometry import Polygon, MultiPolygon
+from polygon_rings import boundary_edges, edges_to_rings, rings_to_polygons
+
+def triangle_circumradii(points, triangles):
+    """
+    (T,) circumradius of every triangle (inf for degenerate triangles)
+
+    Returns:
+        radii, signed doubled areas (positive for counter-clockwise triangles)
+    """
+    a, b, c = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    ab = np.hypot(*(b - a).T)
+    bc = np.hypot(*(c - b).T)
+    ca = np.hypot(*(a - c).T)
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radii = ab * bc * ca / (2.0 * np.abs(cross))
+    radii[~np.isfinite(radii)] = np.inf
+    return radii, cross
+
+def alpha_shape(points, alpha, min_area=0.0):
+    """
+    Alpha shape of a 2D point set
+
+    Args:
+        points: (N, 2) coordinates
+        alpha: Maximum triangle circumradius in meters
+        min_area: Drop shells and holes smaller than this (m²)
+
+    Returns:
+        Polygon or MultiPolygon (with holes), or None if no triangle passes
+    """
+    points = np.ascontiguousarray(points[:, :2], dtype=np.float64)
+    if len(points) < 3:
+        return None
+
+    triangles = Delaunay(points).simplices
+    radii, cross = triangle_circumradii(points, triangles)
+    keep = radii < alpha
+    triangles, cross = triangles[keep], cross[keep]
+    if len(triangles) == 0:
+        return None
+
+    # Orient every triangle counter-clockwise so boundary edges have the interior on their left
+    clockwise = cross < 0
+    triangles[clockwise] = triangles[clockwise][:, [0, 2, 1]]
+
+    rings = edges_to_rings(boundary_edges(triangles))
+    polygons = rings_to_polygons(points, rings, min_area)
+    if not polygons:
+        return None
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+def polygon_parts(shape):
+    """List the Polygons of an alpha shape result (empty for None)"""
+    if shape is None:
+        return []
+    if isinstance(shape, Polygon):
+        return [shape]
+    return list(shape.geoms)
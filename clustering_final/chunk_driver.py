@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Single-Load Multi-Extractor Chunk Driver
+Runs every class extractor of one chunk from a single read of its
+filtred_by_classes tree
+
+- Each class LAZ is decoded once into the columnar point cache
+- Extractors run concurrently in a process pool; workers memory-map the
+  cached (N, 3) XYZ array, so the decoded points are shared through the page cache
+  instead of being decompressed or pickled per extractor
+- Chunk wall time ~ slowest extractor instead of the sum of all of them
+"""
+
+import os
+import io
+import sys
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from extractor_common import resolve_chunk_path, class_file
+from point_cache import load_xyz
+from ground_model import load_ground_model
+from tiled_dbscan import set_worker_budget
+
+# Extractor tasks: (task name, input class)
+EXTRACTOR_TASKS = [
+    ("buildings", "6_Buildings"),
+    ("vegetation", "8_OtherVegetation"),
+    ("wires", "11_Wires"),
+    ("masts", "12_Masts"),
+    ("roads", "2_Roads"),
+    ("sidewalks", "3_Sidewalks"),
+]
+
+def warm_point_cache(classes_base):
+    """
+    Decode every class LAZ of the chunk once
+
+    Returns:
+        point_counts: dict mapping class name to its point count
+    """
+    point_counts = {}
+    for _, class_name in EXTRACTOR_TASKS:
+        laz_file = class_file(classes_base, class_name)
+        if class_name in point_counts or not os.path.exists(laz_file):
+            continue
+        try:
+            point_counts[class_name] = len(load_xyz(laz_file))
+        except Exception as e:
+            print(f"⚠️  Failed to load {class_name}: {e}")
+    return point_counts
+
+def run_extractor(task_name, class_name, classes_base, chunk_name):
+    """
+    Run one extractor against the warm cache (executes in a worker process)
+
+    Returns:
+        (task_name, result count, elapsed seconds, captured log, error message
+         or None when the extractor completed)
+    """
+    log = io.StringIO()
+    start = time.time()
+    error = None
+
+    with contextlib.redirect_stdout(log):
+        try:
+            if task_name == "masts":
+                # Masts are cleaned from their Stage 3 centroids, no points needed
+                from python_mast_enhanced import clean_chunk_masts
+                result = clean_chunk_masts(classes_base)
+            else:
+                points_3d = load_xyz(class_file(classes_base, class_name))
+
+                if task_name == "buildings":
+                    from python_instance_enhanced import extract_instance_buildings_enhanced
+                    result = extract_instance_buildings_enhanced(classes_base, points_3d)
+                elif task_name == "vegetation":
+                    from python_vegetation_enhanced import extract_vegetation_polygons_enhanced
+                    result = extract_vegetation_polygons_enhanced(classes_base, points_3d)
+                elif task_name == "wires":
+                    from python_wire_enhanced import extract_wire_lines_enhanced
+                    result = extract_wire_lines_enhanced(classes_base, points_3d)
+                else:
+                    from python_road_boundary import extract_surface_boundaries
+                    class_id = int(class_name.split('_')[0])
+                    result = extract_surface_boundaries(chunk_name, class_name, class_id,
+                                                        classes_base=classes_base, points=points_3d)
+        except Exception as e:
+            print(f"❌ {task_name} extractor failed: {e}")
+            result = 0
+            error = str(e) or type(e).__name__
+
+    return task_name, result or 0, time.time() - start, log.getvalue(), error
+
+def process_chunk(chunk_path, max_workers=None):
+    """
+    Run all available extractors of a chunk concurrently
+
+    Args:
+        chunk_path: Chunk root or its filtred_by_classes directory
+        max_workers: Process pool size (default: one per task, capped at CPU count)
+
+    Returns:
+        (results: dict mapping task name to extracted feature count,
+         failed: names of the tasks whose extractor raised)
+    """
+    classes_base, chunk_name = resolve_chunk_path(chunk_path)
+    if classes_base is None:
+        print(f"❌ Invalid path structure. Expected chunk directory or filtred_by_classes directory")
+        return {}, []
+
+    print(f"\n🚀 === SINGLE-LOAD CHUNK EXTRACTION ===")
+    print(f"📍 Chunk: {chunk_name}")
+    print(f"📂 Base path: {classes_base}")
+
+    # Step 1: Decode each class once
+    print(f"\n🔄 Step 1: Loading class point clouds")
+    start = time.time()
+    point_counts = warm_point_cache(classes_base)
+    for class_name, count in point_counts.items():
+        print(f"  📊 {class_name}: {count:,} points")
+    print(f"  ⏱️  Loaded in {time.time() - start:.1f}s")
+
+    # Ground model once per chunk; extractors load the stored raster
+    ground = load_ground_model(classes_base)
+    if ground is not None:
+        rows, cols = ground.grid.shape
+        print(f"  🗺️  Ground model: {cols}x{rows} cells of {ground.cell_size}m")
+
+    tasks = []
+    for task_name, class_name in EXTRACTOR_TASKS:
+        if task_name == "masts":
+            if os.path.exists(f"{classes_base}/12_Masts/centroids/12_Masts_centroids.json"):
+                tasks.append((task_name, class_name))
+        elif point_counts.get(class_name, 0) > 0:
+            tasks.append((task_name, class_name))
+
+    if not tasks:
+        print(f"❌ No extractable classes found")
+        return {}, []
+
+    # Step 2: Run extractors concurrently over the shared columns
+    if max_workers is None:
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+    print(f"\n🔄 Step 2: Running {len(tasks)} extractors ({max_workers} workers)")
+
+    results = {}
+    failed = []
+    start = time.time()
+    # Extractors share the CPUs: each tiled_dbscan gets its slice of them
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=set_worker_budget,
+                             initargs=((os.cpu_count() or 1) // max_workers,)) as executor:
+        futures = [executor.submit(run_extractor, task_name, class_name, classes_base, chunk_name)
+                   for task_name, class_name in tasks]
+        for future in as_completed(futures):
+            task_name, count, elapsed, log, error = future.result()
+            results[task_name] = count
+            print(log, end='')
+            if error is not None:
+                failed.append(task_name)
+                print(f"  ❌ {task_name} failed after {elapsed:.1f}s")
+            else:
+                print(f"  ⏱️  {task_name} finished in {elapsed:.1f}s")
+
+    print(f"\n📊 === CHUNK SUMMARY ({chunk_name}) ===")
+    for task_name, _ in EXTRACTOR_TASKS:
+        if task_name in results:
+            print(f"  {task_name:<12} {results[task_name]:>6}{'  ❌ failed' if task_name in failed else ''}")
+    print(f"  ⏱️  Extraction wall time: {time.time() - start:.1f}s")
+
+    return results, failed
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 chunk_driver.py <chunk_path>")
+        print("Examples:")
+        print("  python3 chunk_driver.py /path/to/chunk_1")
+        print("  python3 chunk_driver.py /path/to/chunk_1/compressed/filtred_by_classes")
+        sys.exit(1)
+
+    chunk_path = sys.argv[1]
+    if not os.path.exists(chunk_path):
+        print(f"❌ Path not found: {chunk_path}")
+        sys.exit(1)
+
+    results, failed = process_chunk(chunk_path)
+    sys.exit(0 if results and not failed else 1)
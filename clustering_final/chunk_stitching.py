@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Cross-Chunk Object Stitching
+Merges object fragments cut by Stage 1 chunk boundaries
+
+Every chunk is clustered independently, so a building, vegetation area, wire
+span or mast straddling a chunk seam comes out as one fragment per chunk.
+This stage works on the per-chunk outputs only (centroids, polygons, lines),
+never on points, so it runs in seconds over all chunks:
+
+1. Load every chunk's centroids / polygons / lines per class
+2. Index the features on a uniform grid by their bounding boxes
+3. Link fragments from different chunks whose geometry touches across the seam
+   (polygons within a tolerance, line endpoints continuing each other,
+   centroids within a merge radius)
+4. Merge each linked group (union-find) and write one stitched file per class
+
+Note: filters.divider chunks follow point order rather than a rectangular
+tiling, so chunk extents overlap and every feature is a seam candidate.
+Chunks from spatial_tiler.py (manifest.json) overlap by a buffer instead:
+features whose centroid lies outside their tile's core are buffer copies of
+an object owned by a neighbor tile. The extractors already drop them from
+the per-chunk outputs; stitching repeats the filter before linking.
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import math
+import numpy as np
+from collections import defaultdict
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from shapely.geometry import MultiPolygon, shape, mapping
+from shapely.ops import unary_union
+from spatial_tiler import load_tile_cores, in_tile_core, feature_centroid
+
+# Per-class stitching tolerances (meters)
+STITCH_RULES = {
+    "6_Buildings": {"polygon_tolerance": 0.5},
+    "8_OtherVegetation": {"polygon_tolerance": 1.0},
+    # Neighboring crowns touch by construction (watershed): only crowns that
+    # overlap are fragments of the same tree
+    "7_Trees": {"centroid_radius": 2.5, "polygon_tolerance": 0.0, "polygon_min_overlap": 0.3},
+    "12_Masts": {"centroid_radius": 1.5},
+    "11_Wires": {"line_join_distance": 3.0, "line_max_angle_deg": 25.0},
+}
+DEFAULT_RULE = {
+    "polygon_tolerance": 0.5,
+    # Share of the smaller polygon's area two fragments must overlap (0 = distance only)
+    "polygon_min_overlap": 0.0,
+    "centroid_radius": 1.5,
+    "line_join_distance": 3.0,
+    "line_max_angle_deg": 25.0,
+}
+
+# Spatial index cell size (meters)
+INDEX_CELL_SIZE = 25.0
+
+def log_info(message):
+    print(f"[INFO] {message}")
+
+def log_warn(message):
+    print(f"[WARN] {message}")
+
+def log_success(message):
+    print(f"[SUCCESS] {message}")
+
+def _rule(class_name, key):
+    return STITCH_RULES.get(class_name, {}).get(key, DEFAULT_RULE[key])
+
+def _chunk_sort_key(chunk_name):
+    match = re.search(r'(\d+)$', chunk_name)
+    return (int(match.group(1)) if match else sys.maxsize, chunk_name)
+
+def find_chunk_outputs(chunks_root):
+    """
+    Locate per-chunk extractor outputs
+
+    Returns:
+        outputs: {class_name: {"polygons"|"lines"|"centroids": [(chunk, path), ...]}}
+    """
+    outputs = defaultdict(lambda: defaultdict(list))
+    chunk_dirs = sorted(glob.glob(os.path.join(chunks_root, "chunk_*")),
+                        key=lambda path: _chunk_sort_key(os.path.basename(path)))
+
+    for chunk_dir in chunk_dirs:
+        chunk = os.path.basename(chunk_dir)
+        classes_base = os.path.join(chunk_dir, "compressed", "filtred_by_classes")
+        for class_dir in sorted(glob.glob(os.path.join(classes_base, "*"))):
+            class_name = os.path.basename(class_dir)
+
+            for kind in ("polygons", "lines"):
+                path = os.path.join(class_dir, kind, f"{class_name}_{kind}.geojson")
+                if os.path.exists(path):
+                    outputs[class_name][kind].append((chunk, path))
+
+            # Prefer cleaned centroids (python_mast_enhanced.py) when available
+            clean = os.path.join(class_dir, "centroids", f"{class_name}_centroids_clean.json")
+            raw = os.path.join(class_dir, "centroids", f"{class_name}_centroids.json")
+            if os.path.exists(clean):
+                outputs[class_name]["centroids"].append((chunk, clean))
+            elif os.path.exists(raw):
+                outputs[class_name]["centroids"].append((chunk, raw))
+
+    return outputs
+
+class _GridIndex:
+    """Uniform grid over feature bounding boxes"""
+
+    def __init__(self, cell_size=INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def insert(self, item, bbox):
+        min_x, min_y, max_x, max_y = bbox
+        for i in range(math.floor(min_x / self.cell_size), math.floor(max_x / self.cell_size) + 1):
+            for j in range(math.floor(min_y / self.cell_size), math.floor(max_y / self.cell_size) + 1):
+                self.cells[(i, j)].append(item)
+
+    def candidate_pairs(self):
+        """Unique (a, b) item pairs sharing at least one cell"""
+        pairs = set()
+        for items in self.cells.values():
+            for i in range(len(items)):
+                for j in range(i + 1, len(items)):
+                    a, b = items[i], items[j]
+                    pairs.add((a, b) if a < b else (b, a))
+        return sorted(pairs)
+
+def _bbox(coords, pad=0.0):
+    coords = np.asarray(coords, dtype=float)[:, :2]
+    min_xy = coords.min(axis=0) - pad
+    max_xy = coords.max(axis=0) + pad
+    return (min_xy[0], min_xy[1], max_xy[0], max_xy[1])
+
+def _bboxes_within(a, b, distance):
+    return not (a[2] + distance < b[0] or b[2] + distance < a[0] or
+                a[3] + distance < b[1] or b[3] + distance < a[1])
+
+def _link_groups(items, chunks, bboxes, touches, reach):
+    """
+    Group items whose geometry touches across chunks
+
+    Args:
+        items: Feature list
+        chunks: Source chunk per item
+        bboxes: Bounding box per item
+        touches: touches(i, j) -> bool exact geometry test
+        reach: Maximum link distance (bbox prefilter)
+
+    Returns:
+        groups: list of item index lists (singletons for untouched items)
+    """
+    index = _GridIndex(max(INDEX_CELL_SIZE, reach))
+    for i, bbox in enumerate(bboxes):
+        index.insert(i, bbox)
+
+    edges = [(i, j) for i, j in index.candidate_pairs()
+             if chunks[i] != chunks[j] and _bboxes_within(bboxes[i], bboxes[j], reach) and touches(i, j)]
+
+    n = len(items)
+    rows = [i for i, _ in edges]
+    cols = [j for _, j in edges]
+    graph = coo_matrix((np.ones(len(edges), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+
+    groups = defaultdict(list)
+    for i, c in enumerate(component):
+        groups[c].append(i)
+    return [groups[c] for c in sorted(groups, key=lambda c: groups[c][0])]
+
+def _polygon_aspect_ratio(polygon):
+    rectangle = polygon.minimum_rotated_rectangle
+    coords = list(rectangle.exterior.coords)
+    edges = sorted(math.dist(coords[k], coords[k + 1]) for k in range(len(coords) - 1))
+    return edges[-1] / edges[0] if edges[0] > 0 else 0.0
+
+def _polygon_geometry(polygon):
+    """GeoJSON geometry of a shapely polygon, holes kept, coordinates rounded to mm"""
+    geometry = mapping(polygon)
+    rings = [[[round(x, 3), round(y, 3)] for x, y, *_ in ring] for ring in geometry["coordinates"]]
+    return {"type": "Polygon", "coordinates": rings}
+
+def stitch_polygons(features, chunks, class_name):
+    """
+    Merge polygon fragments closer than the class tolerance (and, where the
+    class sets polygon_min_overlap, overlapping by that share of the smaller one)
+
+    A merged group whose union stays split (fragments linked by distance but
+    not touching after seam closing) yields one feature per part; every
+    fragment's point_count goes to the part covering most of it.
+    """
+    tolerance = _rule(class_name, "polygon_tolerance")
+    min_overlap = _rule(class_name, "polygon_min_overlap")
+    shapes = [shape(f["geometry"]).buffer(0) for f in features]
+    bboxes = [s.bounds for s in shapes]
+
+    def fragments(i, j):
+        if shapes[i].distance(shapes[j]) > tolerance:
+            return False
+        if min_overlap <= 0:
+            return True
+        smaller = min(shapes[i].area, shapes[j].area)
+        return smaller > 0 and shapes[i].intersection(shapes[j]).area >= min_overlap * smaller
+
+    groups = _link_groups(features, chunks, bboxes, fragments, tolerance)
+
+    outputs = []
+    merged_count = 0
+    for group in groups:
+        if len(group) == 1:
+            outputs.append((json.loads(json.dumps(features[group[0]])), group))
+            continue
+
+        merged_count += 1
+        # Close seam gaps up to the tolerance
+        union = unary_union([shapes[k] for k in group])
+        if union.geom_type != "Polygon":
+            union = union.buffer(tolerance).buffer(-tolerance)
+        parts = list(union.geoms) if isinstance(union, MultiPolygon) else [union]
+
+        overlap = [[part.intersection(shapes[k]).area for part in parts] for k in group]
+        owner = {k: int(np.argmax(areas)) for k, areas in zip(group, overlap)}
+        for p, part in enumerate(parts):
+            members = [k for k in group if owner[k] == p]
+            sources = [k for k, areas in zip(group, overlap) if areas[p] > 0] or members
+            template = max(sources, key=lambda k: overlap[group.index(k)][p])
+            feature = json.loads(json.dumps(features[template]))
+            properties = feature["properties"]
+            feature["geometry"] = _polygon_geometry(part)
+            properties["area_m2"] = round(part.area, 2)
+            properties["perimeter_m"] = round(part.exterior.length, 2)
+            properties["aspect_ratio"] = round(_polygon_aspect_ratio(part), 2)
+            properties["point_count"] = sum(features[k]["properties"].get("point_count", 0) for k in members)
+            outputs.append((feature, sources))
+
+    stitched = []
+    for feature, sources in outputs:
+        properties = feature["properties"]
+        properties["polygon_id"] = len(stitched) + 1
+        properties["source_chunks"] = sorted({chunks[k] for k in sources}, key=_chunk_sort_key)
+        properties["stitched"] = len(sources) > 1
+        stitched.append(feature)
+
+    return stitched, merged_count
+
+def _endpoint_direction(coords, at_start):
+    """Unit direction pointing out of the line at one of its ends"""
+    coords = np.asarray(coords, dtype=float)[:, :2]
+    if at_start:
+        vector = coords[0] - coords[min(1, len(coords) - 1)]
+    else:
+        vector = coords[-1] - coords[max(len(coords) - 2, 0)]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def _lines_continue(a, b, join_distance, max_angle_deg):
+    """True when an end of line a meets an end of line b heading the opposite way"""
+    min_cos = math.cos(math.radians(max_angle_deg))
+    for a_start in (True, False):
+        for b_start in (True, False):
+            pa = a[0] if a_start else a[-1]
+            pb = b[0] if b_start else b[-1]
+            if math.dist(pa[:2], pb[:2]) > join_distance:
+                continue
+            # Outward directions of continuing ends point against each other
+            if -np.dot(_endpoint_direction(a, a_start), _endpoint_direction(b, b_start)) >= min_cos:
+                return True
+    return False
+
+def _chain_lines(lines):
+    """Concatenate lines end to end, orienting each one to continue the chain"""
+    remaining = sorted(lines, key=len, reverse=True)
+    chain = list(remaining.pop(0))
+    while remaining:
+        best = None
+        for k, line in enumerate(remaining):
+            for reverse in (False, True):
+                candidate = line[::-1] if reverse else line
+                for prepend in (False, True):
+                    gap = math.dist(chain[0][:2], candidate[-1][:2]) if prepend else \
+                        math.dist(chain[-1][:2], candidate[0][:2])
+                    if best is None or gap < best[0]:
+                        best = (gap, k, candidate, prepend)
+        _, k, candidate, prepend = best
+        chain = list(candidate) + chain if prepend else chain + list(candidate)
+        remaining.pop(k)
+    return chain
+
+def _line_length(coords):
+    return sum(math.dist(coords[k - 1], coords[k]) for k in range(1, len(coords)))
+
+def stitch_lines(features, chunks, class_name):
+    """Join line fragments whose endpoints continue each other across a seam"""
+    join_distance = _rule(class_name, "line_join_distance")
+    max_angle = _rule(class_name, "line_max_angle_deg")
+    lines = [f["geometry"]["coordinates"] for f in features]
+    bboxes = [_bbox(line) for line in lines]
+
+    groups = _link_groups(features, chunks, bboxes,
+                          lambda i, j: _lines_continue(lines[i], lines[j], join_distance, max_angle),
+                          join_distance)
+
+    stitched = []
+    merged_count = 0
+    for group in groups:
+        longest = max(group, key=lambda k: features[k]["properties"].get("length_m", 0))
+        feature = json.loads(json.dumps(features[longest]))
+        properties = feature["properties"]
+
+        if len(group) > 1:
+            merged_count += 1
+            coords = _chain_lines([lines[k] for k in group])
+            parts = [features[k]["properties"] for k in group]
+            point_counts = [p.get("point_count", 0) for p in parts]
+
+            feature["geometry"] = {"type": "LineString", "coordinates": coords}
+            properties["length_m"] = round(_line_length(coords), 2)
+            properties["point_count"] = sum(point_counts)
+            if "width_m" in properties:
+                properties["width_m"] = max(p.get("width_m", 0) for p in parts)
+                if properties["width_m"] > 0:
+                    properties["aspect_ratio"] = round(properties["length_m"] / properties["width_m"], 2)
+            if "min_height_m" in properties:
+                properties["min_height_m"] = min(p["min_height_m"] for p in parts)
+                properties["max_height_m"] = max(p["max_height_m"] for p in parts)
+            if "avg_height_m" in properties and sum(point_counts) > 0:
+                properties["avg_height_m"] = round(
+                    sum(p["avg_height_m"] * c for p, c in zip(parts, point_counts)) / sum(point_counts), 2)
+
+        properties["line_id"] = len(stitched) + 1
+        properties["source_chunks"] = sorted({chunks[k] for k in group}, key=_chunk_sort_key)
+        properties["stitched"] = len(group) > 1
+        stitched.append(feature)
+
+    return stitched, merged_count
+
+def stitch_centroids(centroids, chunks, class_name):
+    """Merge centroids closer than the class radius (point-count weighted)"""
+    radius = _rule(class_name, "centroid_radius")
+    xy = [(c["centroid_x"], c["centroid_y"]) for c in centroids]
+    bboxes = [(x, y, x, y) for x, y in xy]
+
+    groups = _link_groups(centroids, chunks, bboxes,
+                          lambda i, j: math.dist(xy[i], xy[j]) <= radius, radius)
+
+    stitched = []
+    merged_count = 0
+    for group in groups:
+        largest = max(group, key=lambda k: centroids[k].get("point_count", 0))
+        centroid = dict(centroids[largest])
+
+        if len(group) > 1:
+            merged_count += 1
+            weights = np.array([max(centroids[k].get("point_count", 0), 1) for k in group], dtype=float)
+            for axis in ("centroid_x", "centroid_y", "centroid_z"):
+                if all(axis in centroids[k] for k in group):
+                    values = np.array([centroids[k][axis] for k in group])
+                    centroid[axis] = round(float(np.average(values, weights=weights)), 3)
+            centroid["point_count"] = sum(centroids[k].get("point_count", 0) for k in group)
+
+        centroid["object_id"] = len(stitched) + 1
+        centroid["source_chunks"] = sorted({chunks[k] for k in group}, key=_chunk_sort_key)
+        centroid["stitched"] = len(group) > 1
+        stitched.append(centroid)
+
+    return stitched, merged_count
+
+def _load_features(files):
+    features, chunks = [], []
+    for chunk, path in files:
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            log_warn(f"Failed to read {path}: {e}")
+            continue
+        for feature in data.get("features", []):
+            if feature.get("geometry", {}).get("coordinates"):
+                features.append(feature)
+                chunks.append(chunk)
+    return features, chunks
+
+def _load_centroids(files):
+    centroids, chunks, template = [], [], None
+    for chunk, path in files:
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            log_warn(f"Failed to read {path}: {e}")
+            continue
+        template = template or data
+        for centroid in data.get("centroids", []):
+            centroids.append(centroid)
+            chunks.append(chunk)
+    return centroids, chunks, template
+
+def _owned_by_tile(xy, chunks, tile_cores):
+    """
+    (N,) bool, features whose centroid lies in the core of their chunk's
+    tile (all True for chunks without a tile)
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+    chunks = np.asarray(chunks)
+    keep = np.ones(len(xy), dtype=bool)
+    for chunk, core in tile_cores.items():
+        members = chunks == chunk
+        if members.any():
+            keep[members] = in_tile_core(xy[members], core)
+    return keep
+
+def stitch_class(class_name, class_outputs, output_dir, tile_cores=None):
+    """
+    Stitch one class across all chunks and write its merged outputs
+
+    Args:
+        tile_cores: {chunk: core extent} of tiled chunks (load_tile_cores);
+                    buffer copies outside their tile's core are dropped
+
+    Returns:
+        summary: {kind: (input count, output count, merged groups)}
+    """
+    summary = {}
+    os.makedirs(output_dir, exist_ok=True)
+
+    for kind, stitcher in (("polygons", stitch_polygons), ("lines", stitch_lines)):
+        files = class_outputs.get(kind, [])
+        if not files:
+            continue
+        features, chunks = _load_features(files)
+        if features and tile_cores:
+            keep = _owned_by_tile([feature_centroid(f) for f in features], chunks, tile_cores)
+            features = [f for f, k in zip(features, keep) if k]
+            chunks = [c for c, k in zip(chunks, keep) if k]
+        if not features:
+            continue
+
+        stitched, merged = stitcher(features, chunks, class_name)
+        output_file = os.path.join(output_dir, f"{class_name}_{kind}.geojson")
+        with open(output_file, 'w') as f:
+            json.dump({
+                "type": "FeatureCollection",
+                "features": stitched,
+                "properties": {
+                    "class": class_name,
+                    "chunk": "stitched",
+                    "source_chunks": sorted(set(chunks), key=_chunk_sort_key),
+                    "extraction_method": "chunk_stitching",
+                    "results": {
+                        "input_features": len(features),
+                        "stitched_features": len(stitched),
+                        "merged_groups": merged
+                    }
+                }
+            }, f, indent=2)
+        summary[kind] = (len(features), len(stitched), merged)
+
+    files = class_outputs.get("centroids", [])
+    if files:
+        centroids, chunks, template = _load_centroids(files)
+        if centroids and tile_cores:
+            keep = _owned_by_tile([(c["centroid_x"], c["centroid_y"]) for c in centroids], chunks, tile_cores)
+            centroids = [c for c, k in zip(centroids, keep) if k]
+            chunks = [c for c, k in zip(chunks, keep) if k]
+        if centroids:
+            stitched, merged = stitch_centroids(centroids, chunks, class_name)
+            data = {key: value for key, value in template.items()
+                    if key not in ("centroids", "utm_bounds", "filtering")}
+            data["chunk"] = "stitched"
+            data["source_chunks"] = sorted(set(chunks), key=_chunk_sort_key)
+            data["results"] = {
+                "input_instances": len(centroids),
+                "instances_found": len(stitched),
+                "merged_groups": merged
+            }
+            data["centroids"] = stitched
+            output_file = os.path.join(output_dir, f"{class_name}_centroids.json")
+            with open(output_file, 'w') as f:
+                json.dump(data, f, indent=2)
+            summary["centroids"] = (len(centroids), len(stitched), merged)
+
+    return summary
+
+def stitch_chunks(chunks_root, output_root=None):
+    """
+    Stitch every class found under a chunks directory
+
+    Args:
+        chunks_root: Directory holding chunk_N/compressed/filtred_by_classes trees
+        output_root: Destination (default: <chunks_root>/stitched)
+
+    Returns:
+        summaries: {class_name: {kind: (input count, output count, merged groups)}}
+    """
+    if output_root is None:
+        output_root = os.path.join(chunks_root, "stitched")
+
+    outputs = find_chunk_outputs(chunks_root)
+    tile_cores = load_tile_cores(chunks_root)
+    if tile_cores:
+        log_info(f"Tiled chunks: keeping objects owned by their tile core ({len(tile_cores)} tiles)")
+    summaries = {}
+    for class_name in sorted(outputs):
+        summaries[class_name] = stitch_class(class_name, outputs[class_name],
+                                             os.path.join(output_root, class_name), tile_cores)
+    return summaries
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 chunk_stitching.py <chunks_root> [output_dir]")
+        print("Example: python3 chunk_stitching.py outlast/chunks")
+        sys.exit(1)
+
+    chunks_root = sys.argv[1]
+    output_root = sys.argv[2] if len(sys.argv) == 3 else None
+
+    if not os.path.isdir(chunks_root):
+        log_warn(f"Chunks directory not found: {chunks_root}")
+        sys.exit(1)
+
+    print("="*60)
+    print("CROSS-CHUNK OBJECT STITCHING")
+    print("="*60)
+    print(f"Chunks root: {chunks_root}")
+    print()
+
+    summaries = stitch_chunks(chunks_root, output_root)
+    if not summaries:
+        log_warn("No chunk outputs found")
+        sys.exit(1)
+
+    for class_name, summary in summaries.items():
+        for kind, (inputs, outputs, merged) in summary.items():
+            log_info(f"{class_name} {kind}: {inputs} fragments -> {outputs} objects ({merged} stitched)")
+
+    print()
+    log_success(f"Stitched outputs saved under: {output_root or os.path.join(chunks_root, 'stitched')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Single-Pass Class Splitter
+Splits a chunk LAZ into one LAZ per classification code in one read
+Replaces the per-class readers.las → filters.range → writers.las pipelines
+of stage 2 (one full decompression of the chunk per class)
+
+1. Stream the chunk in batches (laspy, READ_BATCH_SIZE points per batch)
+2. Group each batch by Classification (stable, point order is kept)
+3. Append every group to its class writer (opened on the first point of the
+   class, same point format, scales, offsets and VLRs as the source)
+4. Accumulate per-class point counts and XYZ bounds during the pass
+5. Write <classes_dir>/<Class>/<Class>.laz and the summary class_split.json
+
+Without laspy the split runs as one PDAL pipeline (filters.groupby on
+Classification), still one read of the chunk.
+
+Usage:
+    python3 class_splitter.py <input.laz> <classes_dir>
+"""
+
+import os
+import sys
+import json
+import glob
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from las_reader import READ_BATCH_SIZE, read_las_header
+
+# Class directory names (mobile mapping classification)
+CLASS_NAMES = {
+    1: "1_Other",
+    2: "2_Roads",
+    3: "3_Sidewalks",
+    4: "4_OtherGround",
+    5: "5_TrafficIslands",
+    6: "6_Buildings",
+    7: "7_Trees",
+    8: "8_OtherVegetation",
+    9: "9_TrafficLights",
+    10: "10_TrafficSigns",
+    11: "11_Wires",
+    12: "12_Masts",
+    13: "13_Pedestrians",
+    15: "15_2Wheel",
+    16: "16_Mobile4w",
+    17: "17_Stationary4w",
+    18: "18_Noise",
+    19: "19_Pedestrian",
+    40: "40_TreeTrunks",
+    64: "64_Wire_Guard",
+    65: "65_Wire_Conductor",
+}
+
+SPLIT_SUMMARY = "class_split.json"
+
+def class_name(code):
+    """Directory name of a classification code (same fallback as stage 2)"""
+    return CLASS_NAMES.get(int(code), f"{int(code)}_Unknown")
+
+def _class_paths(classes_dir, code):
+    name = class_name(code)
+    class_dir = os.path.join(classes_dir, name)
+    return class_dir, os.path.join(class_dir, f"{name}.laz")
+
+def _empty_stats():
+    return {"count": 0,
+            "min": [np.inf, np.inf, np.inf],
+            "max": [-np.inf, -np.inf, -np.inf]}
+
+def _split_with_laspy(input_file, classes_dir):
+    """
+    Stream the chunk once, appending every class to its own LAZ writer
+
+    Returns:
+        stats: {code: {"count", "min", "max"}}
+    """
+    import laspy
+
+    if not laspy.LazBackend.detect_available():
+        raise ImportError("laspy is installed without a LAZ backend (pip install laspy[lazrs])")
+
+    writers, temp_files, stats = {}, {}, {}
+    completed = False
+    try:
+        with laspy.open(input_file) as reader:
+            for chunk in reader.chunk_iterator(READ_BATCH_SIZE):
+                classification = np.asarray(chunk.classification)
+                order = np.argsort(classification, kind='stable')
+                codes, starts = np.unique(classification[order], return_index=True)
+                ends = np.append(starts[1:], len(order))
+                xyz = np.column_stack((np.asarray(chunk.x), np.asarray(chunk.y), np.asarray(chunk.z)))
+
+                for code, start, end in zip(codes.tolist(), starts, ends):
+                    members = order[start:end]
+                    if code not in writers:
+                        class_dir, laz_file = _class_paths(classes_dir, code)
+                        os.makedirs(class_dir, exist_ok=True)
+                        temp_files[code] = f"{laz_file}.{os.getpid()}.tmp"
+                        writers[code] = laspy.open(temp_files[code], mode='w', header=reader.header,
+                                                   do_compress=True)
+                        stats[code] = _empty_stats()
+                    writers[code].write_points(chunk[members])
+
+                    class_xyz = xyz[members]
+                    entry = stats[code]
+                    entry["count"] += len(members)
+                    entry["min"] = np.minimum(entry["min"], class_xyz.min(axis=0)).tolist()
+                    entry["max"] = np.maximum(entry["max"], class_xyz.max(axis=0)).tolist()
+        completed = True
+    finally:
+        close_error = None
+        for writer in writers.values():
+            try:
+                writer.close()
+            except Exception as e:
+                close_error = close_error or e
+        if not completed or close_error:
+            # Failed decode or write: drop the partial class files
+            for temp_file in temp_files.values():
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+    if close_error:
+        raise close_error
+
+    for code, temp_file in temp_files.items():
+        os.replace(temp_file, _class_paths(classes_dir, code)[1])
+    return stats
+
+def _split_with_pdal(input_file, classes_dir):
+    """
+    One PDAL pipeline grouping the chunk by Classification
+
+    Counts and bounds come from the written headers (no second read).
+
+    Returns:
+        stats: {code: {"count", "min", "max"}}
+    """
+    temp_dir = tempfile.mkdtemp(prefix="class_splitter_", dir=classes_dir)
+    try:
+        pipeline = [
+            {"type": "readers.las", "filename": input_file},
+            {"type": "filters.groupby", "dimension": "Classification"},
+            {"type": "writers.las", "filename": os.path.join(temp_dir, "class_#.laz"),
+             "compression": "laszip", "forward": "all"},
+        ]
+        result = subprocess.run(["pdal", "pipeline", "--stdin"], input=json.dumps(pipeline),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"pdal pipeline failed: {result.stderr.strip()}")
+
+        stats = {}
+        for temp_file in glob.glob(os.path.join(temp_dir, "class_*.laz")):
+            code = int(os.path.basename(temp_file)[len("class_"):-len(".laz")])
+            header = read_las_header(temp_file)
+            class_dir, laz_file = _class_paths(classes_dir, code)
+            os.makedirs(class_dir, exist_ok=True)
+            os.replace(temp_file, laz_file)
+            stats[code] = {"count": header["point_count"],
+                           "min": [header["min_x"], header["min_y"], header["min_z"]],
+                           "max": [header["max_x"], header["max_y"], header["max_z"]]}
+        return stats
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def split_classes(input_file, classes_dir):
+    """
+    Write one LAZ per classification code of a chunk, reading it once
+
+    Args:
+        input_file: Chunk LAS/LAZ
+        classes_dir: Output directory (<classes_dir>/<Class>/<Class>.laz)
+
+    Returns:
+        summary: {"input", "total_points", "classes": {name: {"code", "count", "min", "max", "file"}}}
+    """
+    os.makedirs(classes_dir, exist_ok=True)
+    try:
+        stats = _split_with_laspy(input_file, classes_dir)
+    except ImportError:
+        stats = _split_with_pdal(input_file, classes_dir)
+
+    classes = {}
+    for code in sorted(stats):
+        entry = stats[code]
+        classes[class_name(code)] = {
+            "code": int(code),
+            "count": int(entry["count"]),
+            "min": [float(v) for v in entry["min"]],
+            "max": [float(v) for v in entry["max"]],
+            "file": os.path.relpath(_class_paths(classes_dir, code)[1], classes_dir),
+        }
+
+    summary = {
+        "input": os.path.abspath(input_file),
+        "total_points": sum(c["count"] for c in classes.values()),
+        "classes": classes,
+    }
+    with open(os.path.join(classes_dir, SPLIT_SUMMARY), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 class_splitter.py <input.laz> <classes_dir>")
+        print("Example:")
+        print("  python3 class_splitter.py out/chunks/spatial_segment_1.laz out/chunks/chunk_1/compressed/filtred_by_classes")
+        sys.exit(1)
+
+    input_file, classes_dir = sys.argv[1], sys.argv[2]
+    if not os.path.exists(input_file):
+        print(f"❌ Input file not found: {input_file}")
+        sys.exit(1)
+
+    print(f"🔄 Splitting {os.path.basename(input_file)} by class (single pass)...")
+    try:
+        summary = split_classes(input_file, classes_dir)
+    except Exception as e:
+        print(f"❌ Class split failed: {e}")
+        sys.exit(1)
+
+    for name, entry in summary["classes"].items():
+        print(f"    ✓ {name}: {entry['count']:,} points "
+              f"(X[{entry['min'][0]:.2f}, {entry['max'][0]:.2f}] "
+              f"Y[{entry['min'][1]:.2f}, {entry['max'][1]:.2f}] "
+              f"Z[{entry['min'][2]:.2f}, {entry['max'][2]:.2f}])")
+    print(f"📊 {len(summary['classes'])} classes, {summary['total_points']:,} points")
+    sys.exit(0 if summary["classes"] else 1)
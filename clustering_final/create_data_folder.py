@@ -3,9 +3,13 @@
 Data Organization Script for LiDAR Clustering Visualization
 Creates a centralized 'data' folder containing all visualization data
 Copies and organizes JSON/GeoJSON files for server deployment
+
+Usage:
+    python3 create_data_folder.py [chunks_dir]
 """
 
 import os
+import sys
 import json
 import glob
 import shutil
@@ -29,6 +33,7 @@ def create_directory_structure():
         f"{TARGET_DATA_DIR}/polygons/buildings",
         f"{TARGET_DATA_DIR}/polygons/vegetation",
         f"{TARGET_DATA_DIR}/lines/wires",
+        f"{TARGET_DATA_DIR}/stitched",
         f"{TARGET_DATA_DIR}/metadata"
     ]
 
@@ -36,13 +41,13 @@ def create_directory_structure():
         Path(directory).mkdir(parents=True, exist_ok=True)
         logger.info(f"Created directory: {directory}")
 
-def copy_centroid_files():
-    """Copy and organize centroid JSON files (masts)"""
+def copy_centroid_files(source_dir=SOURCE_DIR):
+    """Copy and organize centroid JSON files (masts: consolidated > clean > raw)"""
     logger.info("Processing centroid files (masts)...")
 
     # Find all centroid files, prioritizing clean versions
-    clean_files = glob.glob(f"{SOURCE_DIR}/**/centroids/*_centroids_clean.json", recursive=True)
-    regular_files = glob.glob(f"{SOURCE_DIR}/**/centroids/*_centroids.json", recursive=True)
+    clean_files = glob.glob(f"{source_dir}/**/centroids/*_centroids_clean.json", recursive=True)
+    regular_files = glob.glob(f"{source_dir}/**/centroids/*_centroids.json", recursive=True)
 
     # Remove regular files if clean versions exist
     for clean_file in clean_files:
@@ -52,6 +57,14 @@ def copy_centroid_files():
 
     all_centroid_files = clean_files + regular_files
 
+    # Globally deduplicated masts (mast_consolidation.py) replace both
+    for consolidated_file in glob.glob(f"{source_dir}/**/centroids/*_Masts_centroids_consolidated.json", recursive=True):
+        for replaced in (consolidated_file.replace('_consolidated.json', '.json'),
+                         consolidated_file.replace('_consolidated.json', '_clean.json')):
+            if replaced in all_centroid_files:
+                all_centroid_files.remove(replaced)
+        all_centroid_files.append(consolidated_file)
+
     logger.info(f"Found {len(all_centroid_files)} centroid files")
 
     for file_path in all_centroid_files:
@@ -60,7 +73,8 @@ def copy_centroid_files():
         chunk = None
         class_name = None
 
-        for part in path_parts:
+        # Directories only: the file name (raw, clean or consolidated) is not the class
+        for part in path_parts[:-1]:
             if part.startswith('chunk_'):
                 chunk = part
             elif '_' in part and part != 'centroids':
@@ -73,7 +87,7 @@ def copy_centroid_files():
             shutil.copy2(file_path, target_path)
             logger.info(f"Copied: {filename}")
 
-def copy_polygon_files():
+def copy_polygon_files(source_dir=SOURCE_DIR):
     """Copy and organize polygon GeoJSON files (trees, buildings, vegetation)"""
     logger.info("Processing polygon files...")
 
@@ -85,7 +99,7 @@ def copy_polygon_files():
     }
 
     for class_folder, organized_name in class_mapping.items():
-        pattern = f"{SOURCE_DIR}/**/compressed/filtred_by_classes/{class_folder}/polygons/*_polygons.geojson"
+        pattern = f"{source_dir}/**/compressed/filtred_by_classes/{class_folder}/polygons/*_polygons.geojson"
         files = glob.glob(pattern, recursive=True)
 
         logger.info(f"Found {len(files)} {organized_name} polygon files")
@@ -107,12 +121,12 @@ def copy_polygon_files():
                 shutil.copy2(file_path, target_path)
                 logger.info(f"Copied: {filename}")
 
-def copy_line_files():
+def copy_line_files(source_dir=SOURCE_DIR):
     """Copy and organize line GeoJSON files (wires)"""
     logger.info("Processing line files (wires)...")
 
     # Find wire line files, excluding roads and sidewalks
-    all_line_files = glob.glob(f"{SOURCE_DIR}/**/lines/*_lines.geojson", recursive=True)
+    all_line_files = glob.glob(f"{source_dir}/**/lines/*_lines.geojson", recursive=True)
     wire_files = []
 
     for file_path in all_line_files:
@@ -139,6 +153,18 @@ def copy_line_files():
             shutil.copy2(file_path, target_path)
             logger.info(f"Copied: {filename}")
 
+def copy_stitched_files(source_dir=SOURCE_DIR):
+    """Copy the cross-chunk stitched outputs (chunk_stitching.py), one file per class and type"""
+    logger.info("Processing stitched files...")
+
+    files = glob.glob(f"{source_dir}/stitched/*/*.json") + glob.glob(f"{source_dir}/stitched/*/*.geojson")
+    logger.info(f"Found {len(files)} stitched files")
+
+    for file_path in files:
+        filename = os.path.basename(file_path)
+        shutil.copy2(file_path, f"{TARGET_DATA_DIR}/stitched/{filename}")
+        logger.info(f"Copied: {filename}")
+
 def create_data_manifest():
     """Create a manifest file describing all available data"""
     logger.info("Creating data manifest...")
@@ -153,7 +179,8 @@ def create_data_manifest():
             },
             "lines": {
                 "wires": "Wire line features in GeoJSON format"
-            }
+            },
+            "stitched": "Objects merged across chunk seams, one file per class and type"
         },
         "coordinate_system": "UTM Zone 29N (EPSG:29180) for Morocco region",
         "file_naming": "{chunk}_{class}_{type}.{extension}",
@@ -166,6 +193,7 @@ def create_data_manifest():
     building_count = len(glob.glob(f"{TARGET_DATA_DIR}/polygons/buildings/*.geojson"))
     vegetation_count = len(glob.glob(f"{TARGET_DATA_DIR}/polygons/vegetation/*.geojson"))
     wire_count = len(glob.glob(f"{TARGET_DATA_DIR}/lines/wires/*.geojson"))
+    stitched_count = len(glob.glob(f"{TARGET_DATA_DIR}/stitched/*.*json"))
 
     manifest["statistics"] = {
         "centroid_files": centroid_count,
@@ -173,7 +201,8 @@ def create_data_manifest():
         "building_files": building_count,
         "vegetation_files": vegetation_count,
         "wire_files": wire_count,
-        "total_files": centroid_count + tree_count + building_count + vegetation_count + wire_count
+        "stitched_files": stitched_count,
+        "total_files": centroid_count + tree_count + building_count + vegetation_count + wire_count + stitched_count
     }
 
     # Write manifest
@@ -201,6 +230,8 @@ data/
 │   └── vegetation/    # Other vegetation polygons
 ├── lines/             # Line features (GeoJSON)
 │   └── wires/        # Wire line data
+├── stitched/          # Objects merged across chunk seams
+│   └── {class}_{type}.{extension}
 ├── metadata/          # Processing metadata
 ├── manifest.json      # Data inventory and statistics
 └── README.md         # This file
@@ -240,22 +271,31 @@ Examples:
 
     logger.info("Created README.md for data folder")
 
-def main():
-    """Main function to organize all visualization data"""
+def main(source_dir=SOURCE_DIR):
+    """
+    Main function to organize all visualization data
+
+    Args:
+        source_dir: Chunks directory of the dataset (chunk_N/, stitched/)
+
+    Returns:
+        True when the data folder was created
+    """
     logger.info("Starting data organization for server deployment...")
 
     # Check if source directory exists
-    if not os.path.exists(SOURCE_DIR):
-        logger.error(f"Source directory not found: {SOURCE_DIR}")
-        return
+    if not os.path.exists(source_dir):
+        logger.error(f"Source directory not found: {source_dir}")
+        return False
 
     # Create directory structure
     create_directory_structure()
 
     # Copy and organize files
-    copy_centroid_files()
-    copy_polygon_files()
-    copy_line_files()
+    copy_centroid_files(source_dir)
+    copy_polygon_files(source_dir)
+    copy_line_files(source_dir)
+    copy_stitched_files(source_dir)
 
     # Create metadata files
     create_data_manifest()
@@ -275,6 +315,8 @@ def main():
         subindent = ' ' * 2 * (level + 1)
         for file in files:
             logger.info(f"{subindent}{file}")
+    return True
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    source_dir = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else SOURCE_DIR
+    sys.exit(0 if main(source_dir) else 1)
\ No newline at end of file
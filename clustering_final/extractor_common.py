@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Shared Extractor Helpers
+Path normalization and point preprocessing used by every class extractor
+(buildings, vegetation, wires, roads) and by the multi-extractor chunk driver
+"""
+
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from voxel_grid import voxel_groups
+
+CLASSES_SUBDIR = "compressed/filtred_by_classes"
+
+def resolve_chunk_path(chunk_path):
+    """
+    Normalize a chunk path to its filtred_by_classes directory
+
+    Args:
+        chunk_path: Chunk root (/path/to/chunk_1) or its classes directory
+                    (/path/to/chunk_1/compressed/filtred_by_classes)
+
+    Returns:
+        (classes_base, chunk_name), or (None, None) for an invalid layout
+    """
+    chunk_path = os.path.abspath(chunk_path)
+
+    if chunk_path.endswith('/' + CLASSES_SUBDIR):
+        # Path is already pointing to filtred_by_classes
+        return chunk_path, os.path.basename(os.path.dirname(os.path.dirname(chunk_path)))
+
+    if os.path.exists(os.path.join(chunk_path, CLASSES_SUBDIR)):
+        # Path is chunk root directory
+        return os.path.join(chunk_path, CLASSES_SUBDIR), os.path.basename(chunk_path)
+
+    return None, None
+
+def class_file(classes_base, class_name):
+    """Path of the class LAZ produced by Stage 2"""
+    return os.path.join(classes_base, class_name, f"{class_name}.laz")
+
+def height_filter(points, percentile):
+    """Drop points at or below the given z percentile; returns (points, threshold)"""
+    z_values = points[:, 2]
+    height_threshold = np.percentile(z_values, percentile)
+    return points[z_values > height_threshold], height_threshold
+
+def sparse_neighborhood_mask(points, radius, max_neighbors):
+    """
+    True for points with at most max_neighbors points (itself included) within radius
+
+    Used as boundary detection by the concave hull builders. Points sharing a
+    grid cell of side radius/sqrt(d) are all within radius of each other, so a
+    cell holding more than max_neighbors points is interior outright; only the
+    remaining points are counted, in one batched query (lengths only, all cores).
+    """
+    _, cell_of, cell_counts = voxel_groups(points, radius / np.sqrt(points.shape[1]))
+    mask = cell_counts[cell_of] <= max_neighbors
+
+    candidates = np.flatnonzero(mask)
+    if len(candidates):
+        counts = cKDTree(points).query_ball_point(points[candidates], radius, return_length=True, workers=-1)
+        mask[candidates] = counts <= max_neighbors
+    return mask
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Batch Geometry Metrics
+Area, perimeter, aspect ratios and compactness for many polygons at once
+
+Polygons are passed as a ragged array: all ring vertices in one (M, 2) array
+plus offsets (ring i = coords[offsets[i]:offsets[i + 1]], no closing vertex).
+Every metric is computed for every ring in one NumPy pass (per-ring segment
+sums and reductions), so migration and QA tools can recompute a whole dataset
+instead of looping over coordinate lists per candidate.
+
+Minimum-area rectangle (rotating calipers): the optimal rectangle has a side
+on a convex hull edge. Edge angles increase monotonically around a convex
+hull, so the extreme vertices for every edge of every hull are found with one
+searchsorted over the hull-major angle keys, O(E log E) in total.
+
+Usage:
+    python3 geometry_metrics.py <chunks_root|file.geojson> [--update]
+"""
+
+import os
+import sys
+import json
+import numpy as np
+import shapely
+
+# QA thresholds for flagged polygons
+QA_MAX_MIN_RECT_ASPECT = 12.0
+QA_MIN_COMPACTNESS = 0.2
+QA_AREA_TOLERANCE = 0.01
+
+def _range_indices(first, count):
+    """Concatenated first[i], first[i] + 1, ..., first[i] + count[i] - 1"""
+    return np.repeat(first, count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+
+def pack_rings(rings):
+    """
+    Pack coordinate lists into a ragged array
+
+    Args:
+        rings: list of [[x, y], ...] rings, closed or open
+
+    Returns:
+        coords: (M, 2) vertices, closing vertex dropped
+        offsets: (P + 1,) ring start offsets
+    """
+    arrays = []
+    for ring in rings:
+        xy = np.asarray(ring, dtype=np.float64)
+        xy = xy[:, :2] if xy.ndim == 2 else np.zeros((0, 2))
+        if len(xy) > 1 and np.array_equal(xy[0], xy[-1]):
+            xy = xy[:-1]
+        arrays.append(xy)
+
+    lengths = np.array([len(xy) for xy in arrays], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    coords = np.concatenate(arrays) if arrays and offsets[-1] else np.zeros((0, 2))
+    return coords, offsets
+
+def _ring_edges(coords, offsets):
+    """Edge start/end vertex indices of every ring (closing edge included) and their ring ids"""
+    lengths = np.diff(offsets)
+    start = _range_indices(offsets[:-1], lengths)
+    ring = np.repeat(np.arange(len(lengths)), lengths)
+    end = start + 1
+    last = end == offsets[1:][ring]
+    end[last] = offsets[:-1][ring[last]]
+    return start, end, ring
+
+def _segment_sum(values, ring, n_rings):
+    return np.bincount(ring, weights=values, minlength=n_rings)
+
+def polygon_areas(coords, offsets):
+    """(P,) shoelace areas"""
+    start, end, ring = _ring_edges(coords, offsets)
+    cross = coords[start, 0] * coords[end, 1] - coords[end, 0] * coords[start, 1]
+    return 0.5 * np.abs(_segment_sum(cross, ring, len(offsets) - 1))
+
+def polygon_perimeters(coords, offsets):
+    """(P,) ring lengths including the closing edge"""
+    start, end, ring = _ring_edges(coords, offsets)
+    edge = coords[end] - coords[start]
+    return _segment_sum(np.hypot(edge[:, 0], edge[:, 1]), ring, len(offsets) - 1)
+
+def bbox_aspect_ratios(coords, offsets):
+    """(P,) long / short side of the axis-aligned bounding box (inf for zero width)"""
+    n_rings = len(offsets) - 1
+    ratios = np.ones(n_rings)
+    filled = np.flatnonzero(np.diff(offsets) > 0)
+    if len(filled) == 0:
+        return ratios
+
+    starts = offsets[:-1][filled]
+    extent = np.maximum.reduceat(coords, starts, axis=0) - np.minimum.reduceat(coords, starts, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = extent.max(axis=1) / extent.min(axis=1)
+    ratios[filled] = np.where(np.isnan(ratio), 1.0, ratio)
+    return ratios
+
+def edge_aspect_ratios(coords, offsets):
+    """
+    (P,) aspect ratio of near-rectangular footprints from sorted edge lengths:
+    third-shortest / shortest edge (1 for rings with fewer than 4 edges)
+    """
+    start, end, ring = _ring_edges(coords, offsets)
+    edge = coords[end] - coords[start]
+    length = np.hypot(edge[:, 0], edge[:, 1])
+
+    lengths = np.diff(offsets)
+    ratios = np.ones(len(lengths))
+    valid = lengths >= 4
+    if not valid.any():
+        return ratios
+
+    # Shortest and third-shortest edge per ring: three grouped minimum passes,
+    # each removing one occurrence of the current minimum (no full sort)
+    keep = valid[ring]
+    remaining = length[keep]
+    group_start = np.concatenate(([0], np.cumsum(lengths[valid])[:-1]))
+    group_size = lengths[valid]
+    position = np.arange(len(remaining))
+    smallest = []
+    for _ in range(3):
+        current = np.minimum.reduceat(remaining, group_start)
+        smallest.append(current)
+        at_min = remaining == np.repeat(current, group_size)
+        first_min = np.minimum.reduceat(np.where(at_min, position, len(remaining)), group_start)
+        remaining[first_min] = np.inf
+    width, height = smallest[0], smallest[2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.maximum(height / width, width / height)
+    ratios[valid] = np.where(width > 0, ratio, 1.0)
+    return ratios
+
+def compactness(areas, perimeters):
+    """(P,) 4π·area / perimeter² (circle = 1.0, square ≈ 0.785)"""
+    areas, perimeters = np.asarray(areas, dtype=np.float64), np.asarray(perimeters, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(perimeters > 0, 4 * np.pi * areas / perimeters ** 2, 0.0)
+
+def point_densities(point_counts, areas):
+    """(P,) points per square meter"""
+    point_counts, areas = np.asarray(point_counts, dtype=np.float64), np.asarray(areas, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(areas > 0, point_counts / areas, 0.0)
+
+def minimum_area_rectangles(coords, offsets):
+    """
+    Minimum-area enclosing rectangle of every polygon (rotating calipers)
+
+    Returns:
+        length: (P,) long side
+        width: (P,) short side
+        angle: (P,) orientation of the long side in degrees [0, 180)
+        (nan for empty rings)
+    """
+    n_rings = len(offsets) - 1
+    length = np.full(n_rings, np.nan)
+    width = np.full(n_rings, np.nan)
+    angle = np.full(n_rings, np.nan)
+    if n_rings == 0 or len(coords) == 0:
+        return length, width, angle
+
+    # Convex hulls of all polygons in one vectorized GEOS call, each ring
+    # relative to its first vertex to keep full precision at projected
+    # coordinates. Rings are passed as LineStrings (no per-vertex Point
+    # objects, much faster than MultiPoints); single vertices are doubled.
+    # Empty rings are skipped, so geometries are numbered over non-empty rings.
+    counts = np.diff(offsets)
+    present = np.flatnonzero(counts > 0)
+    dense_ids = np.repeat(np.arange(len(present)), counts[present])
+    local = coords[:, :2] - coords[offsets[:-1][present], :2][dense_ids]
+    repeats = np.where(counts[present] == 1, 2, 1)[dense_ids]
+    lines = shapely.linestrings(np.repeat(local, repeats, axis=0), indices=np.repeat(dense_ids, repeats))
+    hulls = shapely.convex_hull(lines)
+    hull_coords, hull_index = shapely.get_coordinates(hulls, return_index=True)
+
+    # Open rings: drop the repeated first vertex of Polygon hulls
+    starts = np.searchsorted(hull_index, np.arange(len(present) + 1))
+    last = starts[1:] - 1
+    closed = (last > starts[:-1]) & np.all(hull_coords[last] == hull_coords[starts[:-1]], axis=1)
+    keep = np.ones(len(hull_coords), dtype=bool)
+    keep[last[closed]] = False
+    hull_coords, hull_index = hull_coords[keep], hull_index[keep]
+    starts = np.searchsorted(hull_index, np.arange(len(present) + 1))
+    sizes = np.diff(starts)
+
+    # Single-vertex hulls (all points equal)
+    single = sizes == 1
+    length[present[single]] = width[present[single]] = angle[present[single]] = 0.0
+
+    # Counter-clockwise vertex order (reverse clockwise hulls in place)
+    position = np.arange(len(hull_coords))
+    nxt = np.where(position + 1 == starts[1:][hull_index], starts[:-1][hull_index], position + 1)
+    cross = hull_coords[:, 0] * hull_coords[nxt, 1] - hull_coords[nxt, 0] * hull_coords[:, 1]
+    clockwise = np.bincount(hull_index, weights=cross, minlength=len(present)) < 0
+    flip = clockwise[hull_index]
+    order = np.where(flip, starts[:-1][hull_index] + starts[1:][hull_index] - 1 - position, position)
+    hull_coords = hull_coords[order]
+
+    # Edge j runs from vertex j to vertex j + 1; its angle increases monotonically
+    # around a counter-clockwise hull (total turn 2π)
+    edge = hull_coords[nxt] - hull_coords
+    theta = np.arctan2(edge[:, 1], edge[:, 0])
+    # (turns from atan2 of cross/dot, clipped at 0, so rounding on nearly
+    # collinear edges cannot wrap a tiny negative turn to 2π)
+    previous = np.roll(edge, 1, axis=0)
+    turn = np.maximum(np.arctan2(previous[:, 0] * edge[:, 1] - previous[:, 1] * edge[:, 0],
+                                 np.einsum('ij,ij->i', previous, edge)), 0.0)
+    turn[starts[:-1][sizes > 0]] = 0.0
+    first_edge = starts[:-1][hull_index]
+    cumulative = np.cumsum(turn)
+    relative = cumulative - cumulative[first_edge]
+
+    # Search keys: hull-major, relative edge angle within [0, 2π)
+    span = 8 * np.pi
+    keys = hull_index * span + relative
+
+    def extreme_vertex(shift):
+        """Vertex of each edge's hull that is extreme in the edge direction rotated by shift"""
+        query = hull_index * span + np.mod(relative + shift + np.pi / 2, 2 * np.pi)
+        local = np.searchsorted(keys, query, side='left') - first_edge
+        local[local >= sizes[hull_index]] = 0
+        return first_edge + local
+
+    valid = sizes[hull_index] > 1
+    u = edge / np.maximum(np.hypot(edge[:, 0], edge[:, 1]), 1e-300)[:, None]
+    normal = np.column_stack((-u[:, 1], u[:, 0]))  # Interior side
+    far_along = hull_coords[extreme_vertex(0.0)]
+    far_back = hull_coords[extreme_vertex(np.pi)]
+    far_across = hull_coords[extreme_vertex(np.pi / 2)]
+
+    extent_along = np.einsum('ij,ij->i', far_along - far_back, u)
+    extent_across = np.einsum('ij,ij->i', far_across - hull_coords, normal)
+    area = np.where(valid, extent_along * extent_across, np.inf)
+
+    # Smallest rectangle per hull (ties: first edge)
+    best = np.lexsort((position, area, hull_index))
+    best = best[np.concatenate(([True], hull_index[best][1:] != hull_index[best][:-1]))]
+    best = best[valid[best]]
+    target = present[hull_index[best]]
+
+    long_along = extent_along[best] >= extent_across[best]
+    length[target] = np.where(long_along, extent_along[best], extent_across[best])
+    width[target] = np.where(long_along, extent_across[best], extent_along[best])
+    degrees = np.degrees(theta[best])
+    angle[target] = np.mod(np.where(long_along, degrees, degrees + 90.0), 180.0)
+
+    return length, width, angle
+
+def polygon_metrics(coords, offsets, point_counts=None):
+    """
+    All metrics for all polygons of a ragged ring array
+
+    Returns:
+        metrics: dict of (P,) arrays - area_m2, perimeter_m, compactness,
+                 bbox_aspect_ratio, edge_aspect_ratio, min_rect_length_m,
+                 min_rect_width_m, min_rect_angle_deg, min_rect_aspect_ratio
+                 (+ point_density when point_counts is given)
+    """
+    areas = polygon_areas(coords, offsets)
+    perimeters = polygon_perimeters(coords, offsets)
+    rect_length, rect_width, rect_angle = minimum_area_rectangles(coords, offsets)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rect_aspect = np.where(rect_width > 0, rect_length / rect_width,
+                               np.where(np.isnan(rect_width), np.nan, np.inf))
+
+    metrics = {
+        "area_m2": areas,
+        "perimeter_m": perimeters,
+        "compactness": compactness(areas, perimeters),
+        "bbox_aspect_ratio": bbox_aspect_ratios(coords, offsets),
+        "edge_aspect_ratio": edge_aspect_ratios(coords, offsets),
+        "min_rect_length_m": rect_length,
+        "min_rect_width_m": rect_width,
+        "min_rect_angle_deg": rect_angle,
+        "min_rect_aspect_ratio": rect_aspect,
+    }
+    if point_counts is not None:
+        metrics["point_density"] = point_densities(point_counts, areas)
+    return metrics
+
+def ring_metrics(ring):
+    """Metrics of a single coordinate list, as plain floats"""
+    coords, offsets = pack_rings([ring])
+    return {name: float(values[0]) for name, values in polygon_metrics(coords, offsets).items()}
+
+def find_polygon_files(path):
+    """All polygon GeoJSON files under a chunks root (or the file itself)"""
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names
+                     if name.endswith('.geojson') and 'polygons' in name)
+    return sorted(files)
+
+def dataset_metrics(path, update=False):
+    """
+    Recompute metrics for every polygon of every GeoJSON under path
+
+    Args:
+        path: Chunks root, server data directory or a single GeoJSON
+        update: Write the recomputed metrics into the feature properties
+
+    Returns:
+        records: list of (file, feature index, properties, metrics dict)
+    """
+    files = find_polygon_files(path)
+    documents, rings, owners, point_counts = {}, [], [], []
+    for geojson_file in files:
+        with open(geojson_file, 'r') as f:
+            documents[geojson_file] = json.load(f)
+        for i, feature in enumerate(documents[geojson_file].get("features", [])):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "Polygon" and geometry.get("coordinates"):
+                rings.append(geometry["coordinates"][0])
+            elif geometry.get("type") == "MultiPolygon" and geometry.get("coordinates"):
+                # Largest part
+                parts = [polygon[0] for polygon in geometry["coordinates"]]
+                part_coords, part_offsets = pack_rings(parts)
+                rings.append(parts[int(np.argmax(polygon_areas(part_coords, part_offsets)))])
+            else:
+                continue
+            owners.append((geojson_file, i))
+            point_counts.append(feature.get("properties", {}).get("point_count", 0) or 0)
+
+    coords, offsets = pack_rings(rings)
+    metrics = polygon_metrics(coords, offsets, point_counts)
+
+    records = []
+    for k, (geojson_file, i) in enumerate(owners):
+        properties = documents[geojson_file]["features"][i].setdefault("properties", {})
+        values = {name: float(array[k]) for name, array in metrics.items()}
+        records.append((geojson_file, i, dict(properties), values))
+        if update:
+            properties["area_m2"] = round(values["area_m2"], 2)
+            properties["perimeter_m"] = round(values["perimeter_m"], 2)
+            properties["compactness"] = round(values["compactness"], 3)
+            properties["min_rect_aspect_ratio"] = round(values["min_rect_aspect_ratio"], 2)
+
+    if update:
+        for geojson_file, document in documents.items():
+            with open(geojson_file, 'w') as f:
+                json.dump(document, f, indent=2)
+
+    return records
+
+def print_qa_report(records):
+    """Per-file summary and flagged polygons"""
+    by_file = {}
+    for geojson_file, i, properties, values in records:
+        by_file.setdefault(geojson_file, []).append((i, properties, values))
+
+    total_flagged = 0
+    for geojson_file, items in by_file.items():
+        areas = np.array([values["area_m2"] for _, _, values in items])
+        print(f"\n📂 {geojson_file}")
+        print(f"  📊 {len(items)} polygons, area {areas.min():.1f}-{areas.max():.1f} m² (total {areas.sum():.1f} m²)")
+
+        for i, properties, values in items:
+            issues = []
+            stored = properties.get("area_m2")
+            if stored is not None and abs(stored - values["area_m2"]) > QA_AREA_TOLERANCE * max(values["area_m2"], 1.0):
+                issues.append(f"stored area {stored} vs {values['area_m2']:.2f} m²")
+            if values["min_rect_aspect_ratio"] > QA_MAX_MIN_RECT_ASPECT:
+                issues.append(f"elongated {values['min_rect_aspect_ratio']:.1f}:1")
+            if values["compactness"] < QA_MIN_COMPACTNESS:
+                issues.append(f"compactness {values['compactness']:.2f}")
+            if issues:
+                total_flagged += 1
+                print(f"  ⚠️  feature {i} (id {properties.get('polygon_id', '?')}): {', '.join(issues)}")
+
+    print(f"\n✅ {len(records)} polygons in {len(by_file)} files, {total_flagged} flagged")
+
+def main():
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] != "--update"):
+        print("Usage: python3 geometry_metrics.py <chunks_root|file.geojson> [--update]")
+        print("Examples:")
+        print("  python3 geometry_metrics.py server/data")
+        print("  python3 geometry_metrics.py /path/to/chunks --update   # rewrite area/perimeter/compactness")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    if not os.path.exists(path):
+        print(f"❌ Path not found: {path}")
+        sys.exit(1)
+
+    update = len(sys.argv) == 3
+    records = dataset_metrics(path, update)
+    if not records:
+        print(f"❌ No polygons found under {path}")
+        sys.exit(1)
+
+    print_qa_report(records)
+    if update:
+        print(f"📁 Updated metrics written back to the GeoJSON files")
+
+if __name__ == "__main__":
+    main()
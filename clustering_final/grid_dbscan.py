@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Grid-Hash DBSCAN Engine
+Linear-memory DBSCAN for 2D projected (and 3D) point clustering
+
+sklearn's DBSCAN materializes the full eps-neighborhood of every point, which
+explodes on dense building facades (eps=2.0 on 0.25m voxels = thousands of
+neighbors per point). This engine never stores neighborhoods:
+
+1. Points are hashed into a uniform grid of cell size eps/sqrt(d), so any
+   two points sharing a cell are within eps of each other
+2. Cells holding >= min_samples points are all-core without a single distance
+   test; only points of sparser cells count their neighborhood (lengths only)
+3. Neighboring core cells are merged with union-find (connected components)
+   when any pair of their core points is within eps
+4. Border points join the cluster of their adjacent core points
+
+Distance tests and radius queries run in fixed-size batches (PAIR_BUDGET,
+QUERY_BATCH_SIZE), so memory stays O(n). A kd-tree already built upstream
+(outlier_filter.SubsetIndex) can be passed in and is used for the radius
+queries instead of building new trees.
+Labels follow sklearn exactly: clusters are numbered in the order of their
+lowest-index core point and a border point reachable from several clusters
+takes the lowest label, so results are interchangeable with sklearn.
+"""
+
+import itertools
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Maximum number of point pairs distance-tested per batch
+PAIR_BUDGET = 2_000_000
+
+# Points per radius query batch (bounds neighbor-list memory for border points)
+QUERY_BATCH_SIZE = 100_000
+
+# Clustering engine per class ("grid", "tiled" or "sklearn"); unlisted classes use DEFAULT_ENGINE
+# "tiled" runs grid_dbscan over XY tiles in a process pool (tiled_dbscan.py)
+CLASS_ENGINES = {
+    "2_Roads": "tiled",
+    "3_Sidewalks": "tiled",
+    "6_Buildings": "grid",
+    "7_Trees": "grid",
+    "8_OtherVegetation": "tiled",
+    "11_Wires": "grid",
+    "12_Masts": "grid",
+}
+DEFAULT_ENGINE = "grid"
+
+def _neighbor_offsets(dim, cell_size, eps):
+    """Cell offsets whose cells can hold a point within eps of the center cell"""
+    reach = int(np.ceil(eps / cell_size))
+    offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=dim)), dtype=np.int64)
+    gaps = np.maximum(np.abs(offsets) - 1, 0) * cell_size
+    return offsets[(gaps ** 2).sum(axis=1) <= eps ** 2 * (1 + 1e-9)]
+
+def _expand_pairs(a_start, a_len, b_start, b_len):
+    """All (a, b) point index pairs of a list of contiguous block pairs"""
+    sizes = a_len * b_len
+    item = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    ia = a_start[item] + local // b_len[item]
+    ib = b_start[item] + local % b_len[item]
+    return item, ia, ib
+
+def _pair_batches(a_start, a_len, b_start, b_len, budget=PAIR_BUDGET):
+    """
+    Yield (item, ia, ib) for block pairs in batches of at most ~budget point pairs
+
+    Oversized block pairs are split along their a-block first.
+    """
+    keep = (a_len > 0) & (b_len > 0)
+    a_start, a_len, b_start, b_len = a_start[keep], a_len[keep], b_start[keep], b_len[keep]
+    item_ids = np.flatnonzero(keep)
+    if len(a_len) == 0:
+        return
+
+    rows = np.maximum(1, budget // b_len)
+    blocks = -(-a_len // rows)
+    parent = np.repeat(np.arange(len(a_len)), blocks)
+    block_no = np.arange(blocks.sum()) - np.repeat(np.cumsum(blocks) - blocks, blocks)
+    offset = block_no * rows[parent]
+    a_start = a_start[parent] + offset
+    a_len = np.minimum(rows[parent], a_len[parent] - offset)
+    b_start, b_len, item_ids = b_start[parent], b_len[parent], item_ids[parent]
+
+    cumulative = np.cumsum(a_len * b_len)
+    start = 0
+    while start < len(a_len):
+        base = cumulative[start - 1] if start > 0 else 0
+        stop = max(start + 1, int(np.searchsorted(cumulative, base + budget, side='right')))
+        item, ia, ib = _expand_pairs(a_start[start:stop], a_len[start:stop],
+                                     b_start[start:stop], b_len[start:stop])
+        yield item_ids[start:stop][item], ia, ib
+        start = stop
+
+class _CellGrid:
+    """Points sorted by grid cell with neighbor-cell lookup"""
+
+    def __init__(self, points, cell_size, eps):
+        dim = points.shape[1]
+        # Pad by the neighbor reach so offset keys never wrap around an axis
+        self.offsets = _neighbor_offsets(dim, cell_size, eps)
+        reach = int(np.abs(self.offsets).max())
+        coords = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64) + reach
+        dims = coords.max(axis=0) + 2 * reach + 1
+        strides = np.ones(dim, dtype=np.int64)
+        for axis in range(dim - 2, -1, -1):
+            strides[axis] = strides[axis + 1] * dims[axis + 1]
+
+        keys = coords @ strides
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.start, self.count = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cell_of = np.repeat(np.arange(len(self.keys)), self.count)
+        self.offset_keys = self.offsets @ strides
+        self.offset_signs = np.sign(self.offsets)
+
+    def neighbor_pairs(self, cells, block_size=None):
+        """
+        Yield (cell, neighbor cell, offset index) arrays for the given source cells
+        """
+        if block_size is None:
+            block_size = max(1, PAIR_BUDGET // len(self.offset_keys))
+        for begin in range(0, len(cells), block_size):
+            source = cells[begin:begin + block_size]
+            wanted = self.keys[source][:, None] + self.offset_keys[None, :]
+            pos = np.searchsorted(self.keys, wanted)
+            pos = np.minimum(pos, len(self.keys) - 1)
+            found = self.keys[pos] == wanted
+            rows, cols = np.nonzero(found)
+            yield source[rows], pos[rows, cols], cols
+
+def _within_eps(points, ia, ib, eps_sq):
+    diff = points[ia] - points[ib]
+    return np.einsum('ij,ij->i', diff, diff) <= eps_sq
+
+def _directional_extremes(points, grid, core_count, signs):
+    """
+    Index of the core point of each cell that lies furthest along each direction
+
+    Returns:
+        extremes: (cells, directions) array of sorted-point indices (-1 for no core)
+    """
+    cells = np.flatnonzero(core_count > 0)
+    extremes = np.full((len(grid.keys), len(signs)), -1, dtype=np.int64)
+    if len(cells) == 0:
+        return extremes
+
+    # Core points are the leading run of each cell
+    group_start = np.cumsum(core_count[cells]) - core_count[cells]
+    core_idx = np.repeat(grid.start[cells] - group_start, core_count[cells]) + np.arange(core_count[cells].sum())
+
+    for d, direction in enumerate(signs):
+        proj = points[core_idx] @ direction
+        best = np.maximum.reduceat(proj, group_start)
+        is_best = proj >= np.repeat(best, core_count[cells])
+        candidate = np.where(is_best, np.arange(len(core_idx)), len(core_idx))
+        first = np.minimum.reduceat(candidate, group_start)
+        extremes[cells, d] = core_idx[first]
+
+    return extremes
+
+def _core_flags(grid, sorted_points, eps, min_samples, index=None):
+    """Core flags in grid order: dense cells outright, sparse cells by neighborhood count"""
+    dense = grid.count >= min_samples
+    core = dense[grid.cell_of]
+    sparse_points = np.flatnonzero(~core)
+    if len(sparse_points):
+        # Lengths only, no neighbor lists
+        if index is None:
+            tree = cKDTree(sorted_points)
+            count_within = lambda x: tree.query_ball_point(x, eps, return_length=True, workers=-1)
+        else:
+            count_within = lambda x: index.count_within(x, eps)
+        for begin in range(0, len(sparse_points), QUERY_BATCH_SIZE):
+            batch = sparse_points[begin:begin + QUERY_BATCH_SIZE]
+            core[batch] = count_within(sorted_points[batch]) >= min_samples
+    return core
+
+def core_mask(points, eps, min_samples):
+    """(N,) True for DBSCAN core points (>= min_samples points within eps)"""
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    mask = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return mask
+
+    grid = _CellGrid(points, eps / np.sqrt(points.shape[1]), eps)
+    mask[grid.order] = _core_flags(grid, points[grid.order], eps, min_samples)
+    return mask
+
+def grid_dbscan(points, eps, min_samples, core=None, index=None):
+    """
+    DBSCAN over a uniform grid hash
+
+    Args:
+        points: (N, d) coordinates (2D projection or 3D)
+        eps: Neighborhood radius
+        min_samples: Minimum neighborhood size (including the point) for a core point
+        core: Optional precomputed (N,) core flags (e.g. from a tiled run)
+        index: Optional outlier_filter.SubsetIndex whose members are these points
+
+    Returns:
+        labels: (N,) cluster labels, -1 for noise
+        core_mask: (N,) True for core points
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    n = len(points)
+    labels = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return labels, np.zeros(0, dtype=bool)
+
+    dim = points.shape[1]
+    eps_sq = float(eps) ** 2
+    grid = _CellGrid(points, eps / np.sqrt(dim), eps)
+    sorted_points = points[grid.order]
+    n_cells = len(grid.keys)
+
+    # Step 1: Core points - dense cells are core outright, only points of sparse
+    # cells count their neighborhood
+    if core is None:
+        core = _core_flags(grid, sorted_points, eps, min_samples, index)
+    else:
+        core = np.asarray(core, dtype=bool)[grid.order]
+
+    # Reorder each cell so its core points form a leading run
+    perm = np.lexsort((~core, grid.cell_of))
+    grid.order = grid.order[perm]
+    sorted_points = sorted_points[perm]
+    core = core[perm]
+    core_count = np.add.reduceat(core.astype(np.int64), grid.start)
+
+    # Step 2: Merge neighboring core cells (union-find via connected components)
+    core_cells = np.flatnonzero(core_count > 0)
+    signs = grid.offset_signs
+    direction_vectors = np.unique(signs[np.any(signs != 0, axis=1)], axis=0)
+    direction_index = {tuple(v): i for i, v in enumerate(direction_vectors)}
+    offset_direction = np.array([direction_index.get(tuple(s), -1) for s in signs])
+    extremes = _directional_extremes(sorted_points, grid, core_count,
+                                     direction_vectors / np.linalg.norm(direction_vectors, axis=1)[:, None])
+    opposite = np.array([direction_index[tuple(-v)] for v in direction_vectors])
+
+    edge_a, edge_b = [], []
+    pending = []
+    for c1, c2, off in grid.neighbor_pairs(core_cells):
+        keep = (c1 < c2) & (core_count[c2] > 0)
+        c1, c2, off = c1[keep], c2[keep], off[keep]
+        if len(c1) == 0:
+            continue
+        # Quick positive test: the core points of each cell closest to the other cell
+        d1 = offset_direction[off]
+        p1 = extremes[c1, d1]
+        p2 = extremes[c2, opposite[d1]]
+        linked = _within_eps(sorted_points, p1, p2, eps_sq)
+        edge_a.append(c1[linked])
+        edge_b.append(c2[linked])
+        pending.append((c1[~linked], c2[~linked]))
+
+    def components(edge_a, edge_b):
+        a = np.concatenate(edge_a) if edge_a else np.zeros(0, dtype=np.int64)
+        b = np.concatenate(edge_b) if edge_b else np.zeros(0, dtype=np.int64)
+        graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(n_cells, n_cells))
+        return connected_components(graph, directed=False)[1]
+
+    component = components(edge_a, edge_b)
+
+    # Exact test for pairs the quick test could not link and union-find has not joined yet
+    if pending:
+        c1 = np.concatenate([p[0] for p in pending])
+        c2 = np.concatenate([p[1] for p in pending])
+        unresolved = component[c1] != component[c2]
+        c1, c2 = c1[unresolved], c2[unresolved]
+        for item, ia, ib in _pair_batches(grid.start[c1], core_count[c1], grid.start[c2], core_count[c2]):
+            linked = np.unique(item[_within_eps(sorted_points, ia, ib, eps_sq)])
+            if len(linked):
+                edge_a.append(c1[linked])
+                edge_b.append(c2[linked])
+        component = components(edge_a, edge_b)
+
+    # Step 3: Number clusters by their lowest-index core point (sklearn order)
+    original_index = grid.order
+    first_core = np.full(n_cells, n, dtype=np.int64)
+    core_points = np.flatnonzero(core)
+    np.minimum.at(first_core, component[grid.cell_of[core_points]], original_index[core_points])
+    present = np.flatnonzero(first_core < n)
+    cluster_of_component = np.full(n_cells, -1, dtype=np.int64)
+    cluster_of_component[present[np.argsort(first_core[present])]] = np.arange(len(present))
+
+    sorted_labels = np.full(n, -1, dtype=np.int64)
+    sorted_labels[core_points] = cluster_of_component[component[grid.cell_of[core_points]]]
+
+    # Step 4: Border points take the lowest label among core points within eps
+    # (a non-core point has fewer than min_samples neighbors, so lists stay small)
+    border_candidates = np.flatnonzero(~core)
+    if len(border_candidates) and len(core_points):
+        if index is None:
+            core_tree = cKDTree(sorted_points[core_points])
+            core_labels = sorted_labels[core_points]
+        else:
+            # Shared index: neighbors are any member points, non-core ones never win the minimum
+            core_labels = np.full(n, n, dtype=np.int64)
+            core_labels[original_index[core_points]] = sorted_labels[core_points]
+        for begin in range(0, len(border_candidates), QUERY_BATCH_SIZE):
+            batch = border_candidates[begin:begin + QUERY_BATCH_SIZE]
+            if index is None:
+                neighbors = core_tree.query_ball_point(sorted_points[batch], eps, workers=-1)
+                lengths = np.fromiter((len(x) for x in neighbors), dtype=np.int64, count=len(batch))
+                flat = np.fromiter(itertools.chain.from_iterable(neighbors), dtype=np.int64, count=lengths.sum())
+            else:
+                flat, lengths = index.neighbors_within(sorted_points[batch], eps)
+            reached = lengths > 0
+            if not reached.any():
+                continue
+            group_start = np.cumsum(lengths[reached]) - lengths[reached]
+            nearest = np.minimum.reduceat(core_labels[flat], group_start)
+            sorted_labels[batch[reached]] = np.where(nearest < n, nearest, -1)
+
+    labels[original_index] = sorted_labels
+    core_mask = np.zeros(n, dtype=bool)
+    core_mask[original_index[core]] = True
+    return labels, core_mask
+
+class GridDBSCAN:
+    """sklearn.cluster.DBSCAN-compatible wrapper around grid_dbscan()"""
+
+    def __init__(self, eps=0.5, min_samples=5, **kwargs):
+        # Extra sklearn arguments (n_jobs, algorithm, ...) are accepted and ignored
+        self.eps = eps
+        self.min_samples = min_samples
+
+    def fit(self, X, y=None):
+        self.labels_, core_mask = grid_dbscan(X, self.eps, self.min_samples)
+        self.core_sample_indices_ = np.flatnonzero(core_mask)
+        self.components_ = np.asarray(X)[self.core_sample_indices_]
+        return self
+
+    def fit_predict(self, X, y=None):
+        return self.fit(X).labels_
+
+def dbscan_labels(points, eps, min_samples, class_name=None, engine=None, index=None):
+    """
+    DBSCAN labels with the engine configured for a class
+
+    Args:
+        points: (N, d) coordinates
+        eps, min_samples: DBSCAN parameters
+        class_name: Class directory name used to look up CLASS_ENGINES
+        engine: Explicit engine ("grid", "tiled" or "sklearn"), overrides the class setting
+        index: Optional outlier_filter.SubsetIndex over these points (from the
+               outlier step), reused instead of building another kd-tree
+
+    Returns:
+        labels: (N,) cluster labels, -1 for noise
+    """
+    if engine is None:
+        engine = CLASS_ENGINES.get(class_name, DEFAULT_ENGINE)
+
+    if engine == "grid":
+        return grid_dbscan(points, eps, min_samples, index=index)[0]
+    if engine == "tiled":
+        from tiled_dbscan import tiled_dbscan
+        return tiled_dbscan(points, eps, min_samples, index=index)[0]
+    if engine == "sklearn":
+        from sklearn.cluster import DBSCAN
+        return DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1).fit(points).labels_
+
+    raise ValueError(f"Unknown clustering engine: {engine}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Per-Chunk Ground Elevation Model
+Coarse DTM built once per chunk from the ground-like classes, so extractors
+measure heights above the local ground instead of a global z percentile or
+the chunk's minimum z (both wrong on sloped streets)
+
+1. Ground points (2_Roads, 3_Sidewalks, 4_OtherGround) are binned into a 2m
+   grid; each cell takes a low z percentile (robust to curbs and clutter)
+2. Empty cells take the value of the nearest filled cell
+3. The grid is stored as a small float32 .npy raster plus a JSON sidecar
+   (origin, cell size, source fingerprints) under <classes_base>/ground_model/
+4. height_above_ground(points) is a vectorized bilinear lookup; the ground
+   points are never touched again
+
+Usage:
+    python3 ground_model.py <chunk_path> [--rebuild]
+"""
+
+import os
+import sys
+import json
+import numpy as np
+from scipy import ndimage
+from point_cache import load_xyz, cache_key
+from extractor_common import resolve_chunk_path, class_file, height_filter
+
+GROUND_CLASSES = ("2_Roads", "3_Sidewalks", "4_OtherGround")
+
+# DTM cell size (m)
+GROUND_CELL_SIZE = 2.0
+
+# z percentile taken per cell
+GROUND_CELL_PERCENTILE = 10
+
+# Ground model files, relative to the classes directory
+GROUND_DIRNAME = "ground_model"
+GROUND_RASTER = "ground_dtm.npy"
+GROUND_METADATA = "ground_dtm.json"
+
+# Minimum height above ground kept by each extractor's height filter (m)
+GROUND_CLEARANCE = {
+    "6_Buildings": 1.0,
+    "8_OtherVegetation": 0.2,
+    "11_Wires": 3.0,
+}
+
+class GroundModel:
+    """Coarse DTM raster with vectorized ground lookups"""
+
+    def __init__(self, grid, origin, cell_size):
+        self.grid = np.asarray(grid, dtype=np.float32)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.cell_size = float(cell_size)
+
+    def ground_z(self, xy):
+        """
+        Bilinear ground elevation at (N, 2+) positions
+
+        Grid values sit at cell centers; positions outside the grid are
+        clamped to its border.
+        """
+        xy = np.asarray(xy, dtype=np.float64)
+        rows, cols = self.grid.shape
+        u = np.clip((xy[:, 0] - self.origin[0]) / self.cell_size - 0.5, 0.0, cols - 1)
+        v = np.clip((xy[:, 1] - self.origin[1]) / self.cell_size - 0.5, 0.0, rows - 1)
+
+        c0 = np.minimum(np.floor(u).astype(np.int64), max(cols - 2, 0))
+        r0 = np.minimum(np.floor(v).astype(np.int64), max(rows - 2, 0))
+        c1 = np.minimum(c0 + 1, cols - 1)
+        r1 = np.minimum(r0 + 1, rows - 1)
+        fu, fv = u - c0, v - r0
+
+        bottom = self.grid[r0, c0] * (1 - fu) + self.grid[r0, c1] * fu
+        top = self.grid[r1, c0] * (1 - fu) + self.grid[r1, c1] * fu
+        return bottom * (1 - fv) + top * fv
+
+    def height_above_ground(self, points):
+        """(N,) z minus the ground elevation below each point"""
+        points = np.asarray(points)
+        return points[:, 2] - self.ground_z(points)
+
+def build_ground_grid(points, cell_size=GROUND_CELL_SIZE, percentile=GROUND_CELL_PERCENTILE):
+    """
+    DTM grid from ground points
+
+    Returns:
+        grid: (rows, cols) float32 ground elevation per cell (cell centers)
+        origin: (x, y) of the lower-left grid corner
+    """
+    origin = np.floor(points[:, :2].min(axis=0) / cell_size) * cell_size
+    cells = np.floor((points[:, :2] - origin) / cell_size).astype(np.int64)
+    cols, rows = cells.max(axis=0) + 1
+    flat = cells[:, 1] * cols + cells[:, 0]
+
+    # Per-cell percentile: sort by (cell, z), pick the rank inside each cell
+    order = np.lexsort((points[:, 2], flat))
+    flat_sorted = flat[order]
+    filled, starts, counts = np.unique(flat_sorted, return_index=True, return_counts=True)
+    ranks = starts + np.floor((counts - 1) * percentile / 100.0).astype(np.int64)
+
+    grid = np.full(rows * cols, np.nan)
+    grid[filled] = points[order[ranks], 2]
+    grid = grid.reshape(rows, cols)
+
+    # Nearest filled cell for the gaps
+    empty = np.isnan(grid)
+    if empty.any():
+        _, (near_r, near_c) = ndimage.distance_transform_edt(empty, return_indices=True)
+        grid = grid[near_r, near_c]
+
+    return grid.astype(np.float32), origin
+
+def _ground_paths(classes_base):
+    ground_dir = os.path.join(classes_base, GROUND_DIRNAME)
+    return ground_dir, os.path.join(ground_dir, GROUND_RASTER), os.path.join(ground_dir, GROUND_METADATA)
+
+def _source_fingerprints(classes_base):
+    """cache_key of every available ground class file"""
+    fingerprints = {}
+    for class_name in GROUND_CLASSES:
+        laz_file = class_file(classes_base, class_name)
+        if os.path.exists(laz_file):
+            fingerprints[class_name] = cache_key(laz_file)
+    return fingerprints
+
+def build_ground_model(classes_base, cell_size=GROUND_CELL_SIZE):
+    """
+    Build and store the DTM of one chunk
+
+    Returns:
+        GroundModel, or None if the chunk has no ground points
+    """
+    fingerprints = _source_fingerprints(classes_base)
+    arrays = [load_xyz(class_file(classes_base, class_name)) for class_name in fingerprints]
+    arrays = [points for points in arrays if len(points)]
+    if not arrays:
+        return None
+
+    points = np.concatenate(arrays)
+    grid, origin = build_ground_grid(points, cell_size)
+
+    ground_dir, raster_file, metadata_file = _ground_paths(classes_base)
+    os.makedirs(ground_dir, exist_ok=True)
+    temp_file = f"{raster_file}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        np.save(f, grid)
+    os.replace(temp_file, raster_file)
+
+    with open(metadata_file, 'w') as f:
+        json.dump({
+            "origin": [float(origin[0]), float(origin[1])],
+            "cell_size": cell_size,
+            "shape": list(grid.shape),
+            "percentile": GROUND_CELL_PERCENTILE,
+            "ground_points": len(points),
+            "sources": fingerprints
+        }, f, indent=2)
+
+    return GroundModel(grid, origin, cell_size)
+
+# Models already loaded in this process, by classes directory
+_MODELS = {}
+
+def load_ground_model(classes_base, build=True):
+    """
+    DTM of a chunk: from memory, from its .npy raster, or built on demand
+
+    The stored raster is rebuilt when a ground class file changed.
+
+    Returns:
+        GroundModel, or None if the chunk has no ground classes
+    """
+    classes_base = os.path.abspath(classes_base)
+    if classes_base in _MODELS:
+        return _MODELS[classes_base]
+
+    _, raster_file, metadata_file = _ground_paths(classes_base)
+    model = None
+    try:
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+        if metadata.get("sources") == _source_fingerprints(classes_base):
+            model = GroundModel(np.load(raster_file), metadata["origin"], metadata["cell_size"])
+    except (OSError, ValueError, KeyError):
+        model = None
+
+    if model is None and build:
+        try:
+            model = build_ground_model(classes_base)
+        except Exception as e:
+            print(f"⚠️  Ground model unavailable: {e}")
+            model = None
+
+    if model is not None:
+        _MODELS[classes_base] = model
+    return model
+
+def ground_height_filter(points, classes_base, class_name, percentile):
+    """
+    Drop points close to the ground
+
+    Uses the chunk DTM (GROUND_CLEARANCE of the class above the local
+    ground) and falls back to the global z percentile when the chunk has no
+    ground classes.
+
+    Returns:
+        (points, description of the threshold for logging)
+    """
+    ground = load_ground_model(classes_base) if classes_base else None
+    if ground is None or class_name not in GROUND_CLEARANCE:
+        filtered, threshold = height_filter(points, percentile)
+        return filtered, f">{threshold:.1f}m"
+
+    clearance = GROUND_CLEARANCE[class_name]
+    return points[ground.height_above_ground(points) > clearance], f">{clearance:.1f}m above ground"
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] != "--rebuild"):
+        print("Usage: python3 ground_model.py <chunk_path> [--rebuild]")
+        print("Examples:")
+        print("  python3 ground_model.py /path/to/chunk_1")
+        print("  python3 ground_model.py /path/to/chunk_1/compressed/filtred_by_classes --rebuild")
+        sys.exit(1)
+
+    classes_base, chunk_name = resolve_chunk_path(sys.argv[1])
+    if classes_base is None:
+        print(f"❌ Invalid path structure. Expected chunk directory or filtred_by_classes directory")
+        sys.exit(1)
+
+    if len(sys.argv) == 3:
+        ground = build_ground_model(classes_base)
+    else:
+        ground = load_ground_model(classes_base)
+
+    if ground is None:
+        print(f"❌ No ground classes found in {classes_base} ({', '.join(GROUND_CLASSES)})")
+        sys.exit(1)
+
+    rows, cols = ground.grid.shape
+    print(f"✅ Ground model for {chunk_name}: {cols}x{rows} cells of {ground.cell_size}m, "
+          f"z {np.nanmin(ground.grid):.1f}-{np.nanmax(ground.grid):.1f}m")
+    print(f"📁 {_ground_paths(classes_base)[1]}")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+In-Process LAS/LAZ Point Loader
+Decodes LAS point records straight into NumPy arrays
+Replaces the PDAL readers.las -> writers.text -> np.loadtxt round-trip
+
+- Uncompressed LAS: header parsed with struct, point records memory-mapped,
+  only the requested dimensions are touched
+- Compressed LAZ: decompressed in-process with laspy (lazrs/laszip backend)
+  or the PDAL Python bindings, falling back to `pdal translate` into a
+  temporary binary LAS when neither is installed
+"""
+
+import os
+import sys
+import json
+import struct
+import subprocess
+import tempfile
+import numpy as np
+from voxel_grid import voxel_groups
+
+# Dimensions the extractors care about and their output dtypes
+LAS_DIMENSIONS = {
+    "X": np.float64,
+    "Y": np.float64,
+    "Z": np.float64,
+    "Intensity": np.uint16,
+    "Classification": np.uint8,
+}
+
+# Point record length per point data format (LAS 1.0 - 1.4)
+POINT_FORMAT_SIZES = {
+    0: 20, 1: 28, 2: 26, 3: 34, 4: 57, 5: 63,
+    6: 30, 7: 36, 8: 38, 9: 59, 10: 67,
+}
+
+# Rows decoded per batch when streaming compressed data
+READ_BATCH_SIZE = 2_000_000
+
+def read_las_header(las_path):
+    """
+    Parse the public header block of a LAS/LAZ file
+
+    Returns:
+        header: dict with point format, record length, point count, data offset,
+                scale/offset triples and bounds
+    """
+    with open(las_path, 'rb') as f:
+        raw = f.read(375)
+
+    if len(raw) < 227 or raw[:4] != b'LASF':
+        raise ValueError(f"Not a LAS/LAZ file: {las_path}")
+
+    version_major, version_minor = struct.unpack_from('<BB', raw, 24)
+    header_size, offset_to_points = struct.unpack_from('<HI', raw, 94)
+    point_format_raw, record_length, legacy_count = struct.unpack_from('<BHI', raw, 104)
+    scale = struct.unpack_from('<3d', raw, 131)
+    offset = struct.unpack_from('<3d', raw, 155)
+    max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from('<6d', raw, 179)
+
+    point_count = legacy_count
+    if (version_major, version_minor) >= (1, 4) and len(raw) >= 255:
+        point_count = struct.unpack_from('<Q', raw, 247)[0] or legacy_count
+
+    # LAZ files flag compression in the two high bits of the format id
+    compressed = bool(point_format_raw & 0xC0) or las_path.lower().endswith('.laz')
+
+    return {
+        "version": f"{version_major}.{version_minor}",
+        "header_size": header_size,
+        "offset_to_points": offset_to_points,
+        "point_format": point_format_raw & 0x3F,
+        "record_length": record_length,
+        "point_count": int(point_count),
+        "scale": scale,
+        "offset": offset,
+        "min_x": min_x, "max_x": max_x,
+        "min_y": min_y, "max_y": max_y,
+        "min_z": min_z, "max_z": max_z,
+        "compressed": compressed,
+    }
+
+def _record_dtype(point_format, record_length, dimensions):
+    """Strided record dtype exposing only the requested raw fields"""
+    legacy = point_format <= 5
+    layout = {
+        "X": ('<i4', 0),
+        "Y": ('<i4', 4),
+        "Z": ('<i4', 8),
+        "Intensity": ('<u2', 12),
+        "Classification": ('u1', 15 if legacy else 16),
+    }
+
+    names, formats, offsets = [], [], []
+    for dim in dimensions:
+        fmt, off = layout[dim]
+        names.append(dim)
+        formats.append(fmt)
+        offsets.append(off)
+
+    return np.dtype({"names": names, "formats": formats,
+                     "offsets": offsets, "itemsize": record_length})
+
+def _output_array(count, dimensions):
+    return np.empty(count, dtype=[(dim, LAS_DIMENSIONS[dim]) for dim in dimensions])
+
+def _decode_uncompressed(las_path, header, dimensions):
+    """Memory-map raw point records and decode requested dimensions"""
+    count = header["point_count"]
+    minimum_length = POINT_FORMAT_SIZES.get(header["point_format"])
+    if minimum_length is None or header["record_length"] < minimum_length:
+        raise ValueError(f"Unsupported point format {header['point_format']} "
+                         f"(record length {header['record_length']})")
+
+    out = _output_array(count, dimensions)
+    if count == 0:
+        return out
+
+    records = np.memmap(las_path, mode='r', offset=header["offset_to_points"],
+                        dtype=_record_dtype(header["point_format"], header["record_length"], dimensions),
+                        shape=(count,))
+
+    axes = {"X": 0, "Y": 1, "Z": 2}
+    for start in range(0, count, READ_BATCH_SIZE):
+        stop = min(start + READ_BATCH_SIZE, count)
+        batch = records[start:stop]
+        for dim in dimensions:
+            if dim in axes:
+                axis = axes[dim]
+                out[dim][start:stop] = batch[dim] * header["scale"][axis] + header["offset"][axis]
+            elif dim == "Classification" and header["point_format"] <= 5:
+                # Legacy formats pack synthetic/keypoint/withheld flags in the top 3 bits
+                out[dim][start:stop] = batch[dim] & 0x1F
+            else:
+                out[dim][start:stop] = batch[dim]
+
+    del records
+    return out
+
+def _decode_with_laspy(las_path, dimensions):
+    import laspy
+
+    if las_path.lower().endswith('.laz') and not laspy.LazBackend.detect_available():
+        raise ImportError("laspy is installed without a LAZ backend (pip install laspy[lazrs])")
+
+    attribute = {"X": "x", "Y": "y", "Z": "z",
+                 "Intensity": "intensity", "Classification": "classification"}
+
+    with laspy.open(las_path) as reader:
+        count = int(reader.header.point_count)
+        out = _output_array(count, dimensions)
+        position = 0
+        for chunk in reader.chunk_iterator(READ_BATCH_SIZE):
+            n = len(chunk)
+            for dim in dimensions:
+                out[dim][position:position + n] = np.asarray(getattr(chunk, attribute[dim]))
+            position += n
+
+    return out[:position]
+
+def _decode_with_pdal_bindings(las_path, dimensions):
+    import pdal
+
+    pipeline = pdal.Pipeline(json.dumps([{"type": "readers.las", "filename": las_path}]))
+    pipeline.execute()
+    array = pipeline.arrays[0]
+
+    out = _output_array(len(array), dimensions)
+    for dim in dimensions:
+        out[dim] = array[dim]
+    return out
+
+def _decode_with_pdal_cli(las_path, dimensions):
+    """Last resort: let PDAL decompress to a binary LAS, then memory-map it"""
+    fd, temp_las = tempfile.mkstemp(suffix='.las', prefix='las_reader_')
+    os.close(fd)
+    try:
+        result = subprocess.run(['pdal', 'translate', las_path, temp_las],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"pdal translate failed: {result.stderr.strip()}")
+        header = read_las_header(temp_las)
+        return _decode_uncompressed(temp_las, header, dimensions)
+    finally:
+        if os.path.exists(temp_las):
+            os.remove(temp_las)
+
+def read_points(las_path, dimensions=("X", "Y", "Z")):
+    """
+    Read the requested dimensions of a LAS/LAZ file into a structured array
+
+    Args:
+        las_path: Path to .las or .laz file
+        dimensions: Subset of LAS_DIMENSIONS to decode
+
+    Returns:
+        points: NumPy structured array with one field per requested dimension
+    """
+    dimensions = tuple(dimensions)
+    unknown = [dim for dim in dimensions if dim not in LAS_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unsupported dimensions: {unknown} (supported: {list(LAS_DIMENSIONS)})")
+
+    header = read_las_header(las_path)
+
+    if not header["compressed"]:
+        return _decode_uncompressed(las_path, header, dimensions)
+
+    for decoder in (_decode_with_laspy, _decode_with_pdal_bindings):
+        try:
+            return decoder(las_path, dimensions)
+        except ImportError:
+            continue
+
+    return _decode_with_pdal_cli(las_path, dimensions)
+
+def read_xyz(las_path):
+    """Read X/Y/Z of a LAS/LAZ file as an (N, 3) float64 array"""
+    points = read_points(las_path, ("X", "Y", "Z"))
+    return np.column_stack((points["X"], points["Y"], points["Z"]))
+
+def sample_points(points, radius):
+    """
+    Thin points to roughly one per radius-sized cell
+    In-process stand-in for PDAL filters.sample used by the road scripts
+    """
+    if len(points) == 0:
+        return points
+
+    first_index, _, _ = voxel_groups(points[:, :3], radius)
+    return points[np.sort(first_index)]
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 las_reader.py <file.las|file.laz>")
+        sys.exit(1)
+
+    header = read_las_header(sys.argv[1])
+    print(f"📂 {sys.argv[1]}")
+    print(f"📊 LAS {header['version']}, format {header['point_format']}, "
+          f"{header['point_count']:,} points ({'LAZ' if header['compressed'] else 'LAS'})")
+    print(f"📐 X[{header['min_x']:.3f}, {header['max_x']:.3f}] "
+          f"Y[{header['min_y']:.3f}, {header['max_y']:.3f}] "
+          f"Z[{header['min_z']:.3f}, {header['max_z']:.3f}]")
@@ -72,6 +72,15 @@ def load_clustering_results(base_path: str = "/home/prodair/Desktop/MORIUS5090/c
                 centroid_files.remove(regular_file)
             centroid_files.append(clean_file)
 
+        # Globally deduplicated masts (mast_consolidation.py) replace both
+        consolidated_pattern = f"{base_path}/**/centroids/*_Masts_centroids_consolidated.json"
+        for consolidated_file in glob.glob(consolidated_pattern, recursive=True):
+            for replaced in (consolidated_file.replace('_consolidated.json', '.json'),
+                             consolidated_file.replace('_consolidated.json', '_clean.json')):
+                if replaced in centroid_files:
+                    centroid_files.remove(replaced)
+            centroid_files.append(consolidated_file)
+
         # Find all polygon GeoJSON files
         polygon_pattern = f"{base_path}/**/polygons/*_polygons.geojson"
         polygon_files = glob.glob(polygon_pattern, recursive=True)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Global Mast Consolidation
+Removes duplicate masts across all chunks and datasets in one pass
+
+Per-chunk cleanup only sees the masts of one centroids file, so a pole cut
+by a chunk boundary, or present in both the chunk outputs and the unified
+Berkan data, survives twice. This pass:
+
+1. Loads every *12_Masts_centroids*.json under the given roots (the _clean
+   version of a file when both exist, as map_server.py does)
+2. Builds one kd-tree over all mast centroids and finds every pair closer
+   than the proximity radius
+3. Resolves duplicates greedily by point count (larger masts first, a mast
+   is dropped when a kept mast is within the radius); only masts with a
+   larger neighbor enter the sequential part
+4. Writes <name>_consolidated.json next to every source file with its
+   surviving masts
+
+Usage:
+    python3 mast_consolidation.py <root> [<root> ...]
+"""
+
+import os
+import sys
+import glob
+import json
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Masts closer than this are duplicates (m)
+MAST_PROXIMITY_RADIUS = 1.5
+
+MAST_FILES_PATTERN = "*12_Masts_centroids*.json"
+CONSOLIDATED_SUFFIX = "_consolidated.json"
+
+def resolve_duplicates(xy, point_counts, proximity_radius=MAST_PROXIMITY_RADIUS):
+    """
+    Greedy proximity deduplication, larger point count first
+
+    Args:
+        xy: (N, 2) mast centroids
+        point_counts: (N,) points per mast (ties keep input order)
+        proximity_radius: Masts closer than this are duplicates
+
+    Returns:
+        keep: (N,) bool
+        duplicate_of: (N,) index of the kept mast that removed each mast, -1 if kept
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    n = len(xy)
+    keep = np.ones(n, dtype=bool)
+    duplicate_of = np.full(n, -1, dtype=np.int64)
+    if n <= 1:
+        return keep, duplicate_of
+
+    # Rank 0 = most points
+    order = np.argsort(-np.asarray(point_counts), kind='stable')
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+
+    pairs = cKDTree(xy).query_pairs(proximity_radius, output_type='ndarray')
+    if len(pairs):
+        distances = np.linalg.norm(xy[pairs[:, 0]] - xy[pairs[:, 1]], axis=1)
+        pairs = pairs[distances < proximity_radius]
+    if len(pairs) == 0:
+        return keep, duplicate_of
+
+    # Directed edges from every mast to its larger neighbors, grouped per
+    # mast, largest neighbor first
+    swap = rank[pairs[:, 0]] < rank[pairs[:, 1]]
+    smaller = np.where(swap, pairs[:, 1], pairs[:, 0])
+    larger = np.where(swap, pairs[:, 0], pairs[:, 1])
+    edge_order = np.lexsort((rank[larger], smaller))
+    smaller, larger = smaller[edge_order], larger[edge_order]
+
+    # A mast is dropped when its first kept larger neighbor exists; masts are
+    # decided in rank order, so their larger neighbors are already decided
+    conflicted, starts = np.unique(smaller, return_index=True)
+    ends = np.append(starts[1:], len(smaller))
+    for index in np.argsort(rank[conflicted], kind='stable'):
+        mast = conflicted[index]
+        neighbors = larger[starts[index]:ends[index]]
+        kept_neighbors = neighbors[keep[neighbors]]
+        if len(kept_neighbors):
+            keep[mast] = False
+            duplicate_of[mast] = kept_neighbors[0]
+
+    return keep, duplicate_of
+
+def consolidated_path(path):
+    """Output file of a centroids file (_clean and plain sources map to the same name)"""
+    stem = path[:-len(".json")]
+    if stem.endswith("_clean"):
+        stem = stem[:-len("_clean")]
+    return stem + CONSOLIDATED_SUFFIX
+
+def find_mast_files(roots):
+    """
+    Mast centroids files under the roots (or the files themselves)
+
+    Consolidated outputs are skipped, and a _clean file replaces its plain
+    sibling.
+    """
+    files = set()
+    for root in roots:
+        if os.path.isfile(root):
+            files.add(os.path.abspath(root))
+        else:
+            files.update(os.path.abspath(p) for p in glob.glob(os.path.join(root, "**", MAST_FILES_PATTERN), recursive=True))
+
+    files = {f for f in files if not f.endswith(CONSOLIDATED_SUFFIX)}
+    plain_with_clean = {f.replace("_clean.json", ".json") for f in files if f.endswith("_clean.json")}
+    return sorted(files - plain_with_clean)
+
+def load_masts(files):
+    """
+    Read all centroids files
+
+    Returns:
+        documents: list of parsed JSON documents (None where unreadable)
+        xy: (M, 2) centroids of all masts
+        point_counts: (M,)
+        source: (M,) index of the file of every mast
+    """
+    documents, xy, point_counts, source = [], [], [], []
+    for file_index, path in enumerate(files):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  Failed to read {path}: {e}")
+            documents.append(None)
+            continue
+
+        masts = [m for m in data.get('centroids', [])
+                 if m.get('centroid_x') is not None and m.get('centroid_y') is not None]
+        data['centroids'] = masts
+        documents.append(data)
+        xy.extend((m['centroid_x'], m['centroid_y']) for m in masts)
+        point_counts.extend(m.get('point_count', 0) for m in masts)
+        source.extend([file_index] * len(masts))
+
+    return (documents, np.array(xy, dtype=np.float64).reshape(-1, 2),
+            np.array(point_counts, dtype=np.int64), np.array(source, dtype=np.int64))
+
+def consolidate_masts(roots, proximity_radius=MAST_PROXIMITY_RADIUS):
+    """
+    Deduplicate the masts of all centroids files under the roots and write
+    the consolidated files
+
+    Returns:
+        (masts kept, duplicates removed)
+    """
+    files = find_mast_files(roots)
+    if not files:
+        print(f"❌ No {MAST_FILES_PATTERN} files found under: {', '.join(roots)}")
+        return 0, 0
+
+    print(f"📂 Loading {len(files)} mast centroids files...")
+    documents, xy, point_counts, source = load_masts(files)
+    print(f"📊 {len(xy):,} masts")
+
+    print(f"🔄 Resolving duplicates within {proximity_radius}m (one kd-tree, largest first)...")
+    keep, duplicate_of = resolve_duplicates(xy, point_counts, proximity_radius)
+    cross_file = ~keep & (source != source[np.maximum(duplicate_of, 0)])
+
+    # Masts of each file, in their original order
+    file_order = np.argsort(source, kind='stable')
+    file_starts = np.searchsorted(source[file_order], np.arange(len(files) + 1))
+
+    for file_index, (path, data) in enumerate(zip(files, documents)):
+        if data is None:
+            continue
+        members = file_order[file_starts[file_index]:file_starts[file_index + 1]]
+        kept = keep[members]
+        data['centroids'] = [mast for mast, k in zip(data['centroids'], kept) if k]
+        data.setdefault('results', {})
+        data['results']['instances_found'] = len(data['centroids'])
+        data['consolidation'] = {
+            'method': 'global_kdtree_mast_deduplication',
+            'proximity_radius_m': proximity_radius,
+            'source_files': len(files),
+            'input_masts': int(len(members)),
+            'duplicates_removed': int(np.count_nonzero(~kept)),
+            'cross_file_duplicates': int(np.count_nonzero(cross_file[members]))
+        }
+
+        output_file = consolidated_path(path)
+        with open(output_file, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    n_kept = int(np.count_nonzero(keep))
+    n_removed = len(keep) - n_kept
+    print(f"✅ {n_kept:,} masts kept, {n_removed:,} duplicates removed "
+          f"({int(np.count_nonzero(cross_file)):,} across files)")
+    print(f"📁 Wrote {sum(d is not None for d in documents)} *{CONSOLIDATED_SUFFIX} files")
+    return n_kept, n_removed
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 mast_consolidation.py <root> [<root> ...]")
+        print("Examples:")
+        print("  python3 mast_consolidation.py outlast/chunks")
+        print("  python3 mast_consolidation.py outlast/chunks /path/to/data-last-berkan/data")
+        sys.exit(1)
+
+    kept, _ = consolidate_masts(sys.argv[1:])
+    sys.exit(0 if kept > 0 else 1)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Statistical Outlier Filter
+Mean k-NN distance outlier removal shared by the class extractors
+
+- k-NN queries run on all cores (workers=-1) in fixed-size batches, so the
+  distance matrix never exceeds QUERY_BATCH_SIZE x (k + 1)
+- Neighbor count and sigma multiplier are configured per class
+- The kd-tree built for the filter is returned as a SubsetIndex over the
+  inliers and handed to dbscan_labels(index=...), so the clustering step
+  does not build a second tree over the same points
+"""
+
+import itertools
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Points per k-NN / radius query batch
+QUERY_BATCH_SIZE = 200_000
+
+# Outlier test per class: k nearest neighbors and sigma multiplier
+# (a point is an outlier when its mean k-NN distance >= mean + sigma * std)
+OUTLIER_PARAMS = {
+    "6_Buildings": {"k_neighbors": 10, "sigma": 1.2},        # Tight: facades are dense
+    "8_OtherVegetation": {"k_neighbors": 12, "sigma": 1.8},  # Looser for sparse canopy
+    "11_Wires": {"k_neighbors": 8, "sigma": 2.5},            # Loosest, preserves wire endpoints
+}
+DEFAULT_OUTLIER_PARAMS = {"k_neighbors": 10, "sigma": 2.0}
+
+class SubsetIndex:
+    """
+    kd-tree over a superset of the points being clustered
+
+    Neighborhood queries are answered for the member points only: counts
+    subtract the excluded points (a small tree over the removed outliers),
+    neighbor lists drop them.
+    """
+
+    def __init__(self, tree, members):
+        """
+        Args:
+            tree: cKDTree over the full point set
+            members: Sorted indices (into tree.data) of the points being clustered
+        """
+        self.tree = tree
+        self.members = np.asarray(members, dtype=np.int64)
+
+        # Member position of every tree point, -1 for excluded points
+        self.position = np.full(tree.n, -1, dtype=np.int64)
+        self.position[self.members] = np.arange(len(self.members))
+
+        excluded = self.position < 0
+        self.excluded_tree = cKDTree(tree.data[excluded]) if excluded.any() else None
+
+    def __len__(self):
+        return len(self.members)
+
+    def count_within(self, points, r):
+        """(M,) number of member points within r of each query point"""
+        counts = self.tree.query_ball_point(points, r, return_length=True, workers=-1)
+        if self.excluded_tree is not None:
+            counts = counts - self.excluded_tree.query_ball_point(points, r, return_length=True, workers=-1)
+        return counts
+
+    def neighbors_within(self, points, r):
+        """
+        Member neighbors within r of each query point
+
+        Returns:
+            flat: member indices of all neighbors, grouped per query point
+            lengths: (M,) neighbors per query point
+        """
+        neighbors = self.tree.query_ball_point(points, r, workers=-1)
+        lengths = np.fromiter((len(x) for x in neighbors), dtype=np.int64, count=len(points))
+        flat = np.fromiter(itertools.chain.from_iterable(neighbors), dtype=np.int64, count=lengths.sum())
+
+        position = self.position[flat]
+        kept = position >= 0
+        owner = np.repeat(np.arange(len(points)), lengths)
+        return position[kept], np.bincount(owner[kept], minlength=len(points))
+
+def mean_knn_distances(tree, points, k_neighbors):
+    """
+    Mean distance from each point to its k nearest neighbors (itself excluded)
+
+    Args:
+        tree: cKDTree containing the points
+        points: (N, d) query points
+        k_neighbors: Neighbors per point
+    """
+    mean_distances = np.empty(len(points))
+    for begin in range(0, len(points), QUERY_BATCH_SIZE):
+        batch = points[begin:begin + QUERY_BATCH_SIZE]
+        distances, _ = tree.query(batch, k=k_neighbors + 1, workers=-1)
+        mean_distances[begin:begin + QUERY_BATCH_SIZE] = distances[:, 1:].mean(axis=1)
+    return mean_distances
+
+def statistical_outlier_filter(points, class_name=None, k_neighbors=None, sigma=None):
+    """
+    Mean k-NN distance outlier test
+
+    Args:
+        points: (N, d) coordinates
+        class_name: Class directory name used to look up OUTLIER_PARAMS
+        k_neighbors, sigma: Explicit parameters, override the class setting
+
+    Returns:
+        inlier_mask: True where the mean k-NN distance is below mean + sigma * std
+        threshold: Mean k-NN distance threshold in meters
+        index: SubsetIndex of the inliers, reusable by dbscan_labels(index=...)
+    """
+    params = OUTLIER_PARAMS.get(class_name, DEFAULT_OUTLIER_PARAMS)
+    if k_neighbors is None:
+        k_neighbors = params["k_neighbors"]
+    if sigma is None:
+        sigma = params["sigma"]
+
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    tree = cKDTree(points)
+    k_neighbors = min(k_neighbors, len(points) - 1)
+
+    mean_distances = mean_knn_distances(tree, points, k_neighbors)
+    threshold = np.mean(mean_distances) + sigma * np.std(mean_distances)
+    inlier_mask = mean_distances < threshold
+
+    return inlier_mask, threshold, SubsetIndex(tree, np.flatnonzero(inlier_mask))
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Pipeline Orchestrator
+Runs the whole dataset pipeline (stage 1 → 2 → 3 → extractors → cleanup →
+stitching → publishing) as one dependency graph of (chunk, class, step) tasks
+
+- Independent tasks (other chunks, other classes of a chunk) run
+  concurrently on a bounded process pool
+- Every task's status, timing and result is recorded in a JSON manifest
+  after each change, and its output goes to pipeline_logs/<task>.log; a
+  crashed or interrupted run started again skips the finished tasks
+- A failed task blocks only the tasks that depend on it
+- Every task carries a cache spec (input files, parameters, code); a task
+  whose key is in the stage output cache is skipped (stage_cache.py), so a
+  parameter change to one class recomputes only that class's tasks
+
+Graph per chunk:
+    filter (stage 2) → ground model → stage 3 clusters, extractors
+    12_Masts cluster → mast cleanup
+Dataset tasks:
+    chunking (stage 1, with --input) → every chunk
+    all chunks → mast consolidation, stitching → publish → migrate
+
+Usage:
+    python3 pipeline_orchestrator.py <chunks_dir> [--input file.laz] [--tiles] [--workers N]
+                                     [--publish] [--migrate script.py]
+"""
+
+import os
+import io
+import re
+import sys
+import glob
+import json
+import time
+import contextlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from chunk_driver import EXTRACTOR_TASKS, run_extractor
+from extractor_common import class_file
+from ground_model import GROUND_CLASSES, GROUND_DIRNAME, GROUND_RASTER, GROUND_METADATA
+from tiled_dbscan import set_worker_budget
+import stage_cache
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MANIFEST_NAME = "pipeline_manifest.json"
+LOG_DIRNAME = "pipeline_logs"
+
+# Stage 3 classes (CLUSTER_CLASSES in stage3_lightweight_clustering.sh)
+STAGE3_CLASSES = ("7_Trees", "12_Masts", "9_TrafficLights", "10_TrafficSigns")
+
+# Python modules of the extractor tasks (code version of their cache keys)
+EXTRACTOR_MODULES = {
+    "buildings": "python_instance_enhanced.py",
+    "vegetation": "python_vegetation_enhanced.py",
+    "wires": "python_wire_enhanced.py",
+    "roads": "python_road_boundary.py",
+    "sidewalks": "python_road_boundary.py",
+    "masts": "python_mast_enhanced.py",
+}
+
+# Outputs of a chunk read by the dataset tasks
+CHUNK_RESULT_PATTERNS = (
+    "chunk_*/compressed/filtred_by_classes/*/polygons/*.geojson",
+    "chunk_*/compressed/filtred_by_classes/*/lines/*.geojson",
+    "chunk_*/compressed/filtred_by_classes/*/centroids/*_centroids.json",
+    "chunk_*/compressed/filtred_by_classes/*/centroids/*_centroids_clean.json",
+)
+
+# Task states; FINISHED ones are not run again on resume ("cached": output
+# taken from the stage output cache)
+FINISHED = ("done", "skipped", "cached")
+BLOCKING = ("failed", "blocked")
+
+def _task(chunk, class_name, step, action, args, depends=(), cache=None):
+    return {
+        "id": f"{chunk}/{class_name}/{step}",
+        "chunk": chunk,
+        "class": class_name,
+        "step": step,
+        "action": action,
+        "args": args,
+        "depends": [d for d in depends if d is not None],
+        "cache": cache,
+    }
+
+def _cache_spec(inputs, outputs, python=(), shell=(), class_name=None, params=None):
+    """Stage cache spec of a task (see stage_cache.step_key)"""
+    return {
+        "inputs": list(inputs),
+        "outputs": list(outputs),
+        "python": [os.path.join(SCRIPT_DIR, p) for p in python],
+        "shell": [os.path.join(SCRIPT_DIR, s) for s in shell],
+        "class": class_name,
+        "params": params or {},
+    }
+
+def _ground_files(classes_base):
+    ground_dir = os.path.join(classes_base, GROUND_DIRNAME)
+    return [os.path.join(ground_dir, GROUND_RASTER), os.path.join(ground_dir, GROUND_METADATA)]
+
+def _chunk_number(segment_file):
+    """Chunk number of a stage 1 segment (same rule as stage2_class_filtering.sh)"""
+    name = os.path.splitext(os.path.basename(segment_file))[0]
+    match = re.search(r"spatial_segment_(\d+)", name)
+    if match:
+        return match.group(1)
+    digits = re.sub(r"[^0-9]", "", name)
+    return digits or "unknown"
+
+def discover_chunks(chunks_dir):
+    """
+    Chunks of a dataset
+
+    Returns:
+        chunks: list of (chunk name, segment LAZ or None, classes_base)
+    """
+    chunks = {}
+    for segment in glob.glob(os.path.join(chunks_dir, "spatial_segment_*.laz")):
+        chunk = f"chunk_{_chunk_number(segment)}"
+        chunks[chunk] = (segment, os.path.join(chunks_dir, chunk, "compressed", "filtred_by_classes"))
+
+    # Chunks already filtered (segment removed or never present)
+    for classes_base in glob.glob(os.path.join(chunks_dir, "chunk_*", "compressed", "filtred_by_classes")):
+        chunk = os.path.basename(os.path.dirname(os.path.dirname(classes_base)))
+        chunks.setdefault(chunk, (None, classes_base))
+
+    def chunk_key(chunk):
+        number = chunk.split("_")[-1]
+        return (0, int(number), chunk) if number.isdigit() else (1, 0, chunk)
+
+    return [(chunk, *chunks[chunk]) for chunk in sorted(chunks, key=chunk_key)]
+
+def chunk_tasks(chunk, segment, classes_base):
+    """Task graph of one chunk"""
+    tasks = []
+    filter_id = None
+    ground_files = _ground_files(classes_base)
+    # Tile cores decide which objects a tiled chunk keeps (spatial_tiler.keep_owned)
+    tile_manifest = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(classes_base))), "manifest.json")
+    if segment is not None:
+        filter_task = _task(chunk, "*", "filter", "shell",
+                            (["bash", os.path.join(SCRIPT_DIR, "stage2_class_filtering.sh"), segment],),
+                            cache=_cache_spec([segment], [os.path.join(classes_base, "*", "*.laz")],
+                                              ["class_splitter.py"], ["stage2_class_filtering.sh"]))
+        tasks.append(filter_task)
+        filter_id = filter_task["id"]
+
+    ground = _task(chunk, "ground_model", "build", "ground", (classes_base,), [filter_id],
+                   cache=_cache_spec([class_file(classes_base, c) for c in GROUND_CLASSES], ground_files,
+                                     python=["ground_model.py"]))
+    tasks.append(ground)
+
+    cluster_ids = {}
+    for class_name in STAGE3_CLASSES:
+        class_dir = os.path.join(classes_base, class_name)
+        if class_name == "7_Trees":
+            # CHM engine: crowns over the ground model, also writes polygons
+            inputs = [class_file(classes_base, class_name), tile_manifest] + ground_files
+            outputs = [os.path.join(class_dir, "centroids", f"{class_name}_centroids.json"),
+                       os.path.join(class_dir, "polygons", f"{class_name}_polygons.geojson")]
+            python = ["tree_segmentation.py"]
+        else:
+            inputs = [class_file(classes_base, class_name), tile_manifest]
+            outputs = [os.path.join(class_dir, "centroids", f"{class_name}_centroids.json")]
+            python = ["stage3_centroids.py"]
+        task = _task(chunk, class_name, "cluster", "shell",
+                     (["bash", os.path.join(SCRIPT_DIR, "stage3_lightweight_clustering.sh"), classes_base, class_name],
+                      class_file(classes_base, class_name)),
+                     [ground["id"]],
+                     cache=_cache_spec(inputs, outputs, python, ["stage3_lightweight_clustering.sh"], class_name))
+        tasks.append(task)
+        cluster_ids[class_name] = task["id"]
+
+    for task_name, class_name in EXTRACTOR_TASKS:
+        class_dir = os.path.join(classes_base, class_name)
+        python = [EXTRACTOR_MODULES[task_name]]
+        if task_name == "masts":
+            centroids_file = os.path.join(class_dir, "centroids", f"{class_name}_centroids.json")
+            tasks.append(_task(chunk, class_name, "clean", "extract",
+                               (task_name, class_name, classes_base, chunk),
+                               [cluster_ids.get(class_name)],
+                               cache=_cache_spec([centroids_file] + ground_files,
+                                                 [centroids_file.replace('.json', '_clean.json')],
+                                                 python, class_name=class_name)))
+        else:
+            outputs = [os.path.join(class_dir, "polygons", f"{class_name}_polygons.geojson"),
+                       os.path.join(class_dir, "lines", f"{class_name}_lines.geojson")]
+            tasks.append(_task(chunk, class_name, "extract", "extract",
+                               (task_name, class_name, classes_base, chunk),
+                               [ground["id"]],
+                               cache=_cache_spec([class_file(classes_base, class_name), tile_manifest] + ground_files,
+                                                 outputs, python, class_name=class_name)))
+    return tasks
+
+def dataset_tasks(chunks_dir, publish=False, migrate=None):
+    """
+    Full task graph of a dataset
+
+    With input_laz, stage 1 runs first and the chunk tasks are added once its
+    segments exist (see run_pipeline).
+    """
+    chunk_list = discover_chunks(chunks_dir)
+    tasks = []
+    for chunk, segment, classes_base in chunk_list:
+        tasks.extend(chunk_tasks(chunk, segment, classes_base))
+    per_chunk = [task["id"] for task in tasks]
+
+    from mast_consolidation import MAST_FILES_PATTERN, CONSOLIDATED_SUFFIX
+    mast_files = os.path.join(chunks_dir, "**", MAST_FILES_PATTERN)
+    consolidated_files = os.path.join(chunks_dir, "**", f"*{CONSOLIDATED_SUFFIX}")
+    chunk_results = [os.path.join(chunks_dir, p) for p in CHUNK_RESULT_PATTERNS]
+    stitched_files = os.path.join(chunks_dir, "stitched", "**", "*")
+
+    consolidate = _task("dataset", "12_Masts", "consolidate", "consolidate", (chunks_dir,), per_chunk,
+                        cache=_cache_spec([mast_files], [consolidated_files], ["mast_consolidation.py"]))
+    stitch = _task("dataset", "*", "stitch", "stitch", (chunks_dir,), per_chunk,
+                   cache=_cache_spec(chunk_results + [os.path.join(chunks_dir, "manifest.json")], [stitched_files],
+                                     ["chunk_stitching.py"]))
+    tasks.extend([consolidate, stitch])
+
+    # Publishing writes outside the dataset: keyed on its inputs, no outputs recorded
+    published_inputs = chunk_results + [stitched_files, consolidated_files]
+    publish_id = None
+    if publish:
+        publish_task = _task("dataset", "*", "publish", "shell",
+                             ([sys.executable, os.path.join(SCRIPT_DIR, "create_data_folder.py"), chunks_dir],),
+                             [consolidate["id"], stitch["id"]],
+                             cache=_cache_spec(published_inputs, [], ["create_data_folder.py"]))
+        tasks.append(publish_task)
+        publish_id = publish_task["id"]
+
+    if migrate:
+        tasks.append(_task("dataset", "*", "migrate", "shell",
+                           ([sys.executable, os.path.abspath(migrate)],),
+                           [publish_id, consolidate["id"], stitch["id"]],
+                           cache=_cache_spec(published_inputs, [], [os.path.abspath(migrate)])))
+    return tasks
+
+def chunking_task(input_laz, output_dir, tiles=False):
+    """Stage 1 task (segments land in <output_dir>/chunks; tiles: buffered XY tiles)"""
+    mode = "tiles" if tiles else "divider"
+    return _task("dataset", "*", "chunking", "shell",
+                 (["bash", os.path.join(SCRIPT_DIR, "stage1_spatial_chunking_fixed.sh"), input_laz, output_dir, mode],),
+                 cache=_cache_spec([input_laz],
+                                   [os.path.join(output_dir, "chunks", "spatial_segment_*.laz"),
+                                    os.path.join(output_dir, "chunks", "manifest.json")],
+                                   ["spatial_tiler.py"] if tiles else [], ["stage1_spatial_chunking_fixed.sh"],
+                                   params={"mode": mode}))
+
+def run_task(action, args, cache=None, cache_root=None):
+    """
+    Execute one task (in a worker process)
+
+    With a cache spec the task is skipped when its key is in the stage output
+    cache of cache_root, and its outputs are stored there after a run.
+
+    Returns:
+        (status, result, log)
+    """
+    log = io.StringIO()
+    status, result = "done", None
+
+    with contextlib.redirect_stdout(log):
+        key = None
+        if cache is not None:
+            try:
+                key = stage_cache.step_key(cache, cache_root)
+                if stage_cache.lookup(cache_root, key):
+                    print(f"♻️  Stage cache hit: {key[:12]}")
+                    return "cached", None, log.getvalue()
+                removed = stage_cache.clear_outputs(cache)
+                if removed:
+                    print(f"🗑️  Removed {removed} outputs of the previous run")
+            except Exception as e:
+                print(f"⚠️  Stage cache unavailable: {e}")
+                key = None
+
+        try:
+            if action == "shell":
+                command = args[0]
+                required = args[1] if len(args) > 1 else None
+                if required is not None and not os.path.exists(required):
+                    print(f"⚠️  Input not found, skipping: {required}")
+                    return "skipped", None, log.getvalue()
+                completed = subprocess.run(command, cwd=SCRIPT_DIR, capture_output=True, text=True)
+                print(completed.stdout, end='')
+                print(completed.stderr, end='')
+                result = completed.returncode
+                if completed.returncode != 0:
+                    status = "failed"
+
+            elif action == "ground":
+                from ground_model import load_ground_model
+                ground = load_ground_model(args[0])
+                result = None if ground is None else list(ground.grid.shape)
+
+            elif action == "extract":
+                task_name, class_name, classes_base, chunk = args
+                if task_name == "masts":
+                    required = f"{classes_base}/12_Masts/centroids/12_Masts_centroids.json"
+                else:
+                    required = class_file(classes_base, class_name)
+                if not os.path.exists(required):
+                    print(f"⚠️  Input not found, skipping: {required}")
+                    return "skipped", None, log.getvalue()
+                _, result, _, extractor_log, error = run_extractor(task_name, class_name, classes_base, chunk)
+                print(extractor_log, end='')
+                if error is not None:
+                    status = "failed"
+
+            elif action == "consolidate":
+                from mast_consolidation import consolidate_masts
+                result = consolidate_masts([args[0]])[0]
+
+            elif action == "stitch":
+                from chunk_stitching import stitch_chunks
+                result = len(stitch_chunks(args[0]))
+
+            else:
+                raise ValueError(f"Unknown task action: {action}")
+
+        except Exception as e:
+            print(f"❌ {action} task failed: {e}")
+            status = "failed"
+
+        if status == "done" and key is not None:
+            try:
+                stored = stage_cache.store(cache_root, key, cache)
+                print(f"📦 Stage cache: {stored} outputs stored under {key[:12]}")
+            except Exception as e:
+                print(f"⚠️  Failed to store outputs in the stage cache: {e}")
+
+    return status, result, log.getvalue()
+
+def load_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"tasks": {}}
+
+def save_manifest(manifest, manifest_file):
+    """Atomic write, so a crash never leaves a truncated manifest"""
+    temp_file = f"{manifest_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_file, manifest_file)
+
+def run_graph(tasks, manifest, manifest_file, log_dir, max_workers, cache_root=None):
+    """
+    Run every unfinished task once its dependencies are done
+
+    Tasks with a cache spec are always submitted: the stage output cache
+    (under cache_root, default: the manifest's directory) decides whether
+    they run.
+
+    Returns:
+        statuses: {task id: status}
+    """
+    if cache_root is None:
+        cache_root = os.path.dirname(os.path.abspath(manifest_file))
+    records = manifest.setdefault("tasks", {})
+    status = {}
+    for task in tasks:
+        # Tasks come in dependency order: a finished task runs again when one
+        # of its dependencies does (e.g. stitching after a new chunk)
+        previous = records.get(task["id"], {}).get("status")
+        rerun_deps = any(status.get(dep) == "pending" for dep in task["depends"])
+        keep = previous in FINISHED and not rerun_deps and task.get("cache") is None
+        status[task["id"]] = previous if keep else "pending"
+        record = records.setdefault(task["id"], {})
+        record.update({"chunk": task["chunk"], "class": task["class"], "step": task["step"],
+                       "depends": task["depends"], "status": status[task["id"]]})
+    save_manifest(manifest, manifest_file)
+
+    finished = sum(s in FINISHED for s in status.values())
+    if finished:
+        print(f"♻️  Resuming: {finished}/{len(tasks)} tasks already finished")
+
+    os.makedirs(log_dir, exist_ok=True)
+    pending = [task for task in tasks if status[task["id"]] == "pending"]
+    running = {}
+
+    # Tasks share the CPUs: each tiled_dbscan gets its slice of them
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=set_worker_budget,
+                             initargs=((os.cpu_count() or 1) // max_workers,)) as executor:
+        while pending or running:
+            # Propagate failures, then submit every task whose dependencies are done
+            still_pending = []
+            for task in pending:
+                dep_status = [status.get(dep, "done") for dep in task["depends"]]
+                if any(s in BLOCKING for s in dep_status):
+                    status[task["id"]] = "blocked"
+                    records[task["id"]]["status"] = "blocked"
+                    print(f"  ⛔ {task['id']} blocked")
+                elif all(s in FINISHED for s in dep_status):
+                    status[task["id"]] = "running"
+                    records[task["id"]].update({"status": "running", "started": time.time()})
+                    future = executor.submit(run_task, task["action"], task["args"],
+                                             task.get("cache"), cache_root)
+                    running[future] = (task, time.time())
+                else:
+                    still_pending.append(task)
+            pending = still_pending
+            save_manifest(manifest, manifest_file)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, start = running.pop(future)
+                try:
+                    task_status, result, log = future.result()
+                except Exception as e:
+                    task_status, result, log = "failed", None, f"❌ Worker failed: {e}\n"
+
+                elapsed = time.time() - start
+                log_file = os.path.join(log_dir, task["id"].replace("/", "__").replace("*", "all") + ".log")
+                with open(log_file, 'w') as f:
+                    f.write(log)
+
+                status[task["id"]] = task_status
+                records[task["id"]].update({"status": task_status, "result": result,
+                                            "elapsed_s": round(elapsed, 1), "log": log_file,
+                                            "finished": time.time()})
+                records[task["id"]]["attempts"] = records[task["id"]].get("attempts", 0) + 1
+
+                icon = {"done": "✅", "skipped": "⏭️ ", "cached": "♻️ ", "failed": "❌"}.get(task_status, "❔")
+                completed = sum(s in FINISHED or s in BLOCKING for s in status.values())
+                print(f"  {icon} [{completed}/{len(tasks)}] {task['id']} ({elapsed:.1f}s)")
+
+            save_manifest(manifest, manifest_file)
+
+    return status
+
+def run_pipeline(chunks_dir, input_laz=None, max_workers=None, publish=False, migrate=None, tiles=False):
+    """
+    Run (or resume) the pipeline of a dataset
+
+    Args:
+        chunks_dir: Directory of stage 1 segments / chunk_N trees
+                    (with input_laz: stage 1 output directory, segments in <chunks_dir>/chunks)
+        input_laz: Optional source LAZ, runs stage 1 first
+        tiles: Stage 1 as buffered XY tiles (spatial_tiler.py) instead of filters.divider
+        max_workers: Process pool size (default: CPU count)
+        publish: Run create_data_folder.py at the end
+        migrate: Optional migrate script run after publishing
+
+    Returns:
+        statuses: {task id: status}
+    """
+    chunks_dir = os.path.abspath(chunks_dir)
+    os.makedirs(chunks_dir, exist_ok=True)
+    manifest_file = os.path.join(chunks_dir, MANIFEST_NAME)
+    log_dir = os.path.join(chunks_dir, LOG_DIRNAME)
+    manifest = load_manifest(manifest_file)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    print(f"\n🚀 === PIPELINE ORCHESTRATOR ===")
+    print(f"📂 Dataset: {chunks_dir}")
+    print(f"⚙️  Workers: {max_workers}")
+    print(f"📁 Manifest: {manifest_file}")
+
+    statuses = {}
+    if input_laz is not None:
+        print(f"\n🔄 Stage 1: spatial chunking of {os.path.basename(input_laz)}")
+        statuses.update(run_graph([chunking_task(os.path.abspath(input_laz), chunks_dir, tiles)],
+                                  manifest, manifest_file, log_dir, 1))
+        if any(s in BLOCKING for s in statuses.values()):
+            print(f"❌ Stage 1 failed, see {log_dir}")
+            return statuses
+        chunks_dir = os.path.join(chunks_dir, "chunks")
+
+    tasks = dataset_tasks(chunks_dir, publish, migrate)
+    n_chunks = len({task["chunk"] for task in tasks} - {"dataset"})
+    if n_chunks == 0:
+        print(f"❌ No segments or chunks found in {chunks_dir}")
+        return statuses
+
+    print(f"\n🔄 Running {len(tasks)} tasks over {n_chunks} chunks")
+    start = time.time()
+    statuses.update(run_graph(tasks, manifest, manifest_file, log_dir, max_workers))
+
+    counts = {}
+    for s in statuses.values():
+        counts[s] = counts.get(s, 0) + 1
+    print(f"\n📊 === PIPELINE SUMMARY ===")
+    for s in ("done", "cached", "skipped", "failed", "blocked"):
+        if counts.get(s):
+            print(f"  {s:<8} {counts[s]:>5}")
+    print(f"  ⏱️  Wall time: {time.time() - start:.1f}s")
+    if counts.get("failed") or counts.get("blocked"):
+        print(f"⚠️  Fix the failed tasks (logs in {log_dir}) and run again to resume")
+    return statuses
+
+def main():
+    args = sys.argv[1:]
+    options = {"--input": None, "--workers": None, "--migrate": None}
+    publish = "--publish" in args
+    tiles = "--tiles" in args
+    args = [a for a in args if a not in ("--publish", "--tiles")]
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            if index + 1 >= len(args):
+                args = []
+                break
+            options[option] = args[index + 1]
+            del args[index:index + 2]
+
+    if len(args) != 1:
+        print("Usage: python3 pipeline_orchestrator.py <chunks_dir> [--input file.laz] [--tiles] [--workers N] [--publish] [--migrate script.py]")
+        print("Examples:")
+        print("  python3 pipeline_orchestrator.py out/chunks --workers 8")
+        print("  python3 pipeline_orchestrator.py out --input cloud_point_part_1.laz --publish")
+        print("  python3 pipeline_orchestrator.py out --input cloud_point_part_1.laz --tiles")
+        sys.exit(1)
+
+    workers = int(options["--workers"]) if options["--workers"] else None
+    statuses = run_pipeline(args[0], options["--input"], workers, publish, options["--migrate"], tiles)
+    sys.exit(0 if statuses and not any(s in BLOCKING for s in statuses.values()) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Columnar Point Cache
+Stores decoded LAS/LAZ dimensions as .npy sidecars next to the source file
+Repeat extractor runs memory-map the columns instead of decompressing again
+
+Layout (per class directory):
+    6_Buildings/6_Buildings.laz
+    6_Buildings/.point_cache/6_Buildings.<key>.XYZ.npy   (N, 3) float64, load_xyz
+    6_Buildings/.point_cache/6_Buildings.<key>.<dim>.npy  other columns, load_columns
+
+The key hashes the source path, size and mtime, so a rewritten LAZ
+invalidates its columns automatically.
+"""
+
+import os
+import sys
+import glob
+import hashlib
+import numpy as np
+from las_reader import read_points
+
+CACHE_DIRNAME = ".point_cache"
+
+def cache_key(las_path):
+    """Fingerprint of the source file: absolute path + size + mtime"""
+    las_path = os.path.abspath(las_path)
+    stat = os.stat(las_path)
+    fingerprint = f"{las_path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+def _cache_dir(las_path):
+    return os.path.join(os.path.dirname(os.path.abspath(las_path)), CACHE_DIRNAME)
+
+def _stem(las_path):
+    return os.path.splitext(os.path.basename(las_path))[0]
+
+def _column_path(las_path, key, dimension):
+    return os.path.join(_cache_dir(las_path), f"{_stem(las_path)}.{key}.{dimension}.npy")
+
+def _remove_stale(las_path, key):
+    """Drop columns written for an older version of the source file"""
+    for path in glob.glob(os.path.join(_cache_dir(las_path), f"{_stem(las_path)}.*.npy")):
+        if f".{key}." not in os.path.basename(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _write_column(path, values):
+    """Atomic write so a crashed run never leaves a truncated column behind"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(values))
+    os.replace(temp_path, path)
+
+def load_columns(las_path, dimensions=("X", "Y", "Z"), use_cache=True):
+    """
+    Load dimensions of a LAS/LAZ file as read-only memory-mapped columns
+
+    Args:
+        las_path: Path to .las or .laz file
+        dimensions: Dimensions to load (see las_reader.LAS_DIMENSIONS)
+        use_cache: When False, decode directly and never touch the cache
+
+    Returns:
+        columns: dict mapping dimension name to a 1-D array (np.memmap on cache hit)
+    """
+    dimensions = tuple(dimensions)
+
+    if not use_cache:
+        points = read_points(las_path, dimensions)
+        return {dim: points[dim] for dim in dimensions}
+
+    key = cache_key(las_path)
+    columns = {}
+    missing = []
+
+    for dim in dimensions:
+        path = _column_path(las_path, key, dim)
+        if os.path.exists(path):
+            columns[dim] = np.load(path, mmap_mode='r')
+        else:
+            missing.append(dim)
+
+    if not missing:
+        return columns
+
+    # Cache miss: decode only the absent dimensions once and persist them
+    points = read_points(las_path, missing)
+
+    try:
+        os.makedirs(_cache_dir(las_path), exist_ok=True)
+        _remove_stale(las_path, key)
+        for dim in missing:
+            path = _column_path(las_path, key, dim)
+            _write_column(path, points[dim])
+            columns[dim] = np.load(path, mmap_mode='r')
+    except OSError:
+        # Read-only dataset: serve the decoded arrays without caching
+        for dim in missing:
+            columns[dim] = points[dim]
+
+    return columns
+
+def load_xyz(las_path, use_cache=True):
+    """
+    Load X/Y/Z as an (N, 3) float64 array, decoding the LAZ only on first use
+
+    The interleaved array is cached as one XYZ file, so a hit is a read-only
+    np.memmap (no private copy; resident memory is the pages actually read).
+    """
+    if not use_cache:
+        points = read_points(las_path, ("X", "Y", "Z"))
+        return np.column_stack((points["X"], points["Y"], points["Z"]))
+
+    key = cache_key(las_path)
+    path = _column_path(las_path, key, "XYZ")
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+
+    # Cache miss: decode once and persist the interleaved array
+    points = read_points(las_path, ("X", "Y", "Z"))
+    xyz = np.column_stack((points["X"], points["Y"], points["Z"]))
+    del points
+
+    try:
+        os.makedirs(_cache_dir(las_path), exist_ok=True)
+        _remove_stale(las_path, key)
+        _write_column(path, xyz)
+        return np.load(path, mmap_mode='r')
+    except OSError:
+        # Read-only dataset: serve the decoded array without caching
+        return xyz
+
+def clear_cache(las_path):
+    """Remove every cached column of a LAS/LAZ file"""
+    removed = 0
+    for path in glob.glob(os.path.join(_cache_dir(las_path), f"{_stem(las_path)}.*.npy")):
+        os.remove(path)
+        removed += 1
+    return removed
+
+def _find_class_files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "**", "*.laz"), recursive=True))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 3 or (len(sys.argv) == 3 and sys.argv[2] != "--clear"):
+        print("Usage: python3 point_cache.py <laz_file|chunk_path> [--clear]")
+        print("Examples:")
+        print("  python3 point_cache.py /path/to/chunk_1            # warm cache for every class")
+        print("  python3 point_cache.py /path/to/chunk_1 --clear    # drop cached columns")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    if not os.path.exists(target):
+        print(f"❌ Path not found: {target}")
+        sys.exit(1)
+
+    for las_file in _find_class_files(target):
+        if len(sys.argv) == 3:
+            print(f"🗑️  {las_file}: removed {clear_cache(las_file)} cached columns")
+        else:
+            print(f"✅ {las_file}: {len(load_xyz(las_file)):,} points cached")
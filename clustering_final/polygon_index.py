@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Incremental Polygon Index
+Grid-hash index over accepted footprints for overlap rejection in the building
+and vegetation extractors (and across chunks when their outputs are merged)
+
+- Each accepted polygon is registered in every grid cell its bounding box
+  touches, so a candidate only meets polygons of the cells it covers instead
+  of every polygon accepted so far (O(1) expected per query)
+- Bounding boxes are kept as arrays, never recomputed from coordinate lists
+- overlaps() tests the real intersection area (shapely) of the bbox hits
+"""
+
+import numpy as np
+from shapely.geometry import Polygon
+
+# Grid cell size in meters (about the size of a large footprint)
+INDEX_CELL_SIZE = 50.0
+
+def polygon_bounds(coords):
+    """(min_x, min_y, max_x, max_y) of a coordinate list"""
+    xy = np.asarray(coords, dtype=np.float64)[:, :2]
+    return (*xy.min(axis=0), *xy.max(axis=0))
+
+class PolygonIndex:
+    """Grid hash of polygon bounding boxes, built as polygons are accepted"""
+
+    def __init__(self, cell_size=INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.coords = []
+        self.bounds = []
+        self._shapes = []
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _cell_range(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        return (range(int(np.floor(min_x / self.cell_size)), int(np.floor(max_x / self.cell_size)) + 1),
+                range(int(np.floor(min_y / self.cell_size)), int(np.floor(max_y / self.cell_size)) + 1))
+
+    def add(self, coords):
+        """Register an accepted polygon; returns its id"""
+        polygon_id = len(self.coords)
+        bounds = polygon_bounds(coords)
+        self.coords.append(coords)
+        self.bounds.append(bounds)
+        self._shapes.append(None)
+
+        xs, ys = self._cell_range(bounds)
+        for i in xs:
+            for j in ys:
+                self.cells.setdefault((i, j), []).append(polygon_id)
+        return polygon_id
+
+    def candidates(self, bounds):
+        """Ids of indexed polygons whose bounding box intersects bounds (touching counts)"""
+        min_x, min_y, max_x, max_y = bounds
+        xs, ys = self._cell_range(bounds)
+        found = set()
+        for i in xs:
+            for j in ys:
+                found.update(self.cells.get((i, j), ()))
+
+        hits = []
+        for polygon_id in sorted(found):
+            other_min_x, other_min_y, other_max_x, other_max_y = self.bounds[polygon_id]
+            if (max_x < other_min_x or min_x > other_max_x or
+                max_y < other_min_y or min_y > other_max_y):
+                continue
+            hits.append(polygon_id)
+        return hits
+
+    def shape(self, polygon_id):
+        """shapely Polygon of an indexed polygon (built on first use)"""
+        if self._shapes[polygon_id] is None:
+            self._shapes[polygon_id] = _valid_polygon(self.coords[polygon_id])
+        return self._shapes[polygon_id]
+
+    def overlaps(self, coords, min_ratio=0.1):
+        """
+        True if the polygon overlaps an indexed polygon by more than min_ratio
+        of the smaller of the two areas
+        """
+        candidates = self.candidates(polygon_bounds(coords))
+        if not candidates:
+            return False
+
+        new_shape = _valid_polygon(coords)
+        for polygon_id in candidates:
+            existing = self.shape(polygon_id)
+            smaller = min(new_shape.area, existing.area)
+            if smaller <= 0:
+                continue
+            if new_shape.intersection(existing).area / smaller > min_ratio:
+                return True
+        return False
+
+def _valid_polygon(coords):
+    polygon = Polygon([tuple(p[:2]) for p in coords])
+    return polygon if polygon.is_valid else polygon.buffer(0)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Polygon Ring Assembly
+Turns a set of directed boundary edges into shapely polygons with holes
+
+Edges are oriented with the interior on their left, so every closed ring
+comes out counter-clockwise for an outer boundary and clockwise for a hole.
+Rings are chained by matching, per vertex, incoming with outgoing edges (a
+single sort each), which also handles vertices where two rings touch.
+"""
+
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon
+from shapely.prepared import prep
+
+def boundary_edges(triangles):
+    """
+    Directed edges used by exactly one triangle
+
+    Args:
+        triangles: (T, 3) counter-clockwise vertex indices
+
+    Returns:
+        edges: (E, 2) directed (start, end) vertex indices, interior on the left
+    """
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    n_vertices = int(triangles.max()) + 1 if len(triangles) else 0
+    keys = np.minimum(edges[:, 0], edges[:, 1]) * n_vertices + np.maximum(edges[:, 0], edges[:, 1])
+    _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    return edges[first[counts == 1]]
+
+def edges_to_rings(edges):
+    """
+    Chain directed edges into closed rings
+
+    Returns:
+        rings: list of vertex index arrays, one per ring (not repeated at the end)
+    """
+    if len(edges) == 0:
+        return []
+
+    # In-degree equals out-degree at every vertex, so the i-th incoming edge
+    # (sorted by end vertex) can continue with the i-th outgoing edge
+    # (sorted by start vertex)
+    incoming = np.argsort(edges[:, 1], kind='stable')
+    outgoing = np.argsort(edges[:, 0], kind='stable')
+    successor = np.empty(len(edges), dtype=np.int64)
+    successor[incoming] = outgoing
+
+    rings = []
+    visited = np.zeros(len(edges), dtype=bool)
+    for start in range(len(edges)):
+        if visited[start]:
+            continue
+        ring = []
+        edge = start
+        while not visited[edge]:
+            visited[edge] = True
+            ring.append(edge)
+            edge = successor[edge]
+        rings.append(edges[ring, 0])
+
+    return rings
+
+def signed_area(ring_coords):
+    """Shoelace area, positive for counter-clockwise rings"""
+    x, y = ring_coords[:, 0], ring_coords[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def rings_to_polygons(coords, rings, min_area=0.0):
+    """
+    Assemble counter-clockwise shells and clockwise holes into polygons
+
+    Args:
+        coords: (N, 2) vertex coordinates
+        rings: list of vertex index arrays from edges_to_rings()
+        min_area: Drop shells and holes smaller than this (m²)
+
+    Returns:
+        polygons: list of shapely Polygons, largest first
+    """
+    shells, holes = [], []
+    for ring in rings:
+        if len(ring) < 3:
+            continue
+        ring_coords = coords[ring]
+        area = signed_area(ring_coords)
+        if abs(area) <= min_area:
+            continue
+        (shells if area > 0 else holes).append((abs(area), ring_coords))
+
+    # Each hole belongs to the smallest shell containing it
+    shells.sort(key=lambda item: item[0])
+    shell_polygons = [Polygon(ring_coords) for _, ring_coords in shells]
+    prepared = [prep(polygon) for polygon in shell_polygons]
+    shell_holes = [[] for _ in shells]
+    for _, ring_coords in holes:
+        probe = Polygon(ring_coords).representative_point()
+        for i, shell in enumerate(prepared):
+            if shell.contains(probe):
+                shell_holes[i].append(ring_coords)
+                break
+
+    polygons = []
+    for (_, ring_coords), interiors in zip(shells, shell_holes):
+        polygon = Polygon(ring_coords, interiors)
+        if not polygon.is_valid:
+            # Rings touching at a pinch vertex
+            polygon = polygon.buffer(0)
+        polygons.extend(polygon.geoms if isinstance(polygon, MultiPolygon) else [polygon])
+
+    polygons.sort(key=lambda polygon: polygon.area, reverse=True)
+    return polygons
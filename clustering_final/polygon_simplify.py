@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Douglas-Peucker Simplification
+Shared, non-recursive polygon and line simplifier for all extractor outputs
+
+- Explicit work queue of (start, end) vertex ranges instead of recursion, so
+  long vegetation boundaries never hit the recursion limit
+- Perpendicular distances of all open ranges are computed together in NumPy
+  (one pass per split level, np.maximum.reduceat per range), no list slicing
+- Many polylines are simplified in the same pass: simplify_geojson() handles
+  every feature of a chunk's GeoJSON in one call
+
+Usage:
+    python3 polygon_simplify.py <file.geojson> [tolerance_m] [output.geojson]
+"""
+
+import sys
+import json
+import numpy as np
+
+def _range_indices(first, count):
+    """Concatenated first[i], first[i] + 1, ..., first[i] + count[i] - 1"""
+    return np.repeat(first, count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+
+def douglas_peucker_masks(lines, tolerance, min_split=2):
+    """
+    Douglas-Peucker keep masks for several polylines at once
+
+    Args:
+        lines: list of (N_i, 2+) coordinate arrays
+        tolerance: Maximum perpendicular distance of dropped vertices (m)
+        min_split: Ranges of at most this many vertices are kept whole
+
+    Returns:
+        masks: list of (N_i,) boolean arrays, True for kept vertices
+    """
+    lengths = np.array([len(line) for line in lines], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    masks_flat = np.zeros(offsets[-1], dtype=bool)
+    if offsets[-1] == 0:
+        return [masks_flat[:0] for _ in lines]
+
+    coords = np.concatenate([np.asarray(line, dtype=np.float64)[:, :2] for line in lines if len(line)])
+
+    # Endpoints of every polyline are always kept
+    nonempty = lengths > 0
+    masks_flat[offsets[:-1][nonempty]] = True
+    masks_flat[offsets[1:][nonempty] - 1] = True
+
+    # Work queue: one (start, end) range per polyline, inclusive indices
+    start, end = offsets[:-1][nonempty], offsets[1:][nonempty] - 1
+    while len(start):
+        # Short ranges are kept as they are
+        short = end - start + 1 <= min_split
+        masks_flat[_range_indices(start[short], end[short] - start[short] + 1)] = True
+        start, end = start[~short], end[~short]
+        if len(start) == 0:
+            break
+
+        # Interior vertices of every open range, flattened
+        inner = end - start - 1
+        owner = np.repeat(np.arange(len(start)), inner)
+        index = _range_indices(start + 1, inner)
+
+        # Distance to the infinite line through the range endpoints
+        # (to the start point when both endpoints coincide, e.g. closed rings)
+        p0, p1, p = coords[start[owner]], coords[end[owner]], coords[index]
+        direction = p1 - p0
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        offset = p - p0
+        cross = np.abs(direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.where(length > 0, cross / length, np.hypot(offset[:, 0], offset[:, 1]))
+
+        # Farthest vertex per range (first one on ties)
+        group_start = np.cumsum(inner) - inner
+        farthest = np.maximum.reduceat(distance, group_start)
+        is_max = distance >= np.repeat(farthest, inner)
+        split = np.minimum.reduceat(np.where(is_max, index, offsets[-1]), group_start)
+
+        refine = farthest > tolerance
+        split = split[refine]
+        masks_flat[split] = True
+        start, end = (np.concatenate((start[refine], split)),
+                      np.concatenate((split, end[refine])))
+
+    return [masks_flat[offsets[i]:offsets[i + 1]] for i in range(len(lines))]
+
+def simplify_coords(coords, tolerance, min_split=2):
+    """
+    Simplify one coordinate list, keeping the original vertex objects
+
+    Endpoints are always kept, so closed rings stay closed.
+    """
+    if len(coords) < 3:
+        return list(coords)
+    mask = douglas_peucker_masks([np.asarray(coords, dtype=np.float64)], tolerance, min_split)[0]
+    return [vertex for vertex, keep in zip(coords, mask) if keep]
+
+def _geometry_parts(geometry):
+    """(container, key, is_ring) for every coordinate sequence of a GeoJSON geometry"""
+    kind, coordinates = geometry.get("type"), geometry.get("coordinates")
+    if kind == "LineString":
+        return [(geometry, "coordinates", False)]
+    if kind == "MultiLineString":
+        return [(coordinates, i, False) for i in range(len(coordinates))]
+    if kind == "Polygon":
+        return [(coordinates, i, True) for i in range(len(coordinates))]
+    if kind == "MultiPolygon":
+        return [(polygon, i, True) for polygon in coordinates for i in range(len(polygon))]
+    return []
+
+def simplify_geojson(geojson, tolerance):
+    """
+    Simplify every line and polygon ring of a FeatureCollection in place
+
+    All coordinate sequences are simplified in one vectorized pass. Rings that
+    would collapse below 4 vertices are left unchanged.
+
+    Returns:
+        (vertices before, vertices after)
+    """
+    parts = [part for feature in geojson.get("features", [])
+             for part in _geometry_parts(feature.get("geometry") or {})]
+    sequences = [container[key] for container, key, _ in parts]
+    masks = douglas_peucker_masks([np.asarray(seq, dtype=np.float64) if seq else np.zeros((0, 2))
+                                   for seq in sequences], tolerance)
+
+    before = after = 0
+    for (container, key, is_ring), seq, mask in zip(parts, sequences, masks):
+        simplified = [vertex for vertex, keep in zip(seq, mask) if keep]
+        if is_ring and len(simplified) < 4:
+            simplified = seq
+        container[key] = simplified
+        before += len(seq)
+        after += len(simplified)
+
+    return before, after
+
+def simplify_geojson_file(geojson_file, tolerance, output_file=None):
+    """
+    Simplify a GeoJSON file (in place unless output_file is given)
+
+    Returns:
+        (vertices before, vertices after)
+    """
+    with open(geojson_file, 'r') as f:
+        geojson = json.load(f)
+
+    before, after = simplify_geojson(geojson, tolerance)
+
+    with open(output_file or geojson_file, 'w') as f:
+        json.dump(geojson, f, indent=2)
+
+    return before, after
+
+def main():
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        print("Usage: python3 polygon_simplify.py <file.geojson> [tolerance_m] [output.geojson]")
+        print("Example:")
+        print("  python3 polygon_simplify.py chunk_1/.../8_OtherVegetation_polygons.geojson 0.5")
+        sys.exit(1)
+
+    geojson_file = sys.argv[1]
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    output_file = sys.argv[3] if len(sys.argv) > 3 else None
+
+    try:
+        before, after = simplify_geojson_file(geojson_file, tolerance, output_file)
+    except Exception as e:
+        print(f"❌ Simplification failed: {e}")
+        sys.exit(1)
+
+    print(f"✅ Simplified {geojson_file} ({tolerance}m): {before:,} → {after:,} vertices")
+    print(f"📁 Saved to: {output_file or geojson_file}")
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,11 @@ Adapted from the existing clustering pipeline for new dataset structure
 import os
 import sys
 import json
-import subprocess
 import numpy as np
-from sklearn.cluster import DBSCAN
+from grid_dbscan import dbscan_labels
 from pathlib import Path
+from point_cache import load_xyz
+from tree_segmentation import segment_crowns
 
 def log_info(msg):
     print(f"[INFO] {msg}")
@@ -29,43 +30,9 @@ def process_masts_new_dataset(input_laz, output_dir):
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Extract points using PDAL
-    temp_file = "/tmp/masts_new_dataset.txt"
-
-    pipeline = {
-        "pipeline": [
-            {
-                "type": "readers.las",
-                "filename": input_laz
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_file,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-    }
-
-    # Write pipeline to temp file
-    pipeline_file = "/tmp/masts_pipeline.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    # Execute PDAL pipeline
-    log_info("Extracting points with PDAL...")
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        log_error(f"PDAL failed: {result.stderr}")
-        return None
-
-    # Load points
+    # Load points via the columnar cache (LAZ decoded on first run only)
     try:
-        points = np.loadtxt(temp_file, delimiter=',')
+        points = load_xyz(input_laz)
         log_info(f"Loaded {len(points):,} points")
     except Exception as e:
         log_error(f"Failed to load points: {e}")
@@ -79,8 +46,7 @@ def process_masts_new_dataset(input_laz, output_dir):
     xy_points = points[:, :2]  # X, Y coordinates only
 
     log_info("Performing DBSCAN clustering...")
-    clustering = DBSCAN(eps=1.5, min_samples=30).fit(xy_points)
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps=1.5, min_samples=30, class_name="12_Masts")
 
     # Count clusters
     unique_labels = set(labels)
@@ -145,13 +111,6 @@ def process_masts_new_dataset(input_laz, output_dir):
 
     log_success(f"Mast centroids saved: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(centroids)
 
 def process_trees_new_dataset(input_laz, output_dir):
@@ -162,39 +121,9 @@ def process_trees_new_dataset(input_laz, output_dir):
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Extract points using PDAL
-    temp_file = "/tmp/trees_new_dataset.txt"
-
-    pipeline = {
-        "pipeline": [
-            {
-                "type": "readers.las",
-                "filename": input_laz
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_file,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-    }
-
-    pipeline_file = "/tmp/trees_pipeline.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        log_error(f"PDAL failed: {result.stderr}")
-        return None
-
+    # Load points via the columnar cache (LAZ decoded on first run only)
     try:
-        points = np.loadtxt(temp_file, delimiter=',')
+        points = load_xyz(input_laz)
         log_info(f"Loaded {len(points):,} points")
     except Exception as e:
         log_error(f"Failed to load points: {e}")
@@ -204,12 +133,10 @@ def process_trees_new_dataset(input_laz, output_dir):
         log_error("Too few points for clustering")
         return None
 
-    # 2D clustering for trees
-    xy_points = points[:, :2]
-
-    log_info("Performing DBSCAN clustering...")
-    clustering = DBSCAN(eps=2.5, min_samples=20).fit(xy_points)
-    labels = clustering.labels_
+    # Crown segmentation (CHM + treetops + watershed); crown 0 becomes noise
+    log_info("Performing CHM crown segmentation...")
+    point_labels, _, _, _ = segment_crowns(points)
+    labels = point_labels - 1
 
     unique_labels = set(labels)
     n_clusters = len(unique_labels) - (1 if -1 in unique_labels else 0)
@@ -258,7 +185,7 @@ def process_trees_new_dataset(input_laz, output_dir):
         "chunk": "chunk_6",
         "total_points": len(points),
         "instances_found": len(centroids),
-        "clustering_method": "2D_DBSCAN",
+        "clustering_method": "chm_watershed",
         "source_file": input_laz,
         "instances": centroids
     }
@@ -269,13 +196,6 @@ def process_trees_new_dataset(input_laz, output_dir):
 
     log_success(f"Tree centroids saved: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(centroids)
 
 def process_class_generic(input_laz, class_name, class_id, output_dir, eps=2.0, min_samples=15):
@@ -285,38 +205,9 @@ def process_class_generic(input_laz, class_name, class_id, output_dir, eps=2.0,
 
     os.makedirs(output_dir, exist_ok=True)
 
-    temp_file = f"/tmp/{class_name.lower()}_new_dataset.txt"
-
-    pipeline = {
-        "pipeline": [
-            {
-                "type": "readers.las",
-                "filename": input_laz
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_file,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-    }
-
-    pipeline_file = f"/tmp/{class_name.lower()}_pipeline.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        log_error(f"PDAL failed: {result.stderr}")
-        return None
-
+    # Load points via the columnar cache (LAZ decoded on first run only)
     try:
-        points = np.loadtxt(temp_file, delimiter=',')
+        points = load_xyz(input_laz)
         log_info(f"Loaded {len(points):,} points")
     except Exception as e:
         log_error(f"Failed to load points: {e}")
@@ -330,8 +221,7 @@ def process_class_generic(input_laz, class_name, class_id, output_dir, eps=2.0,
     xy_points = points[:, :2]
 
     log_info("Performing DBSCAN clustering...")
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(xy_points)
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps, min_samples, class_name=class_name)
 
     unique_labels = set(labels)
     n_clusters = len(unique_labels) - (1 if -1 in unique_labels else 0)
@@ -391,13 +281,6 @@ def process_class_generic(input_laz, class_name, class_id, output_dir, eps=2.0,
 
     log_success(f"{class_name} centroids saved: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(centroids)
 
 def process_wires_new_dataset(input_laz, output_dir):
@@ -408,38 +291,9 @@ def process_wires_new_dataset(input_laz, output_dir):
     lines_dir = os.path.join(output_dir, "lines")
     os.makedirs(lines_dir, exist_ok=True)
 
-    temp_file = "/tmp/wires_new_dataset.txt"
-
-    pipeline = {
-        "pipeline": [
-            {
-                "type": "readers.las",
-                "filename": input_laz
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_file,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-    }
-
-    pipeline_file = "/tmp/wires_pipeline.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        log_error(f"PDAL failed: {result.stderr}")
-        return None
-
+    # Load points via the columnar cache (LAZ decoded on first run only)
     try:
-        points = np.loadtxt(temp_file, delimiter=',')
+        points = load_xyz(input_laz)
         log_info(f"Loaded {len(points):,} wire points")
     except Exception as e:
         log_error(f"Failed to load points: {e}")
@@ -453,8 +307,7 @@ def process_wires_new_dataset(input_laz, output_dir):
     xy_points = points[:, :2]
 
     log_info("Clustering wire segments...")
-    clustering = DBSCAN(eps=3.0, min_samples=5).fit(xy_points)
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps=3.0, min_samples=5, class_name="11_Wires")
 
     unique_labels = set(labels)
     n_clusters = len(unique_labels) - (1 if -1 in unique_labels else 0)
@@ -536,13 +389,6 @@ def process_wires_new_dataset(input_laz, output_dir):
 
     log_success(f"Wire lines saved: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(features)
 
 def main():
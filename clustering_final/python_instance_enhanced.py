@@ -5,39 +5,53 @@ Enhanced Instance-Based Building Extraction
 - Aggressive instance separation with tight clustering
 - Rectangular polygon shapes with straight lines
 - Size filtering and overlap detection
+- Optional raster mode: occupancy grid + morphology + connected components
+  instead of DBSCAN + concave hull (raster_footprints)
 """
 
 import numpy as np
-from scipy.spatial import ConvexHull, cKDTree
-from sklearn.cluster import DBSCAN
+from scipy.spatial import ConvexHull
+from grid_dbscan import dbscan_labels
 from collections import defaultdict
 import json
 import sys
-import subprocess
 import os
 import math
-
-def extract_instance_buildings_enhanced(chunk_path):
+from point_cache import load_xyz
+from extractor_common import resolve_chunk_path, sparse_neighborhood_mask
+from ground_model import ground_height_filter
+from polygon_simplify import simplify_coords
+from geometry_metrics import ring_metrics
+from polygon_index import PolygonIndex
+from outlier_filter import statistical_outlier_filter
+from voxel_grid import voxel_downsample
+from raster_footprints import raster_footprints, RASTER_CELL_SIZE
+from spatial_tiler import keep_owned_features
+
+# Footprint extraction modes:
+# - cluster: DBSCAN instances + concave hull per cluster
+# - raster: occupancy grid + close/open + connected components (linear time, low memory)
+FOOTPRINT_MODES = ("cluster", "raster")
+DEFAULT_FOOTPRINT_MODE = "cluster"
+
+def extract_instance_buildings_enhanced(chunk_path, points_3d=None, mode=DEFAULT_FOOTPRINT_MODE):
     """
     Extract building instances with aggressive separation and rectangular shapes
 
     Args:
         chunk_path: Path to chunk directory (e.g., /path/to/chunk_1 or /path/to/chunk_1/compressed/filtred_by_classes)
+        points_3d: Optional preloaded (N, 3) building points (skips loading 6_Buildings.laz)
+        mode: Footprint extraction mode, "cluster" or "raster" (see FOOTPRINT_MODES)
     """
 
     try:
+        if mode not in FOOTPRINT_MODES:
+            print(f"❌ Unknown footprint mode: {mode} (expected one of {', '.join(FOOTPRINT_MODES)})")
+            return 0
+
         # Normalize the path - detect if it's the chunk root or filtred_by_classes
-        chunk_path = os.path.abspath(chunk_path)
-
-        if chunk_path.endswith('/compressed/filtred_by_classes'):
-            # Path is already pointing to filtred_by_classes
-            classes_base = chunk_path
-            chunk_name = os.path.basename(os.path.dirname(os.path.dirname(chunk_path)))
-        elif os.path.exists(os.path.join(chunk_path, 'compressed/filtred_by_classes')):
-            # Path is chunk root directory
-            classes_base = os.path.join(chunk_path, 'compressed/filtred_by_classes')
-            chunk_name = os.path.basename(chunk_path)
-        else:
+        classes_base, chunk_name = resolve_chunk_path(chunk_path)
+        if classes_base is None:
             print(f"❌ Invalid path structure. Expected chunk directory or filtred_by_classes directory")
             return 0
 
@@ -49,50 +63,22 @@ def extract_instance_buildings_enhanced(chunk_path):
         print(f"\n🏢 === ENHANCED INSTANCE BUILDING EXTRACTION ===")
         print(f"📍 Chunk: {chunk_name}")
         print(f"📂 Base path: {classes_base}")
-        print(f"🎯 Method: Tight clustering + rectangular polygons + overlap prevention")
+        if mode == "raster":
+            print(f"🎯 Method: Occupancy grid ({RASTER_CELL_SIZE}m) + morphology + connected components + overlap prevention")
+        else:
+            print(f"🎯 Method: Tight clustering + rectangular polygons + overlap prevention")
 
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
 
-        # Extract points using PDAL pipeline
-        temp_points = f"/tmp/building_test/{chunk_name}_all_points.txt"
-
-        extraction_pipeline = [
-            {
-                "type": "readers.las",
-                "filename": laz_file
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_points,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-
-        pipeline_file = f"/tmp/building_test/{chunk_name}_extract_pipeline.json"
-        with open(pipeline_file, 'w') as f:
-            json.dump(extraction_pipeline, f, indent=2)
-
-        print(f"📊 Extracting all building points...")
-        result = subprocess.run(f"pdal pipeline {pipeline_file}", shell=True,
-                               capture_output=True, text=True, timeout=300)
-
-        if result.returncode != 0:
-            print(f"❌ PDAL extraction failed: {result.stderr}")
-            return 0
-
-        # Load points from CSV
-        print(f"📂 Loading point data...")
-        try:
-            points_3d = np.loadtxt(temp_points, delimiter=',')
-            if len(points_3d.shape) == 1:
-                points_3d = points_3d.reshape(1, -1)
-        except Exception as e:
-            print(f"❌ Failed to load points: {e}")
-            return 0
+        # Load building points via the columnar cache (LAZ decoded on first run only)
+        if points_3d is None:
+            print(f"📊 Extracting all building points...")
+            try:
+                points_3d = load_xyz(laz_file)
+            except Exception as e:
+                print(f"❌ Failed to load points: {e}")
+                return 0
 
         print(f"📊 Input points: {len(points_3d):,}")
 
@@ -103,18 +89,13 @@ def extract_instance_buildings_enhanced(chunk_path):
         # Step 1: Aggressive voxel grid filtering (smaller voxels)
         print(f"\n🔄 Step 1: Aggressive voxel filtering (0.25m grid)")
         voxel_size = 0.25  # Smaller voxel for more aggressive filtering
-        voxel_indices = np.floor(points_3d / voxel_size).astype(int)
-        unique_voxels, unique_indices = np.unique(voxel_indices, axis=0, return_index=True)
-        voxel_filtered = points_3d[unique_indices]
+        voxel_filtered = voxel_downsample(points_3d, voxel_size)
         print(f"  📊 Voxel filtered: {len(voxel_filtered):,} ({100*len(voxel_filtered)/len(points_3d):.1f}%)")
 
-        # Step 2: Height-based ground filtering
+        # Step 2: Height-based ground filtering (chunk DTM, upper 75% without ground classes)
         print(f"\n🔄 Step 2: Height-based ground removal")
-        z_values = voxel_filtered[:, 2]
-        height_threshold = np.percentile(z_values, 25)  # Keep upper 75% of points
-        height_mask = z_values > height_threshold
-        height_filtered = voxel_filtered[height_mask]
-        print(f"  📊 Height filtered (>{height_threshold:.1f}m): {len(height_filtered):,} ({100*len(height_filtered)/len(voxel_filtered):.1f}%)")
+        height_filtered, height_threshold = ground_height_filter(voxel_filtered, classes_base, "6_Buildings", 25)
+        print(f"  📊 Height filtered ({height_threshold}): {len(height_filtered):,} ({100*len(height_filtered)/len(voxel_filtered):.1f}%)")
 
         # Step 3: Enhanced outlier removal
         print(f"\n🔄 Step 3: Enhanced outlier removal")
@@ -124,17 +105,8 @@ def extract_instance_buildings_enhanced(chunk_path):
             print(f"❌ Too few points after filtering: {len(points_2d)}")
             return 0
 
-        tree = cKDTree(points_2d)
-        k_neighbors = min(10, len(points_2d) - 1)
-        distances, _ = tree.query(points_2d, k=k_neighbors+1)
-
-        mean_distances = distances[:, 1:].mean(axis=1)
-        mean_dist = np.mean(mean_distances)
-        std_dist = np.std(mean_distances)
-
         # More aggressive outlier threshold
-        outlier_threshold = mean_dist + 1.2 * std_dist  # Tighter threshold
-        inlier_mask = mean_distances < outlier_threshold
+        inlier_mask, _, index = statistical_outlier_filter(points_2d, "6_Buildings")  # Tighter threshold (sigma 1.2)
         clean_points_2d = points_2d[inlier_mask]
 
         print(f"  📊 Outlier removal: {len(clean_points_2d):,} ({100*len(clean_points_2d)/len(points_2d):.1f}%)")
@@ -143,49 +115,60 @@ def extract_instance_buildings_enhanced(chunk_path):
             print(f"❌ Too few points after cleaning: {len(clean_points_2d)}")
             return 0
 
-        # Step 4: Tight instance-based clustering
-        print(f"\n🔄 Step 4: Tight instance clustering")
-        eps = 2.0  # Much tighter clustering - 2 meter radius
-        min_samples = 400  # Higher minimum samples for dense clusters
+        if mode == "raster":
+            # Step 4: Occupancy grid footprints
+            print(f"\n🔄 Step 4: Occupancy grid footprints ({RASTER_CELL_SIZE}m cells)")
+            footprints = raster_footprints(clean_points_2d)
+            print(f"  📊 Found {len(footprints)} potential building instances")
 
-        clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(clean_points_2d)
-        labels = clustering.labels_
+            if not footprints:
+                print(f"❌ No building components found")
+                return 0
 
-        unique_labels = set(labels)
-        if -1 in unique_labels:
-            unique_labels.remove(-1)
+            candidates = footprints
+        else:
+            # Step 4: Tight instance-based clustering
+            print(f"\n🔄 Step 4: Tight instance clustering")
+            eps = 2.0  # Much tighter clustering - 2 meter radius
+            min_samples = 400  # Higher minimum samples for dense clusters
 
-        n_clusters = len(unique_labels)
-        n_noise = list(labels).count(-1)
+            labels = dbscan_labels(clean_points_2d, eps, min_samples, class_name="6_Buildings", index=index)
 
-        print(f"  📊 Found {n_clusters} potential building instances, {n_noise} noise points")
+            unique_labels = set(labels)
+            if -1 in unique_labels:
+                unique_labels.remove(-1)
 
-        if n_clusters == 0:
-            print(f"❌ No building clusters found")
-            return 0
+            n_clusters = len(unique_labels)
+            n_noise = list(labels).count(-1)
+
+            print(f"  📊 Found {n_clusters} potential building instances, {n_noise} noise points")
+
+            if n_clusters == 0:
+                print(f"❌ No building clusters found")
+                return 0
+
+            # Footprints are built one cluster at a time as the candidates are checked
+            candidates = ((create_footprint_building(clean_points_2d[labels == cluster_id]),
+                           int(np.count_nonzero(labels == cluster_id)))
+                          for cluster_id in sorted(unique_labels))
 
         # Step 5: Create rectangular building polygons with strict filtering
         print(f"\n🔄 Step 5: Building instance extraction with strict filtering")
 
         buildings = []
-        building_polygons = []  # To check for overlaps
-
-        for i, cluster_id in enumerate(sorted(unique_labels)):
-            cluster_mask = labels == cluster_id
-            cluster_points = clean_points_2d[cluster_mask]
+        building_polygons = PolygonIndex()  # To check for overlaps
 
-            print(f"  🏢 Candidate {i+1}: {len(cluster_points):,} points")
-
-            # Create exact footprint polygon using alpha shape
-            polygon_coords = create_footprint_building(cluster_points)
+        for i, (polygon_coords, point_count) in enumerate(candidates):
+            print(f"  🏢 Candidate {i+1}: {point_count:,} points")
 
             if polygon_coords is None:
                 print(f"    ❌ Failed to create valid polygon")
                 continue
 
-            # Calculate area
-            area_m2 = calculate_polygon_area(polygon_coords)
-            perimeter_m = calculate_polygon_perimeter(polygon_coords)
+            # Area, perimeter and edge aspect ratio (geometry_metrics kernel)
+            metrics = ring_metrics(polygon_coords)
+            area_m2 = metrics["area_m2"]
+            perimeter_m = metrics["perimeter_m"]
 
             # Strict size filtering for individual buildings
             if area_m2 < 40 or area_m2 > 500:
@@ -193,7 +176,7 @@ def extract_instance_buildings_enhanced(chunk_path):
                 continue
 
             # Check aspect ratio (buildings shouldn't be too thin)
-            aspect_ratio = calculate_aspect_ratio(polygon_coords)
+            aspect_ratio = metrics["edge_aspect_ratio"]
             if aspect_ratio > 8:  # Max 8:1 ratio
                 print(f"    ❌ Aspect ratio too high: {aspect_ratio:.1f}:1")
                 continue
@@ -225,16 +208,21 @@ def extract_instance_buildings_enhanced(chunk_path):
                     "chunk": chunk_name,
                     "area_m2": round(area_m2, 2),
                     "perimeter_m": round(perimeter_m, 2),
-                    "point_count": len(cluster_points),
+                    "point_count": point_count,
                     "aspect_ratio": round(aspect_ratio, 2),
-                    "extraction_method": "python_instance_enhanced"
+                    "extraction_method": "python_instance_enhanced" if mode == "cluster" else "python_instance_raster"
                 }
             }
 
             buildings.append(building)
-            building_polygons.append(polygon_coords)
+            building_polygons.add(polygon_coords)
+
+            print(f"    ✅ Building {len(buildings)}: {area_m2:.1f} m², {point_count} points, {aspect_ratio:.1f}:1 ratio")
 
-            print(f"    ✅ Building {len(buildings)}: {area_m2:.1f} m², {len(cluster_points)} points, {aspect_ratio:.1f}:1 ratio")
+        # Tiled chunk: polygons centered in the buffer belong to the neighbor tile
+        buildings, dropped = keep_owned_features(buildings, classes_base)
+        if dropped:
+            print(f"    ✂️  {dropped} buffer buildings left to the neighbor tiles")
 
         if not buildings:
             print(f"❌ No valid building instances found")
@@ -249,7 +237,7 @@ def extract_instance_buildings_enhanced(chunk_path):
             "properties": {
                 "class": "6_Buildings",
                 "chunk": chunk_name,
-                "extraction_method": "python_instance_enhanced_rectangular",
+                "extraction_method": "python_instance_enhanced_rectangular" if mode == "cluster" else "python_instance_raster",
                 "results": {
                     "input_points": len(points_3d),
                     "clean_points": len(clean_points_2d),
@@ -267,10 +255,6 @@ def extract_instance_buildings_enhanced(chunk_path):
         print(f"📊 Total area: {total_area:.1f} m² (avg: {total_area/len(buildings):.1f} m² per building)")
         print(f"📁 Saved: {output_file}")
 
-        # Clean up temp files
-        os.remove(temp_points)
-        os.remove(pipeline_file)
-
         return len(buildings)
 
     except Exception as e:
@@ -340,29 +324,17 @@ def create_footprint_building(points_2d):
 def create_concave_hull(points, alpha=3.0):
     """Create concave hull using alpha shape concept"""
     try:
-        from scipy.spatial import cKDTree
-
         if len(points) < 4:
             return None
 
-        # Build k-d tree for efficient neighbor finding
-        tree = cKDTree(points)
-
         # Find boundary points by identifying points with fewer neighbors within alpha distance
-        boundary_points = []
-
-        for i, point in enumerate(points):
-            neighbors = tree.query_ball_point(point, alpha)
-
-            # Points with fewer neighbors or on the edge are likely boundary points
-            if len(neighbors) <= 8:  # Threshold for boundary detection
-                boundary_points.append(point)
+        # Points with fewer neighbors or on the edge are likely boundary points
+        boundary_points = points[sparse_neighborhood_mask(points, alpha, 8)]  # Threshold for boundary detection
 
         if len(boundary_points) < 4:
             return None
 
         # Create convex hull of boundary points
-        boundary_points = np.array(boundary_points)
         hull = ConvexHull(boundary_points)
 
         # Return hull vertices
@@ -381,60 +353,11 @@ def simplify_polygon(coords, tolerance=0.5):
         if len(coords) < 4:
             return coords
 
-        # Simple Douglas-Peucker implementation
-        def dp_simplify(points, epsilon):
-            if len(points) <= 2:
-                return points
-
-            # Find the point with maximum distance from line between first and last
-            max_dist = 0
-            index = 0
-
-            for i in range(1, len(points) - 1):
-                dist = point_to_line_distance(points[i], points[0], points[-1])
-                if dist > max_dist:
-                    max_dist = dist
-                    index = i
-
-            # If max distance is greater than epsilon, recursively simplify
-            if max_dist > epsilon:
-                # Recursively simplify
-                left = dp_simplify(points[:index+1], epsilon)
-                right = dp_simplify(points[index:], epsilon)
-                return left[:-1] + right
-            else:
-                return [points[0], points[-1]]
-
-        simplified = dp_simplify(coords, tolerance)
-
-        # Ensure polygon is closed
-        if len(simplified) > 0 and simplified[0] != simplified[-1]:
-            simplified.append(simplified[0])
-
-        return simplified
+        return simplify_coords(coords, tolerance)
 
     except:
         return coords
 
-def point_to_line_distance(point, line_start, line_end):
-    """Calculate distance from point to line segment"""
-    try:
-        x0, y0 = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-
-        # Calculate distance using cross product
-        num = abs((y2-y1)*x0 - (x2-x1)*y0 + x2*y1 - y2*x1)
-        den = math.sqrt((y2-y1)**2 + (x2-x1)**2)
-
-        if den == 0:
-            return math.sqrt((x0-x1)**2 + (y0-y1)**2)
-
-        return num / den
-
-    except:
-        return 0
-
 def create_oriented_bbox_with_cuts(points_2d):
     """Create oriented bounding box but cut corners where no points exist"""
     try:
@@ -452,95 +375,12 @@ def create_oriented_bbox_with_cuts(points_2d):
     except:
         return None
 
-def calculate_polygon_area(coords):
-    """Calculate polygon area using shoelace formula"""
-    try:
-        if len(coords) < 4:
-            return 0
-
-        x = [p[0] for p in coords[:-1]]  # Remove last point (same as first)
-        y = [p[1] for p in coords[:-1]]
-
-        return 0.5 * abs(sum(x[i]*y[i+1] - x[i+1]*y[i] for i in range(-1, len(x)-1)))
-    except:
-        return 0
-
-def calculate_polygon_perimeter(coords):
-    """Calculate polygon perimeter"""
-    try:
-        perimeter = 0
-        for i in range(len(coords)-1):
-            dx = coords[i+1][0] - coords[i][0]
-            dy = coords[i+1][1] - coords[i][1]
-            perimeter += math.sqrt(dx*dx + dy*dy)
-        return perimeter
-    except:
-        return 0
-
-def calculate_aspect_ratio(coords):
-    """Calculate aspect ratio of rectangular polygon"""
-    try:
-        if len(coords) < 4:
-            return 1
-
-        # Calculate all edge lengths
-        edge_lengths = []
-        for i in range(len(coords)-1):
-            dx = coords[i+1][0] - coords[i][0]
-            dy = coords[i+1][1] - coords[i][1]
-            length = math.sqrt(dx*dx + dy*dy)
-            edge_lengths.append(length)
-
-        # For rectangle, should have pairs of equal sides
-        edge_lengths.sort()
-        if len(edge_lengths) >= 4:
-            width = edge_lengths[0]
-            height = edge_lengths[2]  # Third shortest should be the other dimension
-
-            if width > 0:
-                return max(height/width, width/height)
-
-        return 1
-    except:
-        return 1
-
-def has_overlap_with_existing(new_coords, existing_polygons, overlap_threshold=0.1):
+def has_overlap_with_existing(new_coords, existing_index, overlap_threshold=0.1):
     """Check if new polygon overlaps significantly with existing ones"""
     try:
-        new_area = calculate_polygon_area(new_coords)
-
-        for existing_coords in existing_polygons:
-            # Simple bounding box overlap check first (fast)
-            new_x = [p[0] for p in new_coords]
-            new_y = [p[1] for p in new_coords]
-            existing_x = [p[0] for p in existing_coords]
-            existing_y = [p[1] for p in existing_coords]
-
-            new_min_x, new_max_x = min(new_x), max(new_x)
-            new_min_y, new_max_y = min(new_y), max(new_y)
-            existing_min_x, existing_max_x = min(existing_x), max(existing_x)
-            existing_min_y, existing_max_y = min(existing_y), max(existing_y)
-
-            # Check if bounding boxes overlap
-            if (new_max_x < existing_min_x or new_min_x > existing_max_x or
-                new_max_y < existing_min_y or new_min_y > existing_max_y):
-                continue  # No overlap
-
-            # If bounding boxes overlap, check for significant overlap
-            # Simple approach: if centers are too close, consider overlapping
-            new_center_x = (new_min_x + new_max_x) / 2
-            new_center_y = (new_min_y + new_max_y) / 2
-            existing_center_x = (existing_min_x + existing_max_x) / 2
-            existing_center_y = (existing_min_y + existing_max_y) / 2
-
-            distance = math.sqrt((new_center_x - existing_center_x)**2 +
-                               (new_center_y - existing_center_y)**2)
-
-            # If centers are closer than 25m, consider overlapping
-            if distance < 25:
-                return True
-
-        return False
+        # Grid index lookup, then real intersection area
+        # (more than overlap_threshold of the smaller footprint)
+        return existing_index.overlaps(new_coords, overlap_threshold)
     except:
         return False
 
@@ -575,21 +415,23 @@ def utm_to_wgs84_simple(utm_x, utm_y):
     return lat_deg, lon_deg
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 python_instance_enhanced.py <chunk_path>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 python_instance_enhanced.py <chunk_path> [cluster|raster]")
         print("Examples:")
         print("  python3 python_instance_enhanced.py /path/to/chunk_1")
         print("  python3 python_instance_enhanced.py /path/to/chunk_1/compressed/filtred_by_classes")
+        print("  python3 python_instance_enhanced.py /path/to/chunk_1 raster")
         sys.exit(1)
 
     chunk_path = sys.argv[1]
+    mode = sys.argv[2] if len(sys.argv) == 3 else DEFAULT_FOOTPRINT_MODE
 
     # Validate path exists
     if not os.path.exists(chunk_path):
         print(f"❌ Path not found: {chunk_path}")
         sys.exit(1)
 
-    result = extract_instance_buildings_enhanced(chunk_path)
+    result = extract_instance_buildings_enhanced(chunk_path, mode=mode)
 
     if result > 0:
         print(f"\n🎉 Success! Extracted {result} building instances")
@@ -9,15 +9,22 @@ FIXED Enhanced Instance-Based Building Extraction
 """
 
 import numpy as np
-from scipy.spatial import ConvexHull, cKDTree
-from sklearn.cluster import DBSCAN
+from scipy.spatial import ConvexHull
+from grid_dbscan import dbscan_labels
 from collections import defaultdict
 import json
 import sys
-import subprocess
 import os
 import math
 import time
+from point_cache import load_xyz
+from geometry_metrics import ring_metrics
+from ground_model import ground_height_filter
+from extractor_common import sparse_neighborhood_mask
+from polygon_simplify import simplify_coords
+from polygon_index import PolygonIndex, polygon_bounds
+from outlier_filter import statistical_outlier_filter
+from voxel_grid import voxel_downsample
 
 def extract_instance_buildings_enhanced(chunk_path):
     """
@@ -61,43 +68,11 @@ def extract_instance_buildings_enhanced(chunk_path):
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
 
-        # Extract points using PDAL pipeline
-        temp_points = f"/tmp/building_test/{chunk_name}_all_points.txt"
-        os.makedirs("/tmp/building_test", exist_ok=True)
-
-        extraction_pipeline = [
-            {
-                "type": "readers.las",
-                "filename": laz_file
-            },
-            {
-                "type": "writers.text",
-                "filename": temp_points,
-                "format": "csv",
-                "order": "X,Y,Z",
-                "keep_unspecified": "false",
-                "write_header": "false"
-            }
-        ]
-
-        pipeline_file = f"/tmp/building_test/{chunk_name}_extract_pipeline.json"
-        with open(pipeline_file, 'w') as f:
-            json.dump(extraction_pipeline, f, indent=2)
-
+        # Load building points via the columnar cache (LAZ decoded on first run only)
         print(f"[1/7] 📊 Extracting building points from LAZ...")
-        result = subprocess.run(f"pdal pipeline {pipeline_file}", shell=True,
-                               capture_output=True, text=True, timeout=300)
-
-        if result.returncode != 0:
-            print(f"❌ PDAL extraction failed: {result.stderr}")
-            return 0
-
-        # Load points from CSV
         print(f"[2/7] 📂 Loading point cloud data...")
         try:
-            points_3d = np.loadtxt(temp_points, delimiter=',')
-            if len(points_3d.shape) == 1:
-                points_3d = points_3d.reshape(1, -1)
+            points_3d = load_xyz(laz_file)
         except Exception as e:
             print(f"❌ Failed to load points: {e}")
             return 0
@@ -111,18 +86,14 @@ def extract_instance_buildings_enhanced(chunk_path):
         # Step 1: Voxel grid filtering (reasonable size)
         print(f"\n[3/7] 🔄 Voxel downsampling (0.3m grid)...")
         voxel_size = 0.3  # Balanced voxel size
-        voxel_indices = np.floor(points_3d / voxel_size).astype(int)
-        unique_voxels, unique_indices = np.unique(voxel_indices, axis=0, return_index=True)
-        voxel_filtered = points_3d[unique_indices]
+        voxel_filtered = voxel_downsample(points_3d, voxel_size)
         print(f"      ✅ {len(voxel_filtered):,} points after voxel filtering ({100*len(voxel_filtered)/len(points_3d):.1f}% kept)")
 
         # Step 2: Height-based ground filtering
         print(f"\n[4/7] 🔄 Ground removal (height-based)...")
-        z_values = voxel_filtered[:, 2]
-        height_threshold = np.percentile(z_values, 20)  # Keep upper 80% of points
-        height_mask = z_values > height_threshold
-        height_filtered = voxel_filtered[height_mask]
-        print(f"      ✅ {len(height_filtered):,} points after ground removal (threshold: {height_threshold:.1f}m)")
+        # Chunk DTM clearance (upper 80% of points without ground classes)
+        height_filtered, height_threshold = ground_height_filter(voxel_filtered, classes_base, "6_Buildings", 20)
+        print(f"      ✅ {len(height_filtered):,} points after ground removal (threshold: {height_threshold})")
 
         # Step 3: Statistical outlier removal (less aggressive)
         print(f"\n[5/7] 🔄 Outlier removal (statistical)...")
@@ -132,21 +103,12 @@ def extract_instance_buildings_enhanced(chunk_path):
             print(f"❌ Too few points after filtering: {len(points_2d)}")
             return 0
 
-        tree = cKDTree(points_2d)
-        k_neighbors = min(10, len(points_2d) - 1)
-        distances, _ = tree.query(points_2d, k=k_neighbors+1)
-
-        mean_distances = distances[:, 1:].mean(axis=1)
-        mean_dist = np.mean(mean_distances)
-        std_dist = np.std(mean_distances)
-
-        # Less aggressive outlier threshold
-        outlier_threshold = mean_dist + 2.5 * std_dist  # FIXED: 2.5 instead of 1.2
-        inlier_mask = mean_distances < outlier_threshold
+        # Less aggressive outlier threshold (FIXED: sigma 2.5 instead of 1.2)
+        inlier_mask, outlier_threshold, index = statistical_outlier_filter(points_2d, "6_Buildings", k_neighbors=10, sigma=2.5)
         clean_points_2d = points_2d[inlier_mask]
 
         print(f"      ✅ {len(clean_points_2d):,} points after outlier removal ({100*len(clean_points_2d)/len(points_2d):.1f}% kept)")
-        print(f"      📊 Mean neighbor distance: {mean_dist:.2f}m, Threshold: {outlier_threshold:.2f}m")
+        print(f"      📊 Mean neighbor distance threshold: {outlier_threshold:.2f}m")
 
         if len(clean_points_2d) < 100:  # FIXED: Lowered from 500 to 100
             print(f"❌ Too few points after cleaning: {len(clean_points_2d)}")
@@ -163,8 +125,7 @@ def extract_instance_buildings_enhanced(chunk_path):
         print(f"          • eps (search radius): {eps}m")
         print(f"          • min_samples: {min_samples}")
 
-        clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(clean_points_2d)
-        labels = clustering.labels_
+        labels = dbscan_labels(clean_points_2d, eps, min_samples, class_name="6_Buildings", index=index)
 
         unique_labels = set(labels)
         if -1 in unique_labels:
@@ -191,7 +152,7 @@ def extract_instance_buildings_enhanced(chunk_path):
         print()
 
         buildings = []
-        building_polygons = []  # To check for overlaps
+        building_polygons = PolygonIndex()  # To check for overlaps
         rejected_stats = {
             'too_small': 0,
             'too_large': 0,
@@ -229,10 +190,11 @@ def extract_instance_buildings_enhanced(chunk_path):
                 rejected_stats['invalid_polygon'] += 1
                 continue
 
-            # Calculate metrics
-            area_m2 = calculate_polygon_area(polygon_coords)
-            perimeter_m = calculate_polygon_perimeter(polygon_coords)
-            aspect_ratio = calculate_aspect_ratio(polygon_coords)
+            # Calculate metrics (geometry_metrics kernel, edge aspect ratio)
+            metrics = ring_metrics(polygon_coords)
+            area_m2 = metrics["area_m2"]
+            perimeter_m = metrics["perimeter_m"]
+            aspect_ratio = metrics["edge_aspect_ratio"]
 
             # Filter 3: Size filtering (FIXED: much wider range)
             if area_m2 < 20:
@@ -258,7 +220,7 @@ def extract_instance_buildings_enhanced(chunk_path):
                 continue
 
             # Calculate compactness (how circular/square the building is)
-            compactness = calculate_compactness(area_m2, perimeter_m)
+            compactness = metrics["compactness"]
 
             # Keep coordinates in UTM format
             utm_coords = []
@@ -291,7 +253,7 @@ def extract_instance_buildings_enhanced(chunk_path):
             }
 
             buildings.append(building)
-            building_polygons.append(polygon_coords)
+            building_polygons.add(polygon_coords)
 
             print(f"✅ Building #{len(buildings)}: {area_m2:.1f}m², {len(cluster_points)} pts, {aspect_ratio:.1f}:1, compact={compactness:.2f}")
 
@@ -366,13 +328,6 @@ def extract_instance_buildings_enhanced(chunk_path):
         print(f"⏱️  Processing time: {elapsed_time:.1f}s")
         print(f"{'='*70}\n")
 
-        # Clean up temp files
-        try:
-            os.remove(temp_points)
-            os.remove(pipeline_file)
-        except:
-            pass
-
         return len(buildings)
 
     except Exception as e:
@@ -397,19 +352,6 @@ def calculate_point_density(points_2d):
     except:
         return 0
 
-def calculate_compactness(area, perimeter):
-    """
-    Calculate compactness ratio (how circular/square the shape is)
-    Compactness = 4π * Area / Perimeter²
-    Perfect circle = 1.0, square ≈ 0.785, elongated shapes < 0.5
-    """
-    try:
-        if perimeter > 0:
-            return (4 * math.pi * area) / (perimeter ** 2)
-        return 0
-    except:
-        return 0
-
 def create_footprint_building(points_2d):
     """Create exact building footprint polygon following actual point cloud boundary"""
     try:
@@ -473,29 +415,17 @@ def create_footprint_building(points_2d):
 def create_concave_hull(points, alpha=4.0):
     """Create concave hull using alpha shape concept"""
     try:
-        from scipy.spatial import cKDTree
-
         if len(points) < 4:
             return None
 
-        # Build k-d tree for efficient neighbor finding
-        tree = cKDTree(points)
-
         # Find boundary points by identifying points with fewer neighbors within alpha distance
-        boundary_points = []
-
-        for i, point in enumerate(points):
-            neighbors = tree.query_ball_point(point, alpha)
-
-            # Points with fewer neighbors or on the edge are likely boundary points
-            if len(neighbors) <= 10:  # FIXED: 10 instead of 8 for better detection
-                boundary_points.append(point)
+        # Points with fewer neighbors or on the edge are likely boundary points
+        boundary_points = points[sparse_neighborhood_mask(points, alpha, 10)]  # FIXED: 10 instead of 8 for better detection
 
         if len(boundary_points) < 4:
             return None
 
         # Create convex hull of boundary points
-        boundary_points = np.array(boundary_points)
         hull = ConvexHull(boundary_points)
 
         # Return hull vertices
@@ -514,60 +444,11 @@ def simplify_polygon(coords, tolerance=0.5):
         if len(coords) < 4:
             return coords
 
-        # Simple Douglas-Peucker implementation
-        def dp_simplify(points, epsilon):
-            if len(points) <= 2:
-                return points
-
-            # Find the point with maximum distance from line between first and last
-            max_dist = 0
-            index = 0
-
-            for i in range(1, len(points) - 1):
-                dist = point_to_line_distance(points[i], points[0], points[-1])
-                if dist > max_dist:
-                    max_dist = dist
-                    index = i
-
-            # If max distance is greater than epsilon, recursively simplify
-            if max_dist > epsilon:
-                # Recursively simplify
-                left = dp_simplify(points[:index+1], epsilon)
-                right = dp_simplify(points[index:], epsilon)
-                return left[:-1] + right
-            else:
-                return [points[0], points[-1]]
-
-        simplified = dp_simplify(coords, tolerance)
-
-        # Ensure polygon is closed
-        if len(simplified) > 0 and simplified[0] != simplified[-1]:
-            simplified.append(simplified[0])
-
-        return simplified
+        return simplify_coords(coords, tolerance)
 
     except:
         return coords
 
-def point_to_line_distance(point, line_start, line_end):
-    """Calculate distance from point to line segment"""
-    try:
-        x0, y0 = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-
-        # Calculate distance using cross product
-        num = abs((y2-y1)*x0 - (x2-x1)*y0 + x2*y1 - y2*x1)
-        den = math.sqrt((y2-y1)**2 + (x2-x1)**2)
-
-        if den == 0:
-            return math.sqrt((x0-x1)**2 + (y0-y1)**2)
-
-        return num / den
-
-    except:
-        return 0
-
 def create_oriented_bbox_with_cuts(points_2d):
     """Create oriented bounding box but cut corners where no points exist"""
     try:
@@ -585,86 +466,21 @@ def create_oriented_bbox_with_cuts(points_2d):
     except:
         return None
 
-def calculate_polygon_area(coords):
-    """Calculate polygon area using shoelace formula"""
-    try:
-        if len(coords) < 4:
-            return 0
-
-        x = [p[0] for p in coords[:-1]]  # Remove last point (same as first)
-        y = [p[1] for p in coords[:-1]]
-
-        return 0.5 * abs(sum(x[i]*y[i+1] - x[i+1]*y[i] for i in range(-1, len(x)-1)))
-    except:
-        return 0
-
-def calculate_polygon_perimeter(coords):
-    """Calculate polygon perimeter"""
-    try:
-        perimeter = 0
-        for i in range(len(coords)-1):
-            dx = coords[i+1][0] - coords[i][0]
-            dy = coords[i+1][1] - coords[i][1]
-            perimeter += math.sqrt(dx*dx + dy*dy)
-        return perimeter
-    except:
-        return 0
-
-def calculate_aspect_ratio(coords):
-    """Calculate aspect ratio of rectangular polygon"""
-    try:
-        if len(coords) < 4:
-            return 1
-
-        # Calculate all edge lengths
-        edge_lengths = []
-        for i in range(len(coords)-1):
-            dx = coords[i+1][0] - coords[i][0]
-            dy = coords[i+1][1] - coords[i][1]
-            length = math.sqrt(dx*dx + dy*dy)
-            edge_lengths.append(length)
-
-        # For rectangle, should have pairs of equal sides
-        edge_lengths.sort()
-        if len(edge_lengths) >= 4:
-            width = edge_lengths[0]
-            height = edge_lengths[2]  # Third shortest should be the other dimension
-
-            if width > 0:
-                return max(height/width, width/height)
-
-        return 1
-    except:
-        return 1
-
-def has_overlap_with_existing(new_coords, existing_polygons, min_distance=8.0):
+def has_overlap_with_existing(new_coords, existing_index, min_distance=8.0):
     """
     Check if new polygon overlaps significantly with existing ones
     FIXED: Using 8m minimum distance instead of 25m
     """
     try:
-        new_area = calculate_polygon_area(new_coords)
-
-        for existing_coords in existing_polygons:
-            # Simple bounding box overlap check first (fast)
-            new_x = [p[0] for p in new_coords]
-            new_y = [p[1] for p in new_coords]
-            existing_x = [p[0] for p in existing_coords]
-            existing_y = [p[1] for p in existing_coords]
-
-            new_min_x, new_max_x = min(new_x), max(new_x)
-            new_min_y, new_max_y = min(new_y), max(new_y)
-            existing_min_x, existing_max_x = min(existing_x), max(existing_x)
-            existing_min_y, existing_max_y = min(existing_y), max(existing_y)
+        new_min_x, new_min_y, new_max_x, new_max_y = polygon_bounds(new_coords)
+        new_center_x = (new_min_x + new_max_x) / 2
+        new_center_y = (new_min_y + new_max_y) / 2
 
-            # Check if bounding boxes overlap
-            if (new_max_x < existing_min_x or new_min_x > existing_max_x or
-                new_max_y < existing_min_y or new_min_y > existing_max_y):
-                continue  # No overlap
+        # Only polygons with overlapping bounding boxes (grid index lookup)
+        for polygon_id in existing_index.candidates((new_min_x, new_min_y, new_max_x, new_max_y)):
+            existing_min_x, existing_min_y, existing_max_x, existing_max_y = existing_index.bounds[polygon_id]
 
             # If bounding boxes overlap, check center distance
-            new_center_x = (new_min_x + new_max_x) / 2
-            new_center_y = (new_min_y + new_max_y) / 2
             existing_center_x = (existing_min_x + existing_max_x) / 2
             existing_center_y = (existing_min_y + existing_max_y) / 2
 
@@ -20,6 +20,8 @@ import os
 import glob
 import numpy as np
 from pathlib import Path
+from ground_model import load_ground_model
+from mast_consolidation import MAST_PROXIMITY_RADIUS, resolve_duplicates
 
 # Enhanced mast filtering parameters
 MAST_FILTERS = {
@@ -48,7 +50,7 @@ def log_warn(message):
 def log_success(message):
     print(f"[SUCCESS] {message}")
 
-def remove_duplicate_masts(masts, proximity_radius=1.5):
+def remove_duplicate_masts(masts, proximity_radius=MAST_PROXIMITY_RADIUS):
     """
     Remove duplicate masts within proximity radius, keeping the one with most points
 
@@ -65,36 +67,22 @@ def remove_duplicate_masts(masts, proximity_radius=1.5):
 
     log_info(f"    Checking for duplicates within {proximity_radius}m radius...")
 
-    # Sort masts by point count (descending) to prioritize larger masts
-    sorted_masts = sorted(masts, key=lambda m: m['point_count'], reverse=True)
+    # kd-tree pairs, resolved largest first (see mast_consolidation.py)
+    xy = np.array([(m['centroid_x'], m['centroid_y']) for m in masts])
+    point_counts = np.array([m['point_count'] for m in masts])
+    keep, duplicate_of = resolve_duplicates(xy, point_counts, proximity_radius)
 
-    filtered_masts = []
-    removed_count = 0
+    for i in np.flatnonzero(~keep):
+        kept_mast = masts[duplicate_of[i]]
+        distance = np.linalg.norm(xy[i] - xy[duplicate_of[i]])
+        log_info(f"      Duplicate found: Mast #{masts[i]['object_id']} ({masts[i]['point_count']} pts) "
+                f"is {distance:.1f}m from Mast #{kept_mast['object_id']} ({kept_mast['point_count']} pts)")
 
-    for current_mast in sorted_masts:
-        current_x = current_mast['centroid_x']
-        current_y = current_mast['centroid_y']
-
-        # Check if this mast is too close to any already kept mast
-        is_duplicate = False
-
-        for kept_mast in filtered_masts:
-            kept_x = kept_mast['centroid_x']
-            kept_y = kept_mast['centroid_y']
-
-            # Calculate Euclidean distance
-            distance = np.sqrt((current_x - kept_x)**2 + (current_y - kept_y)**2)
-
-            if distance < proximity_radius:
-                is_duplicate = True
-                log_info(f"      Duplicate found: Mast #{current_mast['object_id']} ({current_mast['point_count']} pts) "
-                        f"is {distance:.1f}m from Mast #{kept_mast['object_id']} ({kept_mast['point_count']} pts)")
-                break
-
-        if not is_duplicate:
-            filtered_masts.append(current_mast)
-        else:
-            removed_count += 1
+    # Kept masts ordered by point count (descending), as before
+    kept_indices = np.flatnonzero(keep)
+    kept_indices = kept_indices[np.argsort(-point_counts[kept_indices], kind='stable')]
+    filtered_masts = [masts[i] for i in kept_indices]
+    removed_count = len(masts) - len(filtered_masts)
 
     if removed_count > 0:
         log_info(f"    Removed {removed_count} duplicate masts (kept longest within {proximity_radius}m)")
@@ -103,16 +91,23 @@ def remove_duplicate_masts(masts, proximity_radius=1.5):
 
     return filtered_masts, removed_count
 
-def calculate_mast_quality(mast_data, chunk_bounds):
+def calculate_mast_quality(mast_data, chunk_bounds, ground=None):
     """
     Calculate quality score for mast based on multiple factors
+
+    Args:
+        ground: Chunk GroundModel (local ground under the mast); falls back
+                to the chunk's minimum z without one
     Returns: quality_score (0-1), validation_details
     """
     point_count = mast_data['point_count']
     height = mast_data['centroid_z']
 
-    # Estimate ground level from chunk bounds
-    ground_level = chunk_bounds['min_z']
+    # Ground level under the mast (DTM), else estimated from chunk bounds
+    if ground is not None:
+        ground_level = float(ground.ground_z(np.array([[mast_data['centroid_x'], mast_data['centroid_y']]]))[0])
+    else:
+        ground_level = chunk_bounds['min_z']
     relative_height = height - ground_level
 
     # Calculate density (points per meter of height)
@@ -154,9 +149,12 @@ def calculate_mast_quality(mast_data, chunk_bounds):
 
     return quality_score, validation_details
 
-def process_mast_chunk(centroids_file):
+def process_mast_chunk(centroids_file, ground=None):
     """
     Process a single chunk of mast data with enhanced filtering
+
+    Args:
+        ground: Optional chunk GroundModel for relative heights
     """
     try:
         with open(centroids_file, 'r') as f:
@@ -186,7 +184,7 @@ def process_mast_chunk(centroids_file):
     }
 
     for mast in original_masts:
-        quality_score, validation = calculate_mast_quality(mast, chunk_bounds)
+        quality_score, validation = calculate_mast_quality(mast, chunk_bounds, ground)
 
         # Apply filters
         point_count = mast['point_count']
@@ -243,6 +241,34 @@ def process_mast_chunk(centroids_file):
 
     return data
 
+def clean_chunk_masts(classes_base):
+    """
+    Clean the Stage 3 mast centroids of one chunk and write *_clean.json next to them
+
+    Args:
+        classes_base: Chunk filtred_by_classes directory
+
+    Returns:
+        Number of clean masts (0 if no centroids or processing failed)
+    """
+    centroids_file = f"{classes_base}/12_Masts/centroids/12_Masts_centroids.json"
+    if not os.path.exists(centroids_file):
+        log_warn(f"No mast centroids found: {centroids_file}")
+        return 0
+
+    log_info(f"Processing: {centroids_file}")
+    clean_data = process_mast_chunk(centroids_file, load_ground_model(classes_base))
+    if clean_data is None:
+        log_warn("Processing failed")
+        return 0
+
+    output_file = centroids_file.replace('.json', '_clean.json')
+    with open(output_file, 'w') as f:
+        json.dump(clean_data, f, indent=2)
+
+    log_success(f"Clean mast data saved: {output_file}")
+    return len(clean_data.get('centroids', []))
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python3 python_mast_enhanced.py <chunk_name>")
@@ -271,8 +297,9 @@ def main():
     log_info(f"Processing: {centroids_file}")
     print()
 
-    # Process the chunk
-    clean_data = process_mast_chunk(centroids_file)
+    # Process the chunk (relative heights from the chunk DTM when available)
+    classes_base = os.path.dirname(os.path.dirname(os.path.dirname(centroids_file)))
+    clean_data = process_mast_chunk(centroids_file, load_ground_model(classes_base))
 
     if clean_data is None:
         log_warn("Processing failed")
@@ -7,15 +7,24 @@ Based on 2024 research: height difference analysis, cross-section processing, an
 import sys
 import os
 import json
-import subprocess
 import numpy as np
+from las_reader import sample_points
+from point_cache import load_xyz
 from scipy import interpolate
 from scipy.spatial import cKDTree
 from sklearn.cluster import DBSCAN
 from sklearn.linear_model import RANSACRegressor
+import itertools
 import warnings
 warnings.filterwarnings('ignore')
 
+# Elevated points per multi-point ball query (bounds the ragged neighbor arrays)
+QUERY_BATCH_SIZE = 50_000
+
+# Maximum elevated points analysed per class; larger sets are evenly thinned
+# so boundary extraction runs in bounded time on full chunks
+CURB_SAMPLE_BUDGET = 200_000
+
 def extract_precise_road_boundaries(chunk_name, class_name, class_id):
     """Extract precise road boundaries using height difference and curb detection"""
     print(f"\n🛣️  === PRECISE {class_name.upper()} BOUNDARY EXTRACTION ===")
@@ -36,31 +45,9 @@ def extract_precise_road_boundaries(chunk_name, class_name, class_id):
 
     # Step 1: Load high-density points for precise analysis
     print(f"📂 Loading high-density surface points...")
-    temp_file = f"/tmp/{class_name.lower()}_{chunk_name}_precise.txt"
-
-    # Use minimal sampling for precision (every 0.5m)
-    pipeline = {
-        "pipeline": [
-            {"type": "readers.las", "filename": input_laz},
-            {"type": "filters.sample", "radius": 0.5},  # High density sampling
-            {"type": "writers.text", "format": "csv", "order": "X,Y,Z",
-             "keep_unspecified": "false", "filename": temp_file}
-        ]
-    }
-
-    pipeline_file = f"/tmp/precise_pipeline_{class_name}_{chunk_name}.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"❌ PDAL failed: {result.stderr}")
-        return 0
-
+    # Load via the columnar cache, thin to one point per 0.5m cell
     try:
-        points = np.loadtxt(temp_file, delimiter=',', skiprows=1)
+        points = sample_points(load_xyz(input_laz), 0.5)
         print(f"✅ Loaded {len(points):,} high-density points")
     except:
         print(f"❌ Failed to load points")
@@ -98,13 +85,6 @@ def extract_precise_road_boundaries(chunk_name, class_name, class_id):
     print(f"🎯 Using height difference criteria: 5-30cm curb detection")
     print(f"📁 Saved: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(boundaries)
 
 def detect_curb_boundaries(points, class_name):
@@ -119,13 +99,13 @@ def detect_curb_boundaries(points, class_name):
         return []
 
     # Step 2: Cross-section analysis for boundary detection
-    boundary_candidates = cross_section_analysis(ground_points, elevated_points, class_name)
+    positions, height_diffs, confidences = cross_section_analysis(ground_points, elevated_points, class_name)
 
-    if not boundary_candidates:
+    if len(positions) == 0:
         return []
 
     # Step 3: RANSAC outlier removal and DBSCAN clustering
-    refined_boundaries = refine_boundaries_ransac_dbscan(boundary_candidates)
+    refined_boundaries = refine_boundaries_ransac_dbscan(positions, confidences)
 
     if not refined_boundaries:
         return []
@@ -155,16 +135,30 @@ def filter_ground_points(points):
 
     return ground_points, elevated_points
 
-def cross_section_analysis(ground_points, elevated_points, class_name):
-    """Cross-section analysis for boundary detection using height differences"""
+def cross_section_analysis(ground_points, elevated_points, class_name, sample_budget=CURB_SAMPLE_BUDGET):
+    """
+    Cross-section analysis for boundary detection using height differences
+
+    Elevated points are queried against the ground kd-tree in batches (all
+    cores), and the height differences of every point's neighbors are
+    evaluated at once as one ragged array.
+
+    Args:
+        ground_points: (N, 3) ground points
+        elevated_points: (M, 3) elevated points
+        class_name: Class name (selects the curb height criteria)
+        sample_budget: Maximum elevated points analysed (None for all)
+
+    Returns:
+        positions: (K, 2) boundary candidate positions
+        height_diffs: (K,) mean valid height difference per candidate
+        confidences: (K,) share of nearby ground points with a valid difference
+    """
     print(f"   Performing cross-section analysis...")
 
+    empty = (np.zeros((0, 2)), np.zeros(0), np.zeros(0))
     if len(ground_points) == 0 or len(elevated_points) == 0:
-        return []
-
-    # Build spatial index for efficient neighbor search
-    ground_tree = cKDTree(ground_points[:, :2])  # XY coordinates only
-    elevated_tree = cKDTree(elevated_points[:, :2])
+        return empty
 
     # Parameters based on class type
     if "Road" in class_name:
@@ -176,52 +170,58 @@ def cross_section_analysis(ground_points, elevated_points, class_name):
         min_height_diff = 0.03   # 3cm minimum height difference
         max_height_diff = 0.20   # 20cm maximum height difference
 
-    boundary_candidates = []
-
-    # For each elevated point, find nearby ground points
-    for i, elevated_pt in enumerate(elevated_points):
-        if i % 100 == 0:  # Progress indicator
-            print(f"   Processing elevated point {i}/{len(elevated_points)}", end='\r')
+    if sample_budget is not None and len(elevated_points) > sample_budget:
+        sample_indices = np.linspace(0, len(elevated_points)-1, sample_budget, dtype=int)
+        print(f"   Sampling {sample_budget:,} of {len(elevated_points):,} elevated points")
+        elevated_points = elevated_points[sample_indices]
 
-        # Find ground points within search radius
-        ground_indices = ground_tree.query_ball_point(elevated_pt[:2], search_radius)
+    # Build spatial index for efficient neighbor search
+    ground_tree = cKDTree(ground_points[:, :2])  # XY coordinates only
 
-        if not ground_indices:
+    positions, height_diffs, confidences = [], [], []
+    for begin in range(0, len(elevated_points), QUERY_BATCH_SIZE):
+        batch = elevated_points[begin:begin + QUERY_BATCH_SIZE]
+        print(f"   Processing elevated points {begin:,}-{begin + len(batch):,}/{len(elevated_points):,}", end='\r')
+
+        # Ground points within search radius of every elevated point, flattened
+        neighbors = ground_tree.query_ball_point(batch[:, :2], search_radius, workers=-1)
+        lengths = np.fromiter((len(x) for x in neighbors), dtype=np.int64, count=len(batch))
+        flat = np.fromiter(itertools.chain.from_iterable(neighbors), dtype=np.int64, count=lengths.sum())
+        owner = np.repeat(np.arange(len(batch)), lengths)
+
+        # Height differences, filtered by height criteria (research-based 5-30cm)
+        diffs = batch[owner, 2] - ground_points[flat, 2]
+        valid = (diffs >= min_height_diff) & (diffs <= max_height_diff)
+        valid_owner = owner[valid]
+        valid_count = np.bincount(valid_owner, minlength=len(batch))
+
+        found = valid_count > 0
+        if not found.any():
             continue
 
-        nearby_ground = ground_points[ground_indices]
-
-        # Calculate height differences
-        height_diffs = elevated_pt[2] - nearby_ground[:, 2]
-
-        # Filter by height criteria (research-based 5-30cm)
-        valid_diffs = (height_diffs >= min_height_diff) & (height_diffs <= max_height_diff)
+        # Boundary candidate halfway between the elevated point and its valid ground
+        count = valid_count[found]
+        ground_x = np.bincount(valid_owner, weights=ground_points[flat[valid], 0], minlength=len(batch))[found] / count
+        ground_y = np.bincount(valid_owner, weights=ground_points[flat[valid], 1], minlength=len(batch))[found] / count
+        positions.append(0.5 * (batch[found, :2] + np.column_stack((ground_x, ground_y))))
+        height_diffs.append(np.bincount(valid_owner, weights=diffs[valid], minlength=len(batch))[found] / count)
+        confidences.append(count / lengths[found])
 
-        if np.any(valid_diffs):
-            # Calculate average position as boundary candidate
-            valid_ground = nearby_ground[valid_diffs]
-            boundary_pos = np.mean([elevated_pt[:2], np.mean(valid_ground[:, :2], axis=0)], axis=0)
+    if not positions:
+        print(f"\n   Found 0 boundary candidates")
+        return empty
 
-            boundary_candidates.append({
-                'position': boundary_pos,
-                'height_diff': np.mean(height_diffs[valid_diffs]),
-                'confidence': len(valid_ground) / len(nearby_ground)
-            })
+    positions = np.concatenate(positions)
+    print(f"\n   Found {len(positions)} boundary candidates")
+    return positions, np.concatenate(height_diffs), np.concatenate(confidences)
 
-    print(f"\n   Found {len(boundary_candidates)} boundary candidates")
-    return boundary_candidates
-
-def refine_boundaries_ransac_dbscan(boundary_candidates):
-    """RANSAC outlier removal + DBSCAN clustering"""
+def refine_boundaries_ransac_dbscan(positions, confidences):
+    """RANSAC outlier removal + DBSCAN clustering of candidate arrays"""
     print(f"   Applying RANSAC outlier removal and DBSCAN clustering...")
 
-    if len(boundary_candidates) < 10:
+    if len(positions) < 10:
         return []
 
-    # Extract positions and confidence scores
-    positions = np.array([bc['position'] for bc in boundary_candidates])
-    confidences = np.array([bc['confidence'] for bc in boundary_candidates])
-
     # DBSCAN clustering to group boundary segments
     clustering = DBSCAN(eps=5.0, min_samples=5).fit(positions)
     labels = clustering.labels_
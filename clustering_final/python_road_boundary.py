@@ -7,26 +7,36 @@ Extracts precise edge boundaries from surface point clouds
 import sys
 import os
 import json
-import subprocess
 import numpy as np
+from las_reader import sample_points
+from point_cache import load_xyz
 from scipy.spatial import ConvexHull, cKDTree
-from sklearn.cluster import DBSCAN
+from grid_dbscan import dbscan_labels
 from shapely.geometry import Polygon, LineString
 from shapely.ops import unary_union
-import alphashape
+from alpha_shape import alpha_shape, polygon_parts
+from spatial_tiler import keep_owned
 
-def extract_surface_boundaries(chunk_name, class_name, class_id):
-    """Extract precise boundaries from road/sidewalk surface points"""
+def extract_surface_boundaries(chunk_name, class_name, class_id, classes_base=None, points=None):
+    """
+    Extract precise boundaries from road/sidewalk surface points
+
+    Args:
+        classes_base: filtred_by_classes directory (defaults to the outlast/chunks layout)
+        points: Optional preloaded (N, 3) surface points (skips loading the class LAZ)
+    """
     print(f"\n🛣️  === {class_name.upper()} BOUNDARY EXTRACTION ===")
     print(f"📍 Chunk: {chunk_name}")
     print(f"🎯 Method: Surface boundary detection")
 
-    base_path = "/home/prodair/Desktop/MORIUS5090/clustering/clustering_final"
-    input_laz = f"{base_path}/outlast/chunks/{chunk_name}/compressed/filtred_by_classes/{class_name}/{class_name}.laz"
-    output_dir = f"{base_path}/outlast/chunks/{chunk_name}/compressed/filtred_by_classes/{class_name}/lines"
+    if classes_base is None:
+        base_path = "/home/prodair/Desktop/MORIUS5090/clustering/clustering_final"
+        classes_base = f"{base_path}/outlast/chunks/{chunk_name}/compressed/filtred_by_classes"
+    input_laz = f"{classes_base}/{class_name}/{class_name}.laz"
+    output_dir = f"{classes_base}/{class_name}/lines"
     output_file = f"{output_dir}/{class_name}_lines.geojson"
 
-    if not os.path.exists(input_laz):
+    if points is None and not os.path.exists(input_laz):
         print(f"❌ No data: {input_laz}")
         return 0
 
@@ -34,31 +44,11 @@ def extract_surface_boundaries(chunk_name, class_name, class_id):
 
     # Load points with sampling for performance
     print(f"📂 Loading surface points...")
-    temp_file = f"/tmp/{class_name.lower()}_{chunk_name}_boundary.txt"
-
-    # Use denser sampling for boundary detection (every 1m)
-    pipeline = {
-        "pipeline": [
-            {"type": "readers.las", "filename": input_laz},
-            {"type": "filters.sample", "radius": 1.0},  # Sample every 1m for accuracy
-            {"type": "writers.text", "format": "csv", "order": "X,Y,Z",
-             "keep_unspecified": "false", "filename": temp_file}
-        ]
-    }
-
-    pipeline_file = f"/tmp/boundary_pipeline_{class_name}_{chunk_name}.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"❌ PDAL failed: {result.stderr}")
-        return 0
-
+    # Load via the columnar cache, thin to one point per 1m cell
     try:
-        points = np.loadtxt(temp_file, delimiter=',', skiprows=1)
+        if points is None:
+            points = load_xyz(input_laz)
+        points = sample_points(points, 1.0)
         print(f"✅ Loaded {len(points):,} surface points")
     except:
         print(f"❌ Failed to load points")
@@ -70,6 +60,11 @@ def extract_surface_boundaries(chunk_name, class_name, class_id):
 
     # Extract boundaries using surface clustering + alpha shapes
     boundaries = extract_alpha_shape_boundaries(points, class_name)
+    # Tiled chunk: boundaries centered in the buffer belong to the neighbor tile
+    boundaries, dropped = keep_owned(boundaries, lambda b: LineString(b['coordinates']).centroid.coords[0][:2],
+                                     classes_base)
+    if dropped:
+        print(f"✂️  {dropped} buffer boundaries left to the neighbor tiles")
 
     if not boundaries:
         print(f"⚠️  No boundaries extracted")
@@ -85,13 +80,6 @@ def extract_surface_boundaries(chunk_name, class_name, class_id):
     print(f"✅ Extracted {len(boundaries)} boundary segments")
     print(f"📁 Saved to: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(boundaries)
 
 def extract_alpha_shape_boundaries(points, class_name):
@@ -104,15 +92,14 @@ def extract_alpha_shape_boundaries(points, class_name):
     if "Road" in class_name:
         eps = 8.0          # Roads: larger connected components
         min_samples = 50   # More points needed
-        alpha = 15.0       # Moderate alpha for road edges
+        alpha = 15.0       # Moderate alpha for road edges (max triangle circumradius, m)
     else:  # Sidewalks
         eps = 4.0          # Sidewalks: smaller components
         min_samples = 30   # Fewer points needed
-        alpha = 8.0        # Smaller alpha for precise sidewalk edges
+        alpha = 8.0        # Smaller alpha for precise sidewalk edges (max triangle circumradius, m)
 
     # Step 1: Cluster surface points into connected components
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(xy_points)
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps, min_samples, class_name=class_name)
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
 
     print(f"   Found {n_clusters} surface clusters")
@@ -128,30 +115,22 @@ def extract_alpha_shape_boundaries(points, class_name):
 
         try:
             # Create alpha shape to get precise boundary
-            alpha_shape = alphashape.alphashape(cluster_points, alpha)
-
-            # Extract boundary coordinates
-            if hasattr(alpha_shape, 'exterior'):
-                # Single polygon
-                boundary_coords = list(alpha_shape.exterior.coords)
-                if len(boundary_coords) >= 4:  # Valid polygon
-                    boundaries.append({
-                        'coordinates': [[float(x), float(y)] for x, y in boundary_coords],
-                        'surface_points': len(cluster_points),
-                        'boundary_type': 'closed_boundary'
-                    })
-
-            elif hasattr(alpha_shape, 'geoms'):
-                # MultiPolygon - extract all boundaries
-                for geom in alpha_shape.geoms:
-                    if hasattr(geom, 'exterior'):
-                        boundary_coords = list(geom.exterior.coords)
-                        if len(boundary_coords) >= 4:
-                            boundaries.append({
-                                'coordinates': [[float(x), float(y)] for x, y in boundary_coords],
-                                'surface_points': len(cluster_points),
-                                'boundary_type': 'multi_boundary'
-                            })
+            parts = polygon_parts(alpha_shape(cluster_points, alpha))
+            if not parts:
+                raise ValueError("no triangle within alpha")
+
+            # Extract boundary coordinates: outer edges and holes (islands, medians)
+            outer_type = 'closed_boundary' if len(parts) == 1 else 'multi_boundary'
+            for geom in parts:
+                rings = [(geom.exterior, outer_type)] + [(ring, 'hole_boundary') for ring in geom.interiors]
+                for ring, boundary_type in rings:
+                    boundary_coords = list(ring.coords)
+                    if len(boundary_coords) >= 4:  # Valid polygon
+                        boundaries.append({
+                            'coordinates': [[float(x), float(y)] for x, y in boundary_coords],
+                            'surface_points': len(cluster_points),
+                            'boundary_type': boundary_type
+                        })
 
         except Exception as e:
             # Fallback to convex hull if alpha shape fails
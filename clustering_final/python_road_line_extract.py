@@ -8,11 +8,11 @@ Optimized for continuous linear surface structures
 import sys
 import os
 import json
-import subprocess
 import numpy as np
+from point_cache import load_xyz
 import math
 from scipy.spatial import cKDTree
-from sklearn.cluster import DBSCAN
+from grid_dbscan import dbscan_labels
 from sklearn.linear_model import RANSACRegressor
 
 def extract_road_lines(chunk_name, class_name, class_id):
@@ -38,50 +38,12 @@ def extract_road_lines(chunk_name, class_name, class_id):
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Load points using PDAL pipeline
+    # Load points via the columnar cache (LAZ decoded on first run only)
     print(f"📂 Loading {class_name.lower()} point data...")
     try:
-        # Create temporary text file for points
-        temp_points_file = f"/tmp/{class_name.lower()}_points_{chunk_name}.txt"
-
-        # PDAL pipeline to extract points as text
-        pipeline = {
-            "pipeline": [
-                {
-                    "type": "readers.las",
-                    "filename": input_laz
-                },
-                {
-                    "type": "writers.text",
-                    "format": "csv",
-                    "order": "X,Y,Z",
-                    "keep_unspecified": "false",
-                    "filename": temp_points_file
-                }
-            ]
-        }
-
-        # Write pipeline to temporary file
-        pipeline_file = f"/tmp/{class_name.lower()}_pipeline_{chunk_name}.json"
-        with open(pipeline_file, 'w') as f:
-            json.dump(pipeline, f, indent=2)
-
-        # Execute PDAL pipeline
-        result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                              capture_output=True, text=True)
-
-        if result.returncode != 0:
-            print(f"❌ PDAL pipeline failed: {result.stderr}")
-            return 0
-
-        # Load points from CSV
-        points = np.loadtxt(temp_points_file, delimiter=',', skiprows=1)
+        points = load_xyz(input_laz)
         print(f"✅ Loaded {len(points):,} points")
 
-        # Clean up temp files
-        os.remove(temp_points_file)
-        os.remove(pipeline_file)
-
     except Exception as e:
         print(f"❌ Failed to load point data: {e}")
         return 0
@@ -131,9 +93,7 @@ def extract_linear_paths(points, class_name):
 
     # Use XY coordinates only for surface features
     xy_points = points[:, :2]
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(xy_points)
-
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps, min_samples, class_name=class_name)
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
     n_noise = list(labels).count(-1)
 
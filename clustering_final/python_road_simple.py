@@ -6,9 +6,10 @@ Simple Road/Sidewalk Line Extraction - Memory Efficient
 import sys
 import os
 import json
-import subprocess
 import numpy as np
-from sklearn.cluster import DBSCAN
+from las_reader import sample_points
+from point_cache import load_xyz
+from grid_dbscan import dbscan_labels
 
 def extract_simple_lines(chunk_name, class_name, class_id):
     """Simple line extraction with memory optimization"""
@@ -25,33 +26,10 @@ def extract_simple_lines(chunk_name, class_name, class_id):
 
     os.makedirs(output_dir, exist_ok=True)
 
-    # Use PDAL to sample points (every 10th point for performance)
-    temp_file = f"/tmp/{class_name.lower()}_{chunk_name}_sample.txt"
-
-    pipeline = {
-        "pipeline": [
-            {"type": "readers.las", "filename": input_laz},
-            {"type": "filters.sample", "radius": 2.0},  # Sample every 2m
-            {"type": "writers.text", "format": "csv", "order": "X,Y,Z",
-             "keep_unspecified": "false", "filename": temp_file}
-        ]
-    }
-
-    pipeline_file = f"/tmp/pipeline_{class_name}_{chunk_name}.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
     print(f"   Loading sampled points...")
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"❌ PDAL failed: {result.stderr}")
-        return 0
-
-    # Load sampled points
+    # Load via the columnar cache, thin to one point per 2m cell
     try:
-        points = np.loadtxt(temp_file, delimiter=',', skiprows=1)
+        points = sample_points(load_xyz(input_laz), 2.0)
         print(f"   Loaded {len(points):,} sampled points")
     except:
         print(f"❌ Failed to load points")
@@ -65,8 +43,7 @@ def extract_simple_lines(chunk_name, class_name, class_id):
     eps = 10.0 if "Road" in class_name else 5.0  # Larger clusters for roads
     min_samples = 10
 
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(points[:, :2])
-    labels = clustering.labels_
+    labels = dbscan_labels(points[:, :2], eps, min_samples, class_name=class_name)
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
 
     print(f"   Found {n_clusters} clusters")
@@ -118,13 +95,6 @@ def extract_simple_lines(chunk_name, class_name, class_id):
 
     print(f"✅ Saved {len(lines)} lines to: {output_file}")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(lines)
 
 if __name__ == "__main__":
@@ -7,9 +7,10 @@ Creates clean, straight boundary lines instead of zigzag curves
 import sys
 import os
 import json
-import subprocess
 import numpy as np
-from sklearn.cluster import DBSCAN
+from las_reader import sample_points
+from point_cache import load_xyz
+from grid_dbscan import dbscan_labels
 from sklearn.linear_model import LinearRegression
 from sklearn.decomposition import PCA
 
@@ -32,30 +33,9 @@ def create_straight_boundaries(chunk_name, class_name, class_id):
 
     # Load and sample points
     print(f"📂 Loading surface points...")
-    temp_file = f"/tmp/{class_name.lower()}_{chunk_name}_straight.txt"
-
-    pipeline = {
-        "pipeline": [
-            {"type": "readers.las", "filename": input_laz},
-            {"type": "filters.sample", "radius": 3.0},  # Sample every 3m for clean lines
-            {"type": "writers.text", "format": "csv", "order": "X,Y,Z",
-             "keep_unspecified": "false", "filename": temp_file}
-        ]
-    }
-
-    pipeline_file = f"/tmp/straight_pipeline_{class_name}_{chunk_name}.json"
-    with open(pipeline_file, 'w') as f:
-        json.dump(pipeline, f)
-
-    result = subprocess.run(['pdal', 'pipeline', pipeline_file],
-                          capture_output=True, text=True)
-
-    if result.returncode != 0:
-        print(f"❌ PDAL failed: {result.stderr}")
-        return 0
-
+    # Load via the columnar cache, thin to one point per 3m cell
     try:
-        points = np.loadtxt(temp_file, delimiter=',', skiprows=1)
+        points = sample_points(load_xyz(input_laz), 3.0)
         print(f"✅ Loaded {len(points):,} points")
     except:
         print(f"❌ Failed to load points")
@@ -90,13 +70,6 @@ def create_straight_boundaries(chunk_name, class_name, class_id):
 
     print(f"✅ Created {len(boundaries)} straight boundary lines")
 
-    # Cleanup
-    try:
-        os.remove(temp_file)
-        os.remove(pipeline_file)
-    except:
-        pass
-
     return len(boundaries)
 
 def create_clean_straight_lines(points, class_name):
@@ -114,8 +87,7 @@ def create_clean_straight_lines(points, class_name):
         min_samples = 15  # Reduced minimum points for sidewalks
 
     # Cluster points into road/sidewalk segments
-    clustering = DBSCAN(eps=eps, min_samples=min_samples).fit(xy_points)
-    labels = clustering.labels_
+    labels = dbscan_labels(xy_points, eps, min_samples, class_name=class_name)
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
 
     print(f"   Found {n_clusters} surface segments")
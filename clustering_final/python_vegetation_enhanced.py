@@ -3,44 +3,68 @@
 Enhanced Vegetation Polygon Extraction for LiDAR Point Clouds
 Creates natural, curved boundary polygons for Other Vegetation areas
 Based on footprint-following algorithms with vegetation-specific optimizations
+Optional raster mode: smoothed density grid + marching squares boundaries
+with holes (density_raster), for hedges and lawn strips spanning a chunk
 """
 
 import sys
 import os
 import json
-import subprocess
 import numpy as np
-import math
-from scipy.spatial import ConvexHull, cKDTree
-from sklearn.cluster import DBSCAN
-
-def extract_vegetation_polygons_enhanced(chunk_path):
+from scipy.spatial import ConvexHull
+from grid_dbscan import dbscan_labels
+from point_cache import load_xyz
+from extractor_common import resolve_chunk_path, sparse_neighborhood_mask
+from ground_model import ground_height_filter
+from polygon_simplify import simplify_coords
+from geometry_metrics import ring_metrics, pack_rings, polygon_areas
+from polygon_index import PolygonIndex
+from outlier_filter import statistical_outlier_filter
+from voxel_grid import voxel_downsample
+from density_raster import density_polygons, DENSITY_CELL_SIZE
+from spatial_tiler import keep_owned_features
+
+# Area extraction modes:
+# - cluster: DBSCAN areas + concave hull per cluster
+# - raster: density grid + smoothing + marching squares (linear time, holes kept)
+AREA_MODES = ("cluster", "raster")
+DEFAULT_AREA_MODE = "cluster"
+
+# Area (m²) and aspect ratio limits per mode (None = no limit). Cluster areas
+# are single patches; raster areas are whole connected vegetated regions
+# (hedges, verges, parks), so they are neither capped in size nor in elongation
+AREA_LIMITS = {
+    "cluster": {"min_area_m2": 10, "max_area_m2": 2000, "max_aspect_ratio": 15},
+    "raster": {"min_area_m2": 10, "max_area_m2": None, "max_aspect_ratio": None},
+}
+
+def extract_vegetation_polygons_enhanced(chunk_path, points_3d=None, mode=DEFAULT_AREA_MODE):
     """
     Enhanced vegetation extraction using footprint-based polygon generation
     Optimized for natural vegetation boundaries with curved edges
 
     Args:
         chunk_path: Path to chunk directory (e.g., /path/to/chunk_1 or /path/to/chunk_1/compressed/filtred_by_classes)
+        points_3d: Optional preloaded (N, 3) vegetation points (skips loading 8_OtherVegetation.laz)
+        mode: Area extraction mode, "cluster" or "raster" (see AREA_MODES)
     """
+    if mode not in AREA_MODES:
+        print(f"❌ Unknown area mode: {mode} (expected one of {', '.join(AREA_MODES)})")
+        return 0
+
     # Normalize the path - detect if it's the chunk root or filtred_by_classes
-    chunk_path = os.path.abspath(chunk_path)
-
-    if chunk_path.endswith('/compressed/filtred_by_classes'):
-        # Path is already pointing to filtred_by_classes
-        classes_base = chunk_path
-        chunk_name = os.path.basename(os.path.dirname(os.path.dirname(chunk_path)))
-    elif os.path.exists(os.path.join(chunk_path, 'compressed/filtred_by_classes')):
-        # Path is chunk root directory
-        classes_base = os.path.join(chunk_path, 'compressed/filtred_by_classes')
-        chunk_name = os.path.basename(chunk_path)
-    else:
+    classes_base, chunk_name = resolve_chunk_path(chunk_path)
+    if classes_base is None:
         print(f"❌ Invalid path structure. Expected chunk directory or filtred_by_classes directory")
         return 0
 
     print(f"\n🌿 === ENHANCED VEGETATION POLYGON EXTRACTION ===")
     print(f"📍 Chunk: {chunk_name}")
     print(f"📂 Base path: {classes_base}")
-    print(f"🎯 Method: Natural boundary detection + curved polygons")
+    if mode == "raster":
+        print(f"🎯 Method: Density raster ({DENSITY_CELL_SIZE}m) + marching squares boundaries")
+    else:
+        print(f"🎯 Method: Natural boundary detection + curved polygons")
     print(f"📊 Extracting vegetation areas...")
 
     # Paths
@@ -49,63 +73,18 @@ def extract_vegetation_polygons_enhanced(chunk_path):
     output_file = f"{output_dir}/8_OtherVegetation_polygons.geojson"
 
     # Check if vegetation data exists
-    if not os.path.exists(vegetation_laz):
+    if points_3d is None and not os.path.exists(vegetation_laz):
         print(f"❌ No vegetation data found: {vegetation_laz}")
         return 0
 
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Load vegetation points using PDAL pipeline
+    # Load vegetation points via the columnar cache (LAZ decoded on first run only)
     print(f"📂 Loading vegetation point data...")
     try:
-        # Create temporary text file for points
-        temp_points_file = f"/tmp/vegetation_points_{chunk_name}.txt"
-
-        # PDAL pipeline to extract points as text
-        pipeline = {
-            "pipeline": [
-                {
-                    "type": "readers.las",
-                    "filename": vegetation_laz
-                },
-                {
-                    "type": "writers.text",
-                    "filename": temp_points_file,
-                    "format": "csv",
-                    "order": "X,Y,Z",
-                    "write_header": False
-                }
-            ]
-        }
-
-        # Write pipeline to temporary file
-        temp_pipeline_file = f"/tmp/vegetation_pipeline_{chunk_name}.json"
-        with open(temp_pipeline_file, 'w') as f:
-            json.dump(pipeline, f)
-
-        # Execute PDAL pipeline
-        cmd = ["pdal", "pipeline", temp_pipeline_file]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-
-        # Read points from text file
-        points_3d = []
-        if os.path.exists(temp_points_file):
-            with open(temp_points_file, 'r') as f:
-                for line in f:
-                    try:
-                        parts = line.strip().split(',')
-                        if len(parts) >= 3:
-                            x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
-                            points_3d.append([x, y, z])
-                    except (ValueError, IndexError):
-                        continue
-
-            # Clean up temporary files
-            os.remove(temp_points_file)
-            os.remove(temp_pipeline_file)
-
-        points_3d = np.array(points_3d)
+        if points_3d is None:
+            points_3d = load_xyz(vegetation_laz)
 
         if len(points_3d) == 0:
             print(f"❌ No vegetation points found")
@@ -116,18 +95,14 @@ def extract_vegetation_polygons_enhanced(chunk_path):
         # Step 1: Balanced voxel grid filtering (medium precision)
         print(f"\n🔄 Step 1: Balanced voxel filtering (0.4m grid)")
         voxel_size = 0.4  # Medium voxel for balanced precision/coverage
-        voxel_indices = np.floor(points_3d / voxel_size).astype(int)
-        unique_voxels, unique_indices = np.unique(voxel_indices, axis=0, return_index=True)
-        voxel_filtered = points_3d[unique_indices]
+        voxel_filtered = voxel_downsample(points_3d, voxel_size)
         print(f"  📊 Voxel filtered: {len(voxel_filtered):,} ({100*len(voxel_filtered)/len(points_3d):.1f}%)")
 
         # Step 2: Enhanced height-based filtering
         print(f"\n🔄 Step 2: Enhanced height-based filtering")
-        z_values = voxel_filtered[:, 2]
-        height_threshold = np.percentile(z_values, 20)  # Keep upper 80% for vegetation
-        height_mask = z_values > height_threshold
-        height_filtered = voxel_filtered[height_mask]
-        print(f"  📊 Height filtered (>{height_threshold:.1f}m): {len(height_filtered):,} ({100*len(height_filtered)/len(voxel_filtered):.1f}%)")
+        # Chunk DTM clearance (upper 80% without ground classes)
+        height_filtered, height_threshold = ground_height_filter(voxel_filtered, classes_base, "8_OtherVegetation", 20)
+        print(f"  📊 Height filtered ({height_threshold}): {len(height_filtered):,} ({100*len(height_filtered)/len(voxel_filtered):.1f}%)")
 
         # Step 3: Moderate outlier removal (balanced precision)
         print(f"\n🔄 Step 3: Moderate outlier removal")
@@ -137,67 +112,69 @@ def extract_vegetation_polygons_enhanced(chunk_path):
             print(f"❌ Too few points after filtering: {len(points_2d)}")
             return 0
 
-        tree = cKDTree(points_2d)
-        k_neighbors = min(12, len(points_2d) - 1)  # Moderate neighbors for balanced filtering
-        distances, _ = tree.query(points_2d, k=k_neighbors+1)
-
-        mean_distances = distances[:, 1:].mean(axis=1)
-        mean_dist = np.mean(mean_distances)
-        std_dist = np.std(mean_distances)
-
-        # Moderate outlier threshold for balanced precision/coverage
-        outlier_threshold = mean_dist + 1.8 * std_dist  # Looser threshold than buildings
-        inlier_mask = mean_distances < outlier_threshold
+        # Moderate neighbors and outlier threshold for balanced precision/coverage
+        inlier_mask, _, index = statistical_outlier_filter(points_2d, "8_OtherVegetation")  # Looser threshold than buildings
         clean_points_2d = points_2d[inlier_mask]
 
         print(f"  📊 Outlier removal: {len(clean_points_2d):,} ({100*len(clean_points_2d)/len(points_2d):.1f}%)")
 
-        # Step 4: Moderate vegetation clustering for balanced boundaries
-        print(f"\n🔄 Step 4: Moderate vegetation area clustering")
-        clustering = DBSCAN(eps=4.0, min_samples=80, n_jobs=-1)  # Balanced eps and samples
-        labels = clustering.fit_predict(clean_points_2d)
+        if mode == "raster":
+            # Step 4: Density raster areas
+            print(f"\n🔄 Step 4: Density raster areas ({DENSITY_CELL_SIZE}m cells, marching squares)")
+            candidates = create_density_areas(clean_points_2d)
+            print(f"  📊 Found {len(candidates)} potential vegetation areas")
 
-        unique_labels = [l for l in set(labels) if l != -1]
-        n_clusters = len(unique_labels)
-        n_noise = list(labels).count(-1)
+            if not candidates:
+                print(f"❌ No vegetation areas found")
+                return 0
+        else:
+            # Step 4: Moderate vegetation clustering for balanced boundaries
+            print(f"\n🔄 Step 4: Moderate vegetation area clustering")
+            labels = dbscan_labels(clean_points_2d, eps=4.0, min_samples=80, class_name="8_OtherVegetation", index=index)  # Balanced eps and samples
 
-        print(f"  📊 Found {n_clusters} potential vegetation areas, {n_noise} noise points")
+            unique_labels = [l for l in set(labels) if l != -1]
+            n_clusters = len(unique_labels)
+            n_noise = list(labels).count(-1)
 
-        if n_clusters == 0:
-            print(f"❌ No vegetation clusters found")
-            return 0
+            print(f"  📊 Found {n_clusters} potential vegetation areas, {n_noise} noise points")
+
+            if n_clusters == 0:
+                print(f"❌ No vegetation clusters found")
+                return 0
+
+            # Polygons are built one cluster at a time as the candidates are checked
+            candidates = ((create_vegetation_polygon(clean_points_2d[labels == cluster_id]), [],
+                           int(np.count_nonzero(labels == cluster_id)))
+                          for cluster_id in sorted(unique_labels))
 
         # Step 5: Create natural vegetation polygons
         print(f"\n🔄 Step 5: Vegetation polygon generation")
 
         vegetation_areas = []
-        vegetation_polygons = []  # To check for overlaps
-
-        for i, cluster_id in enumerate(sorted(unique_labels)):
-            cluster_mask = labels == cluster_id
-            cluster_points = clean_points_2d[cluster_mask]
+        vegetation_polygons = PolygonIndex()  # To check for overlaps
+        limits = AREA_LIMITS[mode]
 
-            print(f"  🌿 Vegetation area {i+1}: {len(cluster_points):,} points")
-
-            # Create natural vegetation polygon with curved boundaries
-            polygon_coords = create_vegetation_polygon(cluster_points)
+        for i, (polygon_coords, holes, point_count) in enumerate(candidates):
+            print(f"  🌿 Vegetation area {i+1}: {point_count:,} points")
 
             if polygon_coords is None:
                 print(f"    ❌ Failed to create valid polygon")
                 continue
 
-            # Calculate area
-            area_m2 = calculate_polygon_area(polygon_coords)
-            perimeter_m = calculate_polygon_perimeter(polygon_coords)
+            # Area (holes excluded), perimeter and bbox aspect ratio (geometry_metrics kernel)
+            metrics = ring_metrics(polygon_coords)
+            area_m2 = metrics["area_m2"] - (polygon_areas(*pack_rings(holes)).sum() if holes else 0.0)
+            perimeter_m = metrics["perimeter_m"]
 
-            # Vegetation-specific size filtering (smaller minimum, larger maximum)
-            if area_m2 < 10 or area_m2 > 2000:  # 10-2000 m² for vegetation areas
-                print(f"    ❌ Size filter: {area_m2:.1f} m² (must be 10-2000 m²)")
+            # Vegetation-specific size filtering (limits of the area mode)
+            if area_m2 < limits["min_area_m2"] or \
+                    (limits["max_area_m2"] is not None and area_m2 > limits["max_area_m2"]):
+                print(f"    ❌ Size filter: {area_m2:.1f} m² (must be {limits['min_area_m2']}-{limits['max_area_m2'] or '∞'} m²)")
                 continue
 
             # Check aspect ratio (vegetation can be more elongated)
-            aspect_ratio = calculate_aspect_ratio(polygon_coords)
-            if aspect_ratio > 15:  # Max 15:1 ratio for vegetation
+            aspect_ratio = metrics["bbox_aspect_ratio"]
+            if limits["max_aspect_ratio"] is not None and aspect_ratio > limits["max_aspect_ratio"]:
                 print(f"    ❌ Aspect ratio too high: {aspect_ratio:.1f}:1")
                 continue
 
@@ -220,7 +197,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
                 "type": "Feature",
                 "geometry": {
                     "type": "Polygon",
-                    "coordinates": [utm_coords]
+                    "coordinates": [utm_coords] + holes
                 },
                 "properties": {
                     "polygon_id": len(vegetation_areas) + 1,
@@ -228,16 +205,21 @@ def extract_vegetation_polygons_enhanced(chunk_path):
                     "chunk": chunk_name,
                     "area_m2": round(area_m2, 2),
                     "perimeter_m": round(perimeter_m, 2),
-                    "point_count": len(cluster_points),
+                    "point_count": point_count,
                     "aspect_ratio": round(aspect_ratio, 2),
-                    "extraction_method": "python_vegetation_enhanced"
+                    "extraction_method": "python_vegetation_enhanced" if mode == "cluster" else "python_vegetation_raster"
                 }
             }
 
             vegetation_areas.append(vegetation_area)
-            vegetation_polygons.append(polygon_coords)
+            vegetation_polygons.add(polygon_coords)
+
+            print(f"    ✅ Vegetation area {len(vegetation_areas)}: {area_m2:.1f} m², {point_count} points, {aspect_ratio:.1f}:1 ratio")
 
-            print(f"    ✅ Vegetation area {len(vegetation_areas)}: {area_m2:.1f} m², {len(cluster_points)} points, {aspect_ratio:.1f}:1 ratio")
+        # Tiled chunk: polygons centered in the buffer belong to the neighbor tile
+        vegetation_areas, dropped = keep_owned_features(vegetation_areas, classes_base)
+        if dropped:
+            print(f"    ✂️  {dropped} buffer areas left to the neighbor tiles")
 
         if len(vegetation_areas) == 0:
             print(f"❌ No valid vegetation areas after filtering")
@@ -252,7 +234,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
             "properties": {
                 "class": "8_OtherVegetation",
                 "chunk": chunk_name,
-                "extraction_method": "python_vegetation_enhanced_natural",
+                "extraction_method": "python_vegetation_enhanced_natural" if mode == "cluster" else "python_vegetation_raster",
                 "results": {
                     "input_points": len(points_3d),
                     "clean_points": len(clean_points_2d),
@@ -322,30 +304,35 @@ def create_vegetation_polygon(points_2d):
     except Exception as e:
         return None
 
+def create_density_areas(points_2d):
+    """
+    Vegetation areas from the density raster (marching squares boundaries)
+
+    Returns:
+        candidates: list of (exterior coords, hole coord lists, point_count), largest first
+    """
+    candidates = []
+    for polygon, point_count in density_polygons(points_2d):
+        exterior = simplify_vegetation_polygon(np.asarray(polygon.exterior.coords).tolist(), tolerance=0.5)
+        holes = [simplify_vegetation_polygon(np.asarray(ring.coords).tolist(), tolerance=0.5)
+                 for ring in polygon.interiors]
+        candidates.append((exterior, [hole for hole in holes if len(hole) >= 4], point_count))
+    return candidates
+
 def create_vegetation_concave_hull(points, alpha=4.0):
     """Create concave hull optimized for vegetation with precise boundaries"""
     try:
         if len(points) < 6:
             return None
 
-        # Build k-d tree for efficient neighbor finding
-        tree = cKDTree(points)
-
         # Find boundary points with precise alpha for accurate vegetation boundaries
-        boundary_points = []
-
-        for i, point in enumerate(points):
-            neighbors = tree.query_ball_point(point, alpha)
-
-            # Precise boundary detection to avoid street extensions
-            if len(neighbors) <= 8:  # Lower threshold for precise boundaries
-                boundary_points.append(point)
+        # Precise boundary detection to avoid street extensions
+        boundary_points = points[sparse_neighborhood_mask(points, alpha, 8)]  # Lower threshold for precise boundaries
 
         if len(boundary_points) < 6:
             return None
 
         # Create convex hull of boundary points
-        boundary_points = np.array(boundary_points)
         hull = ConvexHull(boundary_points)
 
         # Return hull vertices
@@ -364,149 +351,40 @@ def simplify_vegetation_polygon(coords, tolerance=0.5):
         if len(coords) < 6:
             return coords
 
-        # Douglas-Peucker with looser tolerance for vegetation
-        def dp_simplify(points, epsilon):
-            if len(points) <= 3:
-                return points
-
-            max_dist = 0
-            index = 0
-
-            for i in range(1, len(points) - 1):
-                dist = point_to_line_distance(points[i], points[0], points[-1])
-                if dist > max_dist:
-                    max_dist = dist
-                    index = i
-
-            if max_dist > epsilon:
-                left = dp_simplify(points[:index+1], epsilon)
-                right = dp_simplify(points[index:], epsilon)
-                return left[:-1] + right
-            else:
-                return [points[0], points[-1]]
-
-        simplified = dp_simplify(coords, tolerance)
-
-        # Ensure polygon is closed
-        if len(simplified) > 0 and simplified[0] != simplified[-1]:
-            simplified.append(simplified[0])
-
-        return simplified
+        # Ranges of 3 vertices are kept whole (looser for vegetation)
+        return simplify_coords(coords, tolerance, min_split=3)
 
     except:
         return coords
 
-def point_to_line_distance(point, line_start, line_end):
-    """Calculate distance from point to line segment"""
-    try:
-        x0, y0 = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-
-        num = abs((y2-y1)*x0 - (x2-x1)*y0 + x2*y1 - y2*x1)
-        den = math.sqrt((y2-y1)**2 + (x2-x1)**2)
-
-        if den == 0:
-            return math.sqrt((x0-x1)**2 + (y0-y1)**2)
-
-        return num / den
-
-    except:
-        return 0
-
-def calculate_polygon_area(coords):
-    """Calculate polygon area using shoelace formula"""
-    try:
-        if len(coords) < 4:
-            return 0
-
-        x = [point[0] for point in coords[:-1]]
-        y = [point[1] for point in coords[:-1]]
-
-        return 0.5 * abs(sum(x[i]*y[i+1] - x[i+1]*y[i] for i in range(-1, len(x)-1)))
-
-    except:
-        return 0
-
-def calculate_polygon_perimeter(coords):
-    """Calculate polygon perimeter"""
-    try:
-        if len(coords) < 3:
-            return 0
-
-        perimeter = 0
-        for i in range(len(coords) - 1):
-            x1, y1 = coords[i]
-            x2, y2 = coords[i + 1]
-            perimeter += math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-
-        return perimeter
-
-    except:
-        return 0
-
-def calculate_aspect_ratio(coords):
-    """Calculate aspect ratio of polygon bounding box"""
-    try:
-        if len(coords) < 3:
-            return 1.0
-
-        xs = [point[0] for point in coords]
-        ys = [point[1] for point in coords]
-
-        width = max(xs) - min(xs)
-        height = max(ys) - min(ys)
-
-        if height == 0:
-            return float('inf')
-
-        return max(width, height) / min(width, height)
-
-    except:
-        return 1.0
-
-def has_overlap_with_existing(new_polygon, existing_polygons, threshold=0.1):
+def has_overlap_with_existing(new_polygon, existing_index, threshold=0.1):
     """Check if new polygon overlaps significantly with existing ones"""
     try:
-        for existing in existing_polygons:
-            # Simple bounding box overlap check for performance
-            new_xs = [p[0] for p in new_polygon]
-            new_ys = [p[1] for p in new_polygon]
-            exist_xs = [p[0] for p in existing]
-            exist_ys = [p[1] for p in existing]
-
-            new_bbox = [min(new_xs), min(new_ys), max(new_xs), max(new_ys)]
-            exist_bbox = [min(exist_xs), min(exist_ys), max(exist_xs), max(exist_ys)]
-
-            # Check bounding box overlap
-            if (new_bbox[2] < exist_bbox[0] or new_bbox[0] > exist_bbox[2] or
-                new_bbox[3] < exist_bbox[1] or new_bbox[1] > exist_bbox[3]):
-                continue
-
-            # If bounding boxes overlap, assume overlap (conservative approach)
-            return True
-
-        return False
+        # Grid index lookup, then real intersection area
+        # (more than threshold of the smaller area)
+        return existing_index.overlaps(new_polygon, threshold)
 
     except:
         return False
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 python_vegetation_enhanced.py <chunk_path>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 python_vegetation_enhanced.py <chunk_path> [cluster|raster]")
         print("Examples:")
         print("  python3 python_vegetation_enhanced.py /path/to/chunk_1")
         print("  python3 python_vegetation_enhanced.py /path/to/chunk_1/compressed/filtred_by_classes")
+        print("  python3 python_vegetation_enhanced.py /path/to/chunk_1 raster")
         sys.exit(1)
 
     chunk_path = sys.argv[1]
+    mode = sys.argv[2] if len(sys.argv) == 3 else DEFAULT_AREA_MODE
 
     # Validate path exists
     if not os.path.exists(chunk_path):
         print(f"❌ Path not found: {chunk_path}")
         sys.exit(1)
 
-    result = extract_vegetation_polygons_enhanced(chunk_path)
+    result = extract_vegetation_polygons_enhanced(chunk_path, mode=mode)
 
     if result > 0:
         print(f"\n🎉 Success! Extracted {result} vegetation areas")
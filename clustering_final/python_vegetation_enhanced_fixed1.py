@@ -10,12 +10,19 @@ FIXED Enhanced Vegetation Polygon Extraction
 import sys
 import os
 import json
-import subprocess
 import numpy as np
 import math
 import time
-from scipy.spatial import ConvexHull, cKDTree
-from sklearn.cluster import DBSCAN
+from scipy.spatial import ConvexHull
+from grid_dbscan import dbscan_labels
+from point_cache import load_xyz
+from geometry_metrics import ring_metrics
+from ground_model import ground_height_filter
+from extractor_common import sparse_neighborhood_mask
+from polygon_simplify import simplify_coords
+from polygon_index import PolygonIndex
+from outlier_filter import statistical_outlier_filter
+from voxel_grid import voxel_downsample
 
 def extract_vegetation_polygons_enhanced(chunk_path):
     """
@@ -63,56 +70,10 @@ def extract_vegetation_polygons_enhanced(chunk_path):
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Load vegetation points using PDAL pipeline
+    # Load vegetation points via the columnar cache (LAZ decoded on first run only)
     print(f"[1/6] 📂 Loading vegetation point data...")
     try:
-        # Create temporary text file for points
-        temp_points_file = f"/tmp/vegetation_points_{chunk_name}.txt"
-
-        # PDAL pipeline to extract points as text
-        pipeline = {
-            "pipeline": [
-                {
-                    "type": "readers.las",
-                    "filename": vegetation_laz
-                },
-                {
-                    "type": "writers.text",
-                    "filename": temp_points_file,
-                    "format": "csv",
-                    "order": "X,Y,Z",
-                    "write_header": False
-                }
-            ]
-        }
-
-        # Write pipeline to temporary file
-        temp_pipeline_file = f"/tmp/vegetation_pipeline_{chunk_name}.json"
-        with open(temp_pipeline_file, 'w') as f:
-            json.dump(pipeline, f)
-
-        # Execute PDAL pipeline
-        cmd = ["pdal", "pipeline", temp_pipeline_file]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-
-        # Read points from text file
-        points_3d = []
-        if os.path.exists(temp_points_file):
-            with open(temp_points_file, 'r') as f:
-                for line in f:
-                    try:
-                        parts = line.strip().split(',')
-                        if len(parts) >= 3:
-                            x, y, z = float(parts[0]), float(parts[1]), float(parts[2])
-                            points_3d.append([x, y, z])
-                    except (ValueError, IndexError):
-                        continue
-
-            # Clean up temporary files
-            os.remove(temp_points_file)
-            os.remove(temp_pipeline_file)
-
-        points_3d = np.array(points_3d)
+        points_3d = load_xyz(vegetation_laz)
 
         if len(points_3d) == 0:
             print(f"❌ No vegetation points found")
@@ -123,18 +84,14 @@ def extract_vegetation_polygons_enhanced(chunk_path):
         # Step 1: Voxel grid filtering (reasonable size)
         print(f"\n[2/6] 🔄 Voxel downsampling (0.4m grid)...")
         voxel_size = 0.4  # Balanced voxel size for vegetation
-        voxel_indices = np.floor(points_3d / voxel_size).astype(int)
-        unique_voxels, unique_indices = np.unique(voxel_indices, axis=0, return_index=True)
-        voxel_filtered = points_3d[unique_indices]
+        voxel_filtered = voxel_downsample(points_3d, voxel_size)
         print(f"      ✅ {len(voxel_filtered):,} points after voxel filtering ({100*len(voxel_filtered)/len(points_3d):.1f}% kept)")
 
         # Step 2: Height-based filtering
         print(f"\n[3/6] 🔄 Ground removal (height-based)...")
-        z_values = voxel_filtered[:, 2]
-        height_threshold = np.percentile(z_values, 15)  # Keep upper 85% of points
-        height_mask = z_values > height_threshold
-        height_filtered = voxel_filtered[height_mask]
-        print(f"      ✅ {len(height_filtered):,} points after ground removal (threshold: {height_threshold:.1f}m)")
+        # Chunk DTM clearance (upper 85% of points without ground classes)
+        height_filtered, height_threshold = ground_height_filter(voxel_filtered, classes_base, "8_OtherVegetation", 15)
+        print(f"      ✅ {len(height_filtered):,} points after ground removal (threshold: {height_threshold})")
 
         # Step 3: Statistical outlier removal (less aggressive)
         print(f"\n[4/6] 🔄 Outlier removal (statistical)...")
@@ -144,21 +101,12 @@ def extract_vegetation_polygons_enhanced(chunk_path):
             print(f"❌ Too few points after filtering: {len(points_2d)}")
             return 0
 
-        tree = cKDTree(points_2d)
-        k_neighbors = min(12, len(points_2d) - 1)
-        distances, _ = tree.query(points_2d, k=k_neighbors+1)
-
-        mean_distances = distances[:, 1:].mean(axis=1)
-        mean_dist = np.mean(mean_distances)
-        std_dist = np.std(mean_distances)
-
         # FIXED: Less aggressive outlier threshold (2.5 instead of 1.8)
-        outlier_threshold = mean_dist + 2.5 * std_dist
-        inlier_mask = mean_distances < outlier_threshold
+        inlier_mask, outlier_threshold, index = statistical_outlier_filter(points_2d, "8_OtherVegetation", k_neighbors=12, sigma=2.5)
         clean_points_2d = points_2d[inlier_mask]
 
         print(f"      ✅ {len(clean_points_2d):,} points after outlier removal ({100*len(clean_points_2d)/len(points_2d):.1f}% kept)")
-        print(f"      📊 Mean neighbor distance: {mean_dist:.2f}m, Threshold: {outlier_threshold:.2f}m")
+        print(f"      📊 Mean neighbor distance threshold: {outlier_threshold:.2f}m")
 
         # Step 4: DBSCAN clustering with RELAXED parameters
         print(f"\n[5/6] 🔄 Vegetation area clustering (DBSCAN)...")
@@ -171,8 +119,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
         print(f"          • eps (search radius): {eps}m")
         print(f"          • min_samples: {min_samples}")
 
-        clustering = DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1)
-        labels = clustering.fit_predict(clean_points_2d)
+        labels = dbscan_labels(clean_points_2d, eps, min_samples, class_name="8_OtherVegetation", index=index)
 
         unique_labels = [l for l in set(labels) if l != -1]
         n_clusters = len(unique_labels)
@@ -195,7 +142,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
         print()
 
         vegetation_areas = []
-        vegetation_polygons = []  # To check for overlaps
+        vegetation_polygons = PolygonIndex()  # To check for overlaps
         rejected_stats = {
             'too_small': 0,
             'too_large': 0,
@@ -225,10 +172,11 @@ def extract_vegetation_polygons_enhanced(chunk_path):
                 rejected_stats['invalid_polygon'] += 1
                 continue
 
-            # Calculate metrics
-            area_m2 = calculate_polygon_area(polygon_coords)
-            perimeter_m = calculate_polygon_perimeter(polygon_coords)
-            aspect_ratio = calculate_aspect_ratio(polygon_coords)
+            # Calculate metrics (geometry_metrics kernel, bbox aspect ratio)
+            metrics = ring_metrics(polygon_coords)
+            area_m2 = metrics["area_m2"]
+            perimeter_m = metrics["perimeter_m"]
+            aspect_ratio = metrics["bbox_aspect_ratio"]
 
             # Filter 2: Size filtering (FIXED: wider range)
             if area_m2 < 8:  # FIXED: 8 instead of 10
@@ -254,7 +202,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
                 continue
 
             # Calculate compactness
-            compactness = calculate_compactness(area_m2, perimeter_m)
+            compactness = metrics["compactness"]
 
             # Keep coordinates in UTM format
             utm_coords = []
@@ -286,7 +234,7 @@ def extract_vegetation_polygons_enhanced(chunk_path):
             }
 
             vegetation_areas.append(vegetation_area)
-            vegetation_polygons.append(polygon_coords)
+            vegetation_polygons.add(polygon_coords)
 
             print(f"✅ Vegetation #{len(vegetation_areas)}: {area_m2:.1f}m², {len(cluster_points)} pts, {aspect_ratio:.1f}:1, compact={compactness:.2f}")
 
@@ -368,19 +316,6 @@ def extract_vegetation_polygons_enhanced(chunk_path):
         traceback.print_exc()
         return 0
 
-def calculate_compactness(area, perimeter):
-    """
-    Calculate compactness ratio (how circular the shape is)
-    Compactness = 4π * Area / Perimeter²
-    Perfect circle = 1.0, irregular shapes < 0.5
-    """
-    try:
-        if perimeter > 0:
-            return (4 * math.pi * area) / (perimeter ** 2)
-        return 0
-    except:
-        return 0
-
 def create_vegetation_polygon(points_2d):
     """Create natural vegetation polygon with curved boundaries"""
     try:
@@ -433,24 +368,14 @@ def create_vegetation_concave_hull(points, alpha=5.0):
         if len(points) < 6:
             return None
 
-        # Build k-d tree for efficient neighbor finding
-        tree = cKDTree(points)
-
         # Find boundary points with relaxed alpha for natural vegetation boundaries
-        boundary_points = []
-
-        for i, point in enumerate(points):
-            neighbors = tree.query_ball_point(point, alpha)
-
-            # FIXED: Relaxed boundary detection (10 instead of 8)
-            if len(neighbors) <= 10:
-                boundary_points.append(point)
+        # FIXED: Relaxed boundary detection (10 instead of 8)
+        boundary_points = points[sparse_neighborhood_mask(points, alpha, 10)]
 
         if len(boundary_points) < 6:
             return None
 
         # Create convex hull of boundary points
-        boundary_points = np.array(boundary_points)
         hull = ConvexHull(boundary_points)
 
         # Return hull vertices
@@ -469,124 +394,27 @@ def simplify_vegetation_polygon(coords, tolerance=0.7):
         if len(coords) < 6:
             return coords
 
-        # Douglas-Peucker with looser tolerance for vegetation
-        def dp_simplify(points, epsilon):
-            if len(points) <= 3:
-                return points
-
-            max_dist = 0
-            index = 0
-
-            for i in range(1, len(points) - 1):
-                dist = point_to_line_distance(points[i], points[0], points[-1])
-                if dist > max_dist:
-                    max_dist = dist
-                    index = i
-
-            if max_dist > epsilon:
-                left = dp_simplify(points[:index+1], epsilon)
-                right = dp_simplify(points[index:], epsilon)
-                return left[:-1] + right
-            else:
-                return [points[0], points[-1]]
-
-        simplified = dp_simplify(coords, tolerance)
-
-        # Ensure polygon is closed
-        if len(simplified) > 0 and simplified[0] != simplified[-1]:
-            simplified.append(simplified[0])
-
-        return simplified
+        # Ranges of 3 vertices are kept whole (looser for vegetation)
+        return simplify_coords(coords, tolerance, min_split=3)
 
     except:
         return coords
 
-def point_to_line_distance(point, line_start, line_end):
-    """Calculate distance from point to line segment"""
-    try:
-        x0, y0 = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-
-        num = abs((y2-y1)*x0 - (x2-x1)*y0 + x2*y1 - y2*x1)
-        den = math.sqrt((y2-y1)**2 + (x2-x1)**2)
-
-        if den == 0:
-            return math.sqrt((x0-x1)**2 + (y0-y1)**2)
-
-        return num / den
-
-    except:
-        return 0
-
-def calculate_polygon_area(coords):
-    """Calculate polygon area using shoelace formula"""
-    try:
-        if len(coords) < 4:
-            return 0
-
-        x = [point[0] for point in coords[:-1]]
-        y = [point[1] for point in coords[:-1]]
-
-        return 0.5 * abs(sum(x[i]*y[i+1] - x[i+1]*y[i] for i in range(-1, len(x)-1)))
-
-    except:
-        return 0
-
-def calculate_polygon_perimeter(coords):
-    """Calculate polygon perimeter"""
-    try:
-        if len(coords) < 3:
-            return 0
-
-        perimeter = 0
-        for i in range(len(coords) - 1):
-            x1, y1 = coords[i]
-            x2, y2 = coords[i + 1]
-            perimeter += math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-
-        return perimeter
-
-    except:
-        return 0
-
-def calculate_aspect_ratio(coords):
-    """Calculate aspect ratio of polygon bounding box"""
-    try:
-        if len(coords) < 3:
-            return 1.0
-
-        xs = [point[0] for point in coords]
-        ys = [point[1] for point in coords]
-
-        width = max(xs) - min(xs)
-        height = max(ys) - min(ys)
-
-        if height == 0:
-            return float('inf')
-
-        return max(width, height) / min(width, height)
-
-    except:
-        return 1.0
-
-def has_overlap_with_existing(new_polygon, existing_polygons, min_distance=5.0):
+def has_overlap_with_existing(new_polygon, existing_index, min_distance=5.0):
     """
     Check if new polygon overlaps significantly with existing ones
     FIXED: Using 5m minimum distance and center-based check instead of bounding box
     """
     try:
-        for existing in existing_polygons:
-            # Calculate centers
-            new_xs = [p[0] for p in new_polygon]
-            new_ys = [p[1] for p in new_polygon]
-            exist_xs = [p[0] for p in existing]
-            exist_ys = [p[1] for p in existing]
-
-            new_center_x = sum(new_xs) / len(new_xs)
-            new_center_y = sum(new_ys) / len(new_ys)
-            exist_center_x = sum(exist_xs) / len(exist_xs)
-            exist_center_y = sum(exist_ys) / len(exist_ys)
+        # Calculate centers
+        new_center_x, new_center_y = np.mean(np.asarray(new_polygon, dtype=np.float64)[:, :2], axis=0)
+
+        # A center within min_distance lies inside the polygon's bounding box,
+        # so only bounding boxes near the new center can match (grid index lookup)
+        search_box = (new_center_x - min_distance, new_center_y - min_distance,
+                      new_center_x + min_distance, new_center_y + min_distance)
+        for polygon_id in existing_index.candidates(search_box):
+            exist_center_x, exist_center_y = np.mean(np.asarray(existing_index.coords[polygon_id], dtype=np.float64)[:, :2], axis=0)
 
             # Calculate center distance
             distance = math.sqrt((new_center_x - exist_center_x)**2 +
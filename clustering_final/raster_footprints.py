@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Raster Footprint Extraction
+Building footprints from an XY occupancy grid instead of DBSCAN + concave hull
+
+1. Cleaned XY points are binned into a 0.25-0.5m occupancy grid (one pass)
+2. Morphological closing fills gaps between scan lines and small holes,
+   opening removes thin attachments (fences, vegetation fringes)
+3. Connected components of the grid are the footprint candidates
+4. Each component's cell boundary is traced into rings (polygon_rings) and
+   staircase corners are simplified with Douglas-Peucker
+
+Every step is linear in the number of points or grid cells, and memory is
+bounded by the grid extent, not by the point density.
+"""
+
+import numpy as np
+from scipy import ndimage
+from polygon_rings import edges_to_rings, rings_to_polygons
+from polygon_simplify import simplify_coords
+
+# Grid cell size in meters (0.25-0.5m)
+RASTER_CELL_SIZE = 0.25
+
+# Morphology (iterations of a 3x3 square element, in cells)
+RASTER_CLOSE_ITERATIONS = 4
+RASTER_OPEN_ITERATIONS = 2
+
+# Components with fewer occupied input points are dropped
+RASTER_MIN_POINTS = 100
+
+# Douglas-Peucker tolerance for the traced cell staircase (m)
+RASTER_SIMPLIFY_TOLERANCE = 0.5
+
+# Structuring element: 8-neighborhood keeps rectangular corners square
+SQUARE = np.ones((3, 3), dtype=bool)
+
+def occupancy_grid(points_2d, cell_size=RASTER_CELL_SIZE, margin=0):
+    """
+    Boolean occupancy grid of XY points
+
+    Args:
+        points_2d: (N, 2) coordinates
+        cell_size: Grid cell size (m)
+        margin: Empty cells added on every side (room for morphology)
+
+    Returns:
+        occupied: (rows, cols) bool grid, row = y, col = x
+        origin: (x, y) of the lower-left grid corner
+        cells: (N, 2) row/col of every point
+    """
+    origin = np.floor(points_2d.min(axis=0) / cell_size) * cell_size - margin * cell_size
+    cells = np.floor((points_2d - origin) / cell_size).astype(np.int64)
+    cols, rows = cells.max(axis=0) + 1 + margin
+
+    occupied = np.zeros((rows, cols), dtype=bool)
+    occupied[cells[:, 1], cells[:, 0]] = True
+    return occupied, origin, cells[:, ::-1]
+
+def clean_occupancy(occupied, close_iterations=RASTER_CLOSE_ITERATIONS,
+                    open_iterations=RASTER_OPEN_ITERATIONS):
+    """Morphological close (fill gaps) then open (cut thin parts)"""
+    if close_iterations > 0:
+        occupied = ndimage.binary_closing(occupied, structure=SQUARE, iterations=close_iterations)
+    if open_iterations > 0:
+        occupied = ndimage.binary_opening(occupied, structure=SQUARE, iterations=open_iterations)
+    return occupied
+
+def cell_boundary_edges(mask):
+    """
+    Directed grid-line edges between occupied and empty cells
+
+    Corner (r, c) of the grid has vertex id r * (cols + 1) + c. Edges run
+    counter-clockwise around occupied cells, so the interior is on their left.
+
+    Returns:
+        edges: (E, 2) directed vertex ids
+    """
+    rows, cols = mask.shape
+    padded = np.pad(mask, 1)
+    width = cols + 1
+
+    def vertex(r, c):
+        return r * width + c
+
+    edges = []
+    r, c = np.nonzero(mask & ~padded[:-2, 1:-1])   # Empty below: bottom edge, left to right
+    edges.append(np.column_stack((vertex(r, c), vertex(r, c + 1))))
+    r, c = np.nonzero(mask & ~padded[1:-1, 2:])    # Empty right: right edge, upwards
+    edges.append(np.column_stack((vertex(r, c + 1), vertex(r + 1, c + 1))))
+    r, c = np.nonzero(mask & ~padded[2:, 1:-1])    # Empty above: top edge, right to left
+    edges.append(np.column_stack((vertex(r + 1, c + 1), vertex(r + 1, c))))
+    r, c = np.nonzero(mask & ~padded[1:-1, :-2])   # Empty left: left edge, downwards
+    edges.append(np.column_stack((vertex(r + 1, c), vertex(r, c))))
+    return np.concatenate(edges)
+
+def drop_collinear(ring_coords):
+    """Remove ring vertices lying on a straight run of grid edges"""
+    previous = np.roll(ring_coords, 1, axis=0)
+    following = np.roll(ring_coords, -1, axis=0)
+    cross = ((ring_coords[:, 0] - previous[:, 0]) * (following[:, 1] - ring_coords[:, 1]) -
+             (ring_coords[:, 1] - previous[:, 1]) * (following[:, 0] - ring_coords[:, 0]))
+    return ring_coords[cross != 0]
+
+def trace_component(mask, origin, cell_size, tolerance=RASTER_SIMPLIFY_TOLERANCE):
+    """
+    Outer boundary of one component mask as a closed coordinate list
+
+    Args:
+        mask: Bool grid of a single component (any window of the full grid)
+        origin: (x, y) of the window's lower-left corner
+        cell_size: Grid cell size (m)
+        tolerance: Douglas-Peucker tolerance (m)
+
+    Returns:
+        coords: [[x, y], ...] closed ring of the largest polygon, or None
+    """
+    edges = cell_boundary_edges(mask)
+    if len(edges) == 0:
+        return None
+
+    width = mask.shape[1] + 1
+    vertex_ids = np.arange((mask.shape[0] + 1) * width)
+    corners = np.column_stack((vertex_ids % width, vertex_ids // width)) * cell_size + origin
+
+    rings = [ring for ring in edges_to_rings(edges) if len(ring) >= 4]
+    polygons = rings_to_polygons(corners, rings)
+    if not polygons:
+        return None
+
+    exterior = np.asarray(polygons[0].exterior.coords)[:-1]
+    exterior = drop_collinear(exterior)
+    if len(exterior) < 3:
+        return None
+
+    ring = np.vstack((exterior, exterior[:1])).tolist()
+    simplified = simplify_coords(ring, tolerance)
+    return simplified if len(simplified) >= 4 else ring
+
+def raster_footprints(points_2d, cell_size=RASTER_CELL_SIZE,
+                      close_iterations=RASTER_CLOSE_ITERATIONS,
+                      open_iterations=RASTER_OPEN_ITERATIONS,
+                      min_points=RASTER_MIN_POINTS):
+    """
+    Footprint polygons of all building components in a point set
+
+    Args:
+        points_2d: (N, 2) cleaned XY points
+        cell_size: Grid cell size (m)
+        close_iterations: Closing iterations (cells)
+        open_iterations: Opening iterations (cells)
+        min_points: Minimum input points per component
+
+    Returns:
+        footprints: list of (coords, point_count), largest component first
+    """
+    points_2d = np.asarray(points_2d, dtype=np.float64)[:, :2]
+    if len(points_2d) == 0:
+        return []
+
+    margin = close_iterations + 1
+    occupied, origin, cells = occupancy_grid(points_2d, cell_size, margin)
+    occupied = clean_occupancy(occupied, close_iterations, open_iterations)
+
+    labels, n_components = ndimage.label(occupied, structure=SQUARE)
+    if n_components == 0:
+        return []
+
+    # Input points per component (points on cells removed by opening count for none)
+    point_counts = np.bincount(labels[cells[:, 0], cells[:, 1]], minlength=n_components + 1)
+
+    footprints = []
+    for component, window in enumerate(ndimage.find_objects(labels), start=1):
+        if window is None or point_counts[component] < min_points:
+            continue
+        mask = labels[window] == component
+        window_origin = origin + np.array([window[1].start, window[0].start]) * cell_size
+        coords = trace_component(mask, window_origin, cell_size)
+        if coords is not None:
+            footprints.append((coords, int(point_counts[component])))
+
+    footprints.sort(key=lambda item: item[1], reverse=True)
+    return footprints
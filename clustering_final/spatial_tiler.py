@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Spatial Tiler
+Stage 1 tiling on a fixed XY grid with overlap buffers
+Replaces filters.divider chunks (split by point order, so chunk extents
+overlap and objects are cut wherever the point count runs out)
+
+1. Grid from the header bounds, snapped to multiples of the tile size
+   (tile (row, col) core = [x0 + col·size, x0 + (col+1)·size) × same in Y)
+2. Stream the input once; every point goes to the tile owning it (core) and
+   to the neighbor tiles whose buffer margin it falls in
+3. Raw point records of each tile are appended to a temporary file during
+   the pass, then all tiles are compressed to LAZ in parallel
+4. Tiles without core points are dropped, the others are written as
+   spatial_segment_N.laz (row-major order) with their core and buffer
+   extents in manifest.json
+
+An object is complete in every tile whose buffer contains it, and exactly
+one tile owns its centroid: the extractors and Stage 3 keep only objects
+whose centroid falls in their tile's core (keep_owned_features,
+keep_owned_centroids), which removes cross-tile duplicates by construction.
+
+Usage:
+    python3 spatial_tiler.py <input.laz> <output_dir> [--tile-size M] [--buffer M] [--workers N]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from las_reader import READ_BATCH_SIZE
+
+# Tile edge length (m)
+TILE_SIZE = 250.0
+# Overlap margin around each tile core (m); objects up to this size crossing
+# a tile edge are complete in the tile owning their centroid
+TILE_BUFFER = 25.0
+
+MANIFEST_NAME = "manifest.json"
+SEGMENT_PATTERN = "spatial_segment_*.laz"
+
+def tile_grid(min_x, min_y, max_x, max_y, tile_size=TILE_SIZE):
+    """
+    Grid covering the bounds
+
+    Returns:
+        origin: (x0, y0) snapped to multiples of tile_size
+        shape: (rows, cols)
+    """
+    x0 = np.floor(min_x / tile_size) * tile_size
+    y0 = np.floor(min_y / tile_size) * tile_size
+    cols = max(int(np.floor((max_x - x0) / tile_size)) + 1, 1)
+    rows = max(int(np.floor((max_y - y0) / tile_size)) + 1, 1)
+    return (float(x0), float(y0)), (rows, cols)
+
+def tile_memberships(x, y, origin, shape, tile_size=TILE_SIZE, buffer=TILE_BUFFER):
+    """
+    Tiles each point belongs to (its core tile and buffer neighbors)
+
+    Returns:
+        point_index: (M,) point of every membership
+        tile_id: (M,) row * cols + col
+        core: (M,) bool, True for the tile owning the point
+    """
+    rows, cols = shape
+    dx = np.asarray(x, dtype=np.float64) - origin[0]
+    dy = np.asarray(y, dtype=np.float64) - origin[1]
+    col = np.clip(np.floor(dx / tile_size).astype(np.int64), 0, cols - 1)
+    row = np.clip(np.floor(dy / tile_size).astype(np.int64), 0, rows - 1)
+    local_x = dx - col * tile_size
+    local_y = dy - row * tile_size
+
+    # Neighbor d's buffer holds the point when it is within buffer of the shared edge
+    near = {
+        (-1, "x"): local_x < buffer, (1, "x"): local_x >= tile_size - buffer,
+        (-1, "y"): local_y < buffer, (1, "y"): local_y >= tile_size - buffer,
+    }
+    index = np.arange(len(dx))
+    point_index, tile_id, core = [], [], []
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            mask = np.ones(len(dx), dtype=bool)
+            if dc:
+                mask &= near[(dc, "x")] & (col + dc >= 0) & (col + dc < cols)
+            if dr:
+                mask &= near[(dr, "y")] & (row + dr >= 0) & (row + dr < rows)
+            point_index.append(index[mask])
+            tile_id.append((row[mask] + dr) * cols + col[mask] + dc)
+            core.append(np.full(np.count_nonzero(mask), dr == 0 and dc == 0))
+
+    return np.concatenate(point_index), np.concatenate(tile_id), np.concatenate(core)
+
+def tile_extents(tile_id, origin, shape, tile_size=TILE_SIZE, buffer=TILE_BUFFER):
+    """Core and buffer extents [min_x, min_y, max_x, max_y] of a tile"""
+    row, col = divmod(int(tile_id), shape[1])
+    core = [origin[0] + col * tile_size, origin[1] + row * tile_size,
+            origin[0] + (col + 1) * tile_size, origin[1] + (row + 1) * tile_size]
+    return row, col, core, [core[0] - buffer, core[1] - buffer, core[2] + buffer, core[3] + buffer]
+
+def _compress_tile(input_file, raw_file, output_file):
+    """Raw point records of one tile → LAZ (in a worker process)"""
+    import laspy
+
+    with laspy.open(input_file) as reader:
+        header = reader.header
+    records = np.memmap(raw_file, mode='r', dtype=header.point_format.dtype())
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    # One single-threaded encoder per process, the pool is the parallelism
+    with laspy.open(temp_file, mode='w', header=header, do_compress=True,
+                    laz_backend=laspy.LazBackend.Lazrs) as writer:
+        for start in range(0, len(records), READ_BATCH_SIZE):
+            batch = np.array(records[start:start + READ_BATCH_SIZE])
+            writer.write_points(laspy.PackedPointRecord(batch, header.point_format))
+    del records
+    os.replace(temp_file, output_file)
+    os.remove(raw_file)
+    return output_file
+
+def tile_point_cloud(input_file, output_dir, tile_size=TILE_SIZE, buffer=TILE_BUFFER, max_workers=None):
+    """
+    Split a point cloud into buffered XY tiles
+
+    Args:
+        input_file: Source LAS/LAZ
+        output_dir: Destination of spatial_segment_N.laz and manifest.json
+        tile_size: Tile edge length (m)
+        buffer: Overlap margin around each core (m), below tile_size / 2
+        max_workers: Compression processes (default: CPU count)
+
+    Returns:
+        manifest: dict written to <output_dir>/manifest.json
+    """
+    import laspy
+
+    if not laspy.LazBackend.detect_available():
+        raise ImportError("laspy is installed without a LAZ backend (pip install laspy[lazrs])")
+    if not 0 <= buffer < tile_size / 2:
+        raise ValueError(f"Buffer must be in [0, tile_size / 2): {buffer} (tile size {tile_size})")
+
+    os.makedirs(output_dir, exist_ok=True)
+    raw_dir = os.path.join(output_dir, ".tiles_raw")
+    os.makedirs(raw_dir, exist_ok=True)
+
+    points = {}
+    core_points = {}
+    with laspy.open(input_file) as reader:
+        header = reader.header
+        origin, shape = tile_grid(header.mins[0], header.mins[1], header.maxs[0], header.maxs[1], tile_size)
+        print(f"📐 Grid: {shape[0]} x {shape[1]} tiles of {tile_size:g}m, buffer {buffer:g}m")
+
+        # Single pass: route every point to its tiles
+        for chunk in reader.chunk_iterator(READ_BATCH_SIZE):
+            point_index, tile_id, core = tile_memberships(chunk.x, chunk.y, origin, shape, tile_size, buffer)
+            order = np.argsort(tile_id, kind='stable')
+            ids, starts = np.unique(tile_id[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            records = chunk.array
+            for tile, start, end in zip(ids.tolist(), starts, ends):
+                members = order[start:end]
+                with open(os.path.join(raw_dir, f"{tile}.raw"), 'ab') as f:
+                    f.write(records[np.sort(point_index[members])].tobytes())
+                points[tile] = points.get(tile, 0) + len(members)
+                core_points[tile] = core_points.get(tile, 0) + int(np.count_nonzero(core[members]))
+
+    # Tiles owning no point only hold buffer copies of their neighbors' points
+    tiles = sorted(t for t in points if core_points[t] > 0)
+    for tile in set(points) - set(tiles):
+        os.remove(os.path.join(raw_dir, f"{tile}.raw"))
+
+    entries = []
+    for number, tile in enumerate(tiles, start=1):
+        row, col, core, buffered = tile_extents(tile, origin, shape, tile_size, buffer)
+        entries.append({
+            "chunk": f"chunk_{number}",
+            "file": f"spatial_segment_{number}.laz",
+            "row": row,
+            "col": col,
+            "core": core,
+            "buffer": buffered,
+            "core_points": core_points[tile],
+            "points": points[tile],
+        })
+
+    # Stale segments of an earlier run would be picked up as chunks
+    for stale in set(glob.glob(os.path.join(output_dir, SEGMENT_PATTERN))) - \
+            {os.path.join(output_dir, e["file"]) for e in entries}:
+        os.remove(stale)
+
+    print(f"🔄 Compressing {len(entries)} tiles in parallel...")
+    # Spawned workers: forking after the parallel LAZ decoder ran can deadlock
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_compress_tile, input_file, os.path.join(raw_dir, f"{tile}.raw"),
+                                   os.path.join(output_dir, entry["file"]))
+                   for tile, entry in zip(tiles, entries)]
+        for future in futures:
+            future.result()
+    os.rmdir(raw_dir)
+
+    manifest = {
+        "mode": "tiles",
+        "input": os.path.abspath(input_file),
+        "tile_size": tile_size,
+        "buffer": buffer,
+        "origin": list(origin),
+        "grid_shape": list(shape),
+        "total_points": int(header.point_count),
+        "tiles": entries,
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_tile_cores(chunks_dir):
+    """
+    Core extent of every chunk of a tiled dataset
+
+    Returns:
+        {chunk name: [min_x, min_y, max_x, max_y]}, empty when the chunks
+        were not produced by the tiler
+    """
+    try:
+        with open(os.path.join(chunks_dir, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("mode") != "tiles":
+        return {}
+    return {entry["chunk"]: entry["core"] for entry in manifest.get("tiles", [])}
+
+def in_tile_core(xy, core):
+    """(N,) bool, points inside a half-open core extent [min, max)"""
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    return ((xy[:, 0] >= core[0]) & (xy[:, 0] < core[2]) &
+            (xy[:, 1] >= core[1]) & (xy[:, 1] < core[3]))
+
+def chunk_tile_core(classes_base):
+    """
+    Core extent of the tile a chunk was cut from
+
+    Args:
+        classes_base: <chunks_dir>/chunk_N/compressed/filtred_by_classes
+
+    Returns:
+        [min_x, min_y, max_x, max_y], or None when the chunk is not a tile
+    """
+    chunk_dir = os.path.dirname(os.path.dirname(os.path.abspath(classes_base)))
+    return load_tile_cores(os.path.dirname(chunk_dir)).get(os.path.basename(chunk_dir))
+
+def feature_centroid(feature):
+    """XY centroid of a GeoJSON feature's geometry"""
+    from shapely.geometry import shape
+
+    point = shape(feature["geometry"]).centroid
+    return (point.x, point.y)
+
+def keep_owned(items, xy_of, classes_base):
+    """
+    Objects of a tiled chunk whose centroid lies in the tile core (the others
+    are buffer copies of objects owned by a neighbor tile)
+
+    Args:
+        items: Objects extracted from the chunk
+        xy_of: Function returning the (x, y) centroid of an object
+        classes_base: filtred_by_classes directory of the chunk
+
+    Returns:
+        (kept objects, number dropped); unchanged for untiled chunks
+    """
+    core = chunk_tile_core(classes_base)
+    if core is None or not items:
+        return items, 0
+    keep = in_tile_core([xy_of(item) for item in items], core)
+    return [item for item, k in zip(items, keep) if k], int(np.count_nonzero(~keep))
+
+def keep_owned_features(features, classes_base):
+    """keep_owned for GeoJSON features"""
+    return keep_owned(features, feature_centroid, classes_base)
+
+def keep_owned_centroids(centroids, classes_base):
+    """keep_owned for Stage 3 centroid records"""
+    return keep_owned(centroids, lambda c: (c["centroid_x"], c["centroid_y"]), classes_base)
+
+def main():
+    args = sys.argv[1:]
+    options = {"--tile-size": TILE_SIZE, "--buffer": TILE_BUFFER, "--workers": None}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            if index + 1 >= len(args):
+                args = []
+                break
+            options[option] = float(args[index + 1]) if option != "--workers" else int(args[index + 1])
+            del args[index:index + 2]
+
+    if len(args) != 2:
+        print("Usage: python3 spatial_tiler.py <input.laz> <output_dir> [--tile-size M] [--buffer M] [--workers N]")
+        print("Examples:")
+        print("  python3 spatial_tiler.py cloud_point_part_1.laz out/chunks")
+        print("  python3 spatial_tiler.py cloud_point_part_1.laz out/chunks --tile-size 500 --buffer 40")
+        sys.exit(1)
+
+    input_file, output_dir = args
+    if not os.path.exists(input_file):
+        print(f"❌ Input file not found: {input_file}")
+        sys.exit(1)
+
+    start = time.time()
+    print(f"🔄 Tiling {os.path.basename(input_file)}...")
+    try:
+        manifest = tile_point_cloud(input_file, output_dir, options["--tile-size"], options["--buffer"],
+                                    options["--workers"])
+    except Exception as e:
+        print(f"❌ Tiling failed: {e}")
+        sys.exit(1)
+
+    tiles = manifest["tiles"]
+    for entry in tiles:
+        print(f"    ✓ {entry['file']}: tile ({entry['row']}, {entry['col']}), "
+              f"{entry['core_points']:,} core + {entry['points'] - entry['core_points']:,} buffer points")
+    core_total = sum(entry["core_points"] for entry in tiles)
+    print(f"📊 {len(tiles)} tiles, {core_total:,}/{manifest['total_points']:,} points owned "
+          f"({sum(entry['points'] for entry in tiles) / max(core_total, 1):.2f}x with buffers)")
+    print(f"📁 Manifest: {os.path.join(output_dir, MANIFEST_NAME)}")
+    print(f"⏱️  {time.time() - start:.1f}s")
+    sys.exit(0 if tiles and core_total == manifest["total_points"] else 1)
+
+if __name__ == "__main__":
+    main()
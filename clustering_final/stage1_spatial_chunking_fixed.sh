@@ -35,8 +35,14 @@ log() {
 }
 
 BASE_DIR="/home/prodair/Desktop/MORIUS5090/clustering/clustering_final"
-INPUT_FILE="/home/prodair/Desktop/MORIUS5090/clustering/datasetclasified/berkane-classifier-mobile-mapping-flainet/berkane_-_classifier_-_mobile_mapping_flainet/cloud_point_part_1.laz"
-OUTPUT_DIR="$BASE_DIR/out"
+SCRIPT_DIR=$(dirname "$(realpath "$0")")
+# Optional arguments: <input_laz> [output_dir] [divider|tiles] (used by pipeline_orchestrator.py)
+INPUT_FILE="${1:-/home/prodair/Desktop/MORIUS5090/clustering/datasetclasified/berkane-classifier-mobile-mapping-flainet/berkane_-_classifier_-_mobile_mapping_flainet/cloud_point_part_1.laz}"
+OUTPUT_DIR="${2:-$BASE_DIR/out}"
+CHUNK_MODE="${3:-divider}"
+# Tiles mode: XY tile edge and overlap buffer in meters (spatial_tiler.py)
+TILE_SIZE="${TILE_SIZE:-250}"
+TILE_BUFFER="${TILE_BUFFER:-25}"
 
 log "HEADER" "STAGE 1: FIXED SPATIAL CHUNKING"
 log "INFO" "Input file: $(basename "$INPUT_FILE")"
@@ -44,10 +50,31 @@ log "INFO" "Method: Dynamic bounds detection with careful spatial chunking"
 log "INFO" "Goal: Preserve ALL points including TreeTrunks (class 40)"
 echo
 
-# Setup
-rm -rf "$OUTPUT_DIR"
+# Setup (only the chunks: the output directory also holds the orchestrator's manifest, logs and cache)
+rm -rf "$OUTPUT_DIR/chunks"
 mkdir -p "$OUTPUT_DIR/chunks"
 
+# ==============================================================================
+# SPATIAL TILING MODE (XY GRID WITH OVERLAP BUFFERS)
+# ==============================================================================
+
+if [[ "$CHUNK_MODE" == "tiles" ]]; then
+    log "HEADER" "SPATIAL TILING (${TILE_SIZE}m TILES, ${TILE_BUFFER}m BUFFER)"
+    log "INFO" "Single read, tiles compressed in parallel, extents in chunks/manifest.json"
+
+    if python3 "$SCRIPT_DIR/spatial_tiler.py" "$INPUT_FILE" "$OUTPUT_DIR/chunks" \
+            --tile-size "$TILE_SIZE" --buffer "$TILE_BUFFER"; then
+        echo
+        log "SUCCESS" "🎉 SPATIAL TILING COMPLETED!"
+        log "INFO" "📁 Output: $OUTPUT_DIR/chunks/"
+        log "INFO" "🔄 NEXT STEP: Run Stage 2 class filtering"
+        exit 0
+    else
+        log "ERROR" "❌ Spatial tiling failed"
+        exit 1
+    fi
+fi
+
 # ==============================================================================
 # DYNAMIC BOUNDS DETECTION
 # ==============================================================================
@@ -28,30 +28,8 @@
 
 set -uo pipefail  # Removed -e to prevent early exit on minor errors
 
-# Class definitions for mobile mapping data (from production script)
-declare -A CLASS_NAMES=(
-    [1]="1_Other"
-    [2]="2_Roads"
-    [3]="3_Sidewalks"
-    [4]="4_OtherGround"
-    [5]="5_TrafficIslands"
-    [6]="6_Buildings"
-    [7]="7_Trees"
-    [8]="8_OtherVegetation"
-    [9]="9_TrafficLights"
-    [10]="10_TrafficSigns"
-    [11]="11_Wires"
-    [12]="12_Masts"
-    [13]="13_Pedestrians"
-    [15]="15_2Wheel"
-    [16]="16_Mobile4w"
-    [17]="17_Stationary4w"
-    [18]="18_Noise"
-    [19]="19_Pedestrian"
-    [40]="40_TreeTrunks"
-    [64]="64_Wire_Guard"
-    [65]="65_Wire_Conductor"
-)
+# Class definitions for mobile mapping data: CLASS_NAMES in class_splitter.py
+SCRIPT_DIR=$(dirname "$(realpath "$0")")
 
 # Classes to skip - NONE! This is filtering stage, not clustering
 SKIP_CLASSES=""  # Process ALL classes in filtering stage
@@ -94,123 +72,42 @@ echo "Processing chunk: $CHUNK_BASENAME"
 echo "Output: $CLASS_OUTPUT_DIR"
 echo ""
 
-# Get available classes in this chunk (using production method)
-echo "  Analyzing available classes..."
-AVAILABLE_CLASSES=$(pdal info "$INPUT_FILE" --metadata 2>/dev/null | python3 -c "
-import json, sys
-try:
-    data = json.load(sys.stdin)
-    # Use full mobile mapping classes as in previous successful run
-    print('1 2 3 4 5 6 7 8 9 10 11 12 13 15 16 17 18 40')  # All mobile mapping classes
-except:
-    print('1 2 3 4 5 6 7 8 9 10 11 12 13 15 16 17 18 40')
-" || echo '1 2 3 4 5 6 7 8 9 10 11 12 13 15 16 17 18 40')
-
-echo "  Classes to process: $AVAILABLE_CLASSES"
-echo ""
+# Single pass: the chunk is read once and every point routed to the LAZ
+# writer of its class; counts and bounds are computed during the pass
+# (class_split.json), instead of one filters.range pipeline per class
+echo "  Splitting classes (single read of the chunk)..."
+python3 "$SCRIPT_DIR/class_splitter.py" "$INPUT_FILE" "$CLASS_OUTPUT_DIR"
+split_status=$?
 
+SPLIT_SUMMARY="$CLASS_OUTPUT_DIR/class_split.json"
 successful_extractions=0
-empty_classes=0
 total_points_extracted=0
-
-# Extract each class (same method as production)
-for CLASS_CODE in $AVAILABLE_CLASSES; do
-    # Process ALL classes - no skipping in filtering stage
-
-    CLASS_NAME=${CLASS_NAMES[$CLASS_CODE]:-"${CLASS_CODE}_Unknown"}
-    CLASS_DIR="$CLASS_OUTPUT_DIR/$CLASS_NAME"
-    mkdir -p "$CLASS_DIR"
-
-    CLASS_FILE="$CLASS_DIR/${CLASS_NAME}.laz"
-
-    echo "    Extracting class $CLASS_CODE ($CLASS_NAME)..."
-
-    # Create PDAL pipeline for class extraction (exact same as production)
-    TEMP_PIPELINE="/tmp/temp_${CHUNK_BASENAME}_${CLASS_CODE}_$$.json"
-    cat > "$TEMP_PIPELINE" << EOF
-[
-    {
-        "type": "readers.las",
-        "filename": "$INPUT_FILE"
-    },
-    {
-        "type": "filters.range",
-        "limits": "Classification[$CLASS_CODE:$CLASS_CODE]"
-    },
-    {
-        "type": "writers.las",
-        "filename": "$CLASS_FILE",
-        "compression": "laszip"
-    }
-]
-EOF
-
-    # Execute extraction
-    if pdal pipeline "$TEMP_PIPELINE" 2>/dev/null; then
-        # Check if file has points (same method as production)
-        POINT_COUNT=$(pdal info "$CLASS_FILE" --summary 2>/dev/null | python3 -c "
+if [[ $split_status -eq 0 && -f "$SPLIT_SUMMARY" ]]; then
+    read -r successful_extractions total_points_extracted < <(python3 -c "
 import json, sys
-try:
-    data = json.load(sys.stdin)
-    print(data['summary']['num_points'])
-except:
-    print('0')
-" || echo "0")
-
-        if [[ "$POINT_COUNT" -gt 0 ]]; then
-            echo "      ✓ Extracted: $(printf "%'d" $POINT_COUNT) points"
-            total_points_extracted=$((total_points_extracted + POINT_COUNT))
-            ((successful_extractions++))
-        else
-            echo "      - No points found, removing empty file"
-            rm -f "$CLASS_FILE"
-            rmdir "$CLASS_DIR" 2>/dev/null || true
-            ((empty_classes++))
-        fi
-    else
-        echo "      ✗ Failed to extract class $CLASS_NAME"
-        rm -f "$CLASS_FILE"
-        rmdir "$CLASS_DIR" 2>/dev/null || true
-        ((empty_classes++))
-    fi
-
-    # Cleanup temp pipeline
-    rm -f "$TEMP_PIPELINE"
-done
+data = json.load(open(sys.argv[1]))
+print(len(data['classes']), data['total_points'])
+" "$SPLIT_SUMMARY" 2>/dev/null || echo "0 0")
+fi
 
 echo ""
 echo "=== CLASS EXTRACTION COMPLETE ==="
 echo ""
 echo "📊 SUMMARY:"
 echo "  Successful extractions: $successful_extractions"
-echo "  Empty classes: $empty_classes"
 echo "  Total points extracted: $(printf "%'d" $total_points_extracted)"
 echo ""
 
 if [[ $successful_extractions -gt 0 ]]; then
     echo "✅ CLASSES EXTRACTED:"
-    for class_dir in "$CLASS_OUTPUT_DIR"/*/; do
-        if [[ -d "$class_dir" ]]; then
-            class_name=$(basename "$class_dir")
-            class_file="$class_dir/${class_name}.laz"
-
-            if [[ -f "$class_file" ]]; then
-                # Get point count using production method
-                point_count=$(pdal info "$class_file" --summary 2>/dev/null | python3 -c "
-import json, sys
-try:
-    data = json.load(sys.stdin)
-    print(data['summary']['num_points'])
-except:
-    print('0')
-" || echo "0")
-
-                file_size=$(ls -lh "$class_file" | awk '{print $5}')
-                echo "  $class_name: $file_size ($(printf "%'d" $point_count) points)"
-            fi
-        fi
-    done
-
+    # Point counts from the split summary (no re-read of the class files)
+    python3 -c "
+import os, json, sys
+data = json.load(open(sys.argv[1]))
+for name, entry in data['classes'].items():
+    size = os.path.getsize(os.path.join(os.path.dirname(sys.argv[1]), entry['file']))
+    print(f'  {name}: {size / 1024 / 1024:.1f}M ({entry[\"count\"]:,} points)')
+" "$SPLIT_SUMMARY"
     echo ""
     echo "🎉 SUCCESS! Class extraction completed"
     echo "📁 Output: $CLASS_OUTPUT_DIR"
@@ -221,8 +118,7 @@ else
     echo "❌ No classes were extracted successfully"
     echo "Possible causes:"
     echo "  - Input file might not have the expected classification codes"
-    echo "  - All classes might be in the skip list"
-    echo "  - PDAL pipeline issues"
+    echo "  - Class splitter failed (see output above)"
     exit 1
 fi
 
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Stage 3 Centroid Computation
+Turns the PDAL filters.cluster CSV (X,Y,Z,ClusterID) into the dashboard
+centroids JSON used by stage3_lightweight_clustering.sh
+
+- Points loaded as arrays in one pass (no per-row dict parsing)
+- Centroid, bounding box, z-range and point count per cluster computed with
+  np.bincount / np.minimum.reduceat in a single grouped pass
+- Prints a one-line summary for the shell, so the JSON is never re-parsed
+"""
+
+import os
+import sys
+import json
+import numpy as np
+from spatial_tiler import keep_owned_centroids
+
+def load_clustered_points(csv_path):
+    """
+    Load a writers.text CSV into (N, 3) coordinates and (N,) cluster ids
+
+    Column order is taken from the header, so any "order" setting works.
+    """
+    with open(csv_path, 'r') as f:
+        header = [name.strip().strip('"') for name in f.readline().strip().split(',')]
+
+    columns = [header.index(name) for name in ("X", "Y", "Z", "ClusterID")]
+    data = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=columns, ndmin=2)
+    return data[:, :3], data[:, 3].astype(np.int64)
+
+def compute_cluster_stats(points, cluster_ids, min_points):
+    """
+    Per-cluster statistics in one grouped pass
+
+    Args:
+        points: (N, 3) coordinates
+        cluster_ids: (N,) PDAL cluster ids (0 = noise)
+        min_points: Clusters smaller than this are dropped
+
+    Returns:
+        centroids: list of centroid dicts, in order of first appearance
+        clustered_points: total points in kept clusters
+    """
+    clustered = cluster_ids > 0
+    points, cluster_ids = points[clustered], cluster_ids[clustered]
+    if len(cluster_ids) == 0:
+        return [], 0
+
+    ids, first_index, inverse, counts = np.unique(cluster_ids, return_index=True,
+                                                  return_inverse=True, return_counts=True)
+    sums = np.column_stack([np.bincount(inverse, weights=points[:, axis]) for axis in range(3)])
+    means = sums / counts[:, None]
+
+    # Group points by cluster for the min/max reductions
+    order = np.argsort(inverse, kind='stable')
+    grouped = points[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    mins = np.minimum.reduceat(grouped, starts, axis=0)
+    maxs = np.maximum.reduceat(grouped, starts, axis=0)
+
+    centroids = []
+    clustered_points = 0
+    for k in np.argsort(first_index):
+        if counts[k] < min_points:
+            continue
+        centroids.append({
+            "object_id": len(centroids) + 1,
+            "cluster_id": int(ids[k]),
+            "centroid_x": round(float(means[k, 0]), 3),
+            "centroid_y": round(float(means[k, 1]), 3),
+            "centroid_z": round(float(means[k, 2]), 3),
+            "point_count": int(counts[k]),
+            "bbox": [round(float(mins[k, 0]), 3), round(float(mins[k, 1]), 3),
+                     round(float(maxs[k, 0]), 3), round(float(maxs[k, 1]), 3)],
+            "min_z": round(float(mins[k, 2]), 3),
+            "max_z": round(float(maxs[k, 2]), 3),
+            "z_range_m": round(float(maxs[k, 2] - mins[k, 2]), 3)
+        })
+        clustered_points += int(counts[k])
+
+    return centroids, clustered_points
+
+def centroids_document(class_name, chunk_name, centroids, clustered_points, input_points, bounds,
+                       clustering_method="2D_projection_lightweight", parameters=None):
+    """
+    Assemble the Stage 3 centroids document from computed centroids
+
+    Args:
+        bounds: (min_x, max_x, min_y, max_y, min_z, max_z) of the class file
+        parameters: Clustering parameters recorded in the document
+    """
+    class_id = class_name.split('_')[0]
+    min_x, max_x, min_y, max_y, min_z, max_z = bounds
+
+    return {
+        "class": class_name,
+        "class_id": int(class_id) if class_id.isdigit() else 0,
+        "chunk": chunk_name,
+        "clustering_method": clustering_method,
+        "parameters": parameters or {},
+        "utm_bounds": {
+            "min_x": min_x,
+            "max_x": max_x,
+            "min_y": min_y,
+            "max_y": max_y,
+            "min_z": min_z,
+            "max_z": max_z
+        },
+        "results": {
+            "input_points": input_points,
+            "clustered_points": clustered_points,
+            "instances_found": len(centroids),
+            "coverage_percent": round((clustered_points / input_points) * 100, 1) if input_points > 0 else 0
+        },
+        "centroids": centroids
+    }
+
+def build_centroids_json(csv_path, class_name, chunk_name, tolerance, min_points, input_points, bounds,
+                         classes_base=None):
+    """
+    Build the Stage 3 centroids document
+
+    Args:
+        bounds: (min_x, max_x, min_y, max_y, min_z, max_z) of the class file
+        classes_base: filtred_by_classes directory of the chunk; clusters of a
+                      tiled chunk centered in the tile buffer are dropped
+    """
+    points, cluster_ids = load_clustered_points(csv_path)
+    print(f"    ✅ Loaded {len(points):,} clustered points", file=sys.stderr)
+
+    centroids, clustered_points = compute_cluster_stats(points, cluster_ids, min_points)
+    print(f"    🧮 Computed statistics for {len(centroids)} clusters", file=sys.stderr)
+
+    if classes_base is not None:
+        centroids, dropped = keep_owned_centroids(centroids, classes_base)
+        if dropped:
+            clustered_points = sum(c["point_count"] for c in centroids)
+            print(f"    ✂️  {dropped} buffer clusters left to the neighbor tiles", file=sys.stderr)
+
+    return centroids_document(class_name, chunk_name, centroids, clustered_points, input_points, bounds,
+                              parameters={
+                                  "tolerance_2d": tolerance,
+                                  "min_points": min_points,
+                                  "z_axis_eliminated": True
+                              })
+
+def main():
+    if len(sys.argv) != 9:
+        print("Usage: python3 stage3_centroids.py <clustered_csv> <centroids_json> <class_name> <chunk_name> "
+              "<tolerance> <min_points> <input_points> <min_x|max_x|min_y|max_y|min_z|max_z>", file=sys.stderr)
+        sys.exit(1)
+
+    csv_path, output_file, class_name, chunk_name = sys.argv[1:5]
+    tolerance = float(sys.argv[5])
+    min_points = int(sys.argv[6])
+    input_points = int(sys.argv[7] or 0)
+    bounds = tuple(float(v) for v in sys.argv[8].split('|'))
+    # <classes_base>/<Class>/centroids/<Class>_centroids.json
+    classes_base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(output_file))))
+
+    try:
+        result = build_centroids_json(csv_path, class_name, chunk_name, tolerance,
+                                      min_points, input_points, bounds, classes_base)
+    except Exception as e:
+        # Fallback empty result
+        print(f"    ❌ Centroid computation failed: {e}", file=sys.stderr)
+        result = {
+            "class": class_name,
+            "error": str(e),
+            "results": {"instances_found": 0, "clustered_points": 0, "coverage_percent": 0},
+            "centroids": []
+        }
+
+    with open(output_file, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    # Summary for the calling shell: instances clustered_points coverage_percent
+    results = result["results"]
+    print(f"{results['instances_found']} {results['clustered_points']} {results['coverage_percent']}")
+
+if __name__ == "__main__":
+    main()
@@ -88,6 +88,13 @@ CLUSTER_CLASSES=(
     "7_Trees" "12_Masts" "9_TrafficLights" "10_TrafficSigns"
 )
 
+# Classes segmented by the canopy height model engine (tree_segmentation.py:
+# CHM raster → treetops → marker watershed) instead of filters.cluster,
+# so adjacent crowns are split. Also writes crown polygons.
+CHM_CLASSES=(
+    "7_Trees"
+)
+
 # ==============================================================================
 # ARGUMENT PARSING
 # ==============================================================================
@@ -243,129 +250,20 @@ EOF
 
     local centroids_file="$centroids_dir/${class_name}_centroids.json"
 
-    python3 << EOF > "$centroids_file"
-import csv
-import json
-import sys
-from collections import defaultdict
-
-# Read clustered points
-clusters = defaultdict(list)
-print(f"    📥 Reading clustered points from CSV...", file=sys.stderr)
-
-try:
-    with open('$temp_clustered', 'r') as f:
-        reader = csv.DictReader(f)
-        row_count = 0
-        for row in reader:
-            cluster_id = int(float(row['ClusterID']))
-            if cluster_id > 0:  # Skip noise points (cluster_id = 0)
-                x, y, z = float(row['X']), float(row['Y']), float(row['Z'])
-                clusters[cluster_id].append((x, y, z))
-            row_count += 1
-            if row_count % 500000 == 0:
-                print(f"    🔄 Processed {row_count:,} points, found {len(clusters)} clusters so far...", file=sys.stderr)
-
-    print(f"    ✅ Finished reading {row_count:,} points, found {len(clusters)} clusters total", file=sys.stderr)
-
-    # Compute centroids
-    centroids = []
-    total_clustered_points = 0
-    print(f"    🧮 Computing centroids for {len(clusters)} clusters...", file=sys.stderr)
-
-    for cluster_id, points in clusters.items():
-        if len(points) >= $min_points:
-            # Compute centroid
-            centroid_x = sum(p[0] for p in points) / len(points)
-            centroid_y = sum(p[1] for p in points) / len(points)
-            centroid_z = sum(p[2] for p in points) / len(points)
-
-            centroids.append({
-                "object_id": len(centroids) + 1,
-                "cluster_id": cluster_id,
-                "centroid_x": round(centroid_x, 3),
-                "centroid_y": round(centroid_y, 3),
-                "centroid_z": round(centroid_z, 3),
-                "point_count": len(points)
-            })
-
-            total_clustered_points += len(points)
-
-    # Create final JSON output
-    result = {
-        "class": "$class_name",
-        "class_id": $(echo "$class_name" | grep -o '^[0-9]*' || echo "0"),
-        "chunk": "$CHUNK_NAME",
-        "clustering_method": "2D_projection_lightweight",
-        "parameters": {
-            "tolerance_2d": $tolerance,
-            "min_points": $min_points,
-            "z_axis_eliminated": True
-        },
-        "utm_bounds": {
-            "min_x": $min_x,
-            "max_x": $max_x,
-            "min_y": $min_y,
-            "max_y": $max_y,
-            "min_z": $min_z,
-            "max_z": $max_z
-        },
-        "results": {
-            "input_points": $input_points,
-            "clustered_points": total_clustered_points,
-            "instances_found": len(centroids),
-            "coverage_percent": round((total_clustered_points / $input_points) * 100, 1) if $input_points > 0 else 0
-        },
-        "centroids": centroids
-    }
-
-    print(json.dumps(result, indent=2))
-
-except Exception as e:
-    # Fallback empty result
-    result = {
-        "class": "$class_name",
-        "error": str(e),
-        "results": {"instances_found": 0, "centroids": []}
-    }
-    print(json.dumps(result, indent=2))
-EOF
+    # Vectorized per-cluster stats; prints "instances clustered_points coverage"
+    local script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+    local summary=$(python3 "$script_dir/stage3_centroids.py" "$temp_clustered" "$centroids_file" \
+        "$class_name" "$CHUNK_NAME" "$tolerance" "$min_points" "$input_points" "$bounds_info" \
+        || echo "0 0 0")
 
     # Cleanup temp file
     rm -f "$temp_clustered"
 
-    # Validate results
-    local instances_found=$(python3 -c "
-import json
-try:
-    with open('$centroids_file', 'r') as f:
-        data = json.load(f)
-    print(data['results']['instances_found'])
-except:
-    print('0')
-" 2>/dev/null || echo "0")
-
-    if [[ "$instances_found" -gt 0 ]]; then
-        local clustered_points=$(python3 -c "
-import json
-try:
-    with open('$centroids_file', 'r') as f:
-        data = json.load(f)
-    print(data['results']['clustered_points'])
-except:
-    print('0')
-" 2>/dev/null || echo "0")
-
-        local coverage=$(python3 -c "
-import json
-try:
-    with open('$centroids_file', 'r') as f:
-        data = json.load(f)
-    print(data['results']['coverage_percent'])
-except:
-    print('0')
-" 2>/dev/null || echo "0")
+    local instances_found clustered_points coverage
+    read -r instances_found clustered_points coverage <<< "$summary"
+    LAST_INSTANCES_FOUND=${instances_found:-0}
 
+    if [[ "$LAST_INSTANCES_FOUND" -gt 0 ]]; then
         log "SUCCESS" "    ✅ $instances_found instances found"
         log "INFO" "      📊 Clustered: $(printf "%'d" $clustered_points) points (${coverage}% coverage)"
         log "INFO" "      📁 Centroids: $centroids_file"
@@ -376,6 +274,38 @@ except:
     fi
 }
 
+# ==============================================================================
+# CHM TREE CROWN SEGMENTATION FUNCTION
+# ==============================================================================
+
+segment_trees_chm() {
+    local class_name="$1"
+    local class_file="$2"
+
+    log "INFO" "  🌳 Processing $class_name (CHM crown segmentation)..."
+
+    local script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+    local class_dir="$(dirname "$class_file")"
+    local centroids_file="$class_dir/centroids/${class_name}_centroids.json"
+    local segmentation_log="/tmp/tree_segmentation_${class_name}_$$.log"
+
+    if ! python3 "$script_dir/tree_segmentation.py" "$CLASSES_DIR" > "$segmentation_log" 2>&1; then
+        log "WARN" "    ⚠️  $(grep -m1 '❌' "$segmentation_log" || echo 'Tree segmentation failed')"
+        rm -f "$segmentation_log"
+        LAST_INSTANCES_FOUND=0
+        return 1
+    fi
+    rm -f "$segmentation_log"
+
+    LAST_INSTANCES_FOUND=$(python3 -c "import json, sys; print(json.load(open(sys.argv[1]))['results']['instances_found'])" \
+        "$centroids_file" 2>/dev/null || echo "0")
+
+    log "SUCCESS" "    ✅ $LAST_INSTANCES_FOUND trees segmented"
+    log "INFO" "      📁 Centroids: $centroids_file"
+    log "INFO" "      📁 Crowns: $class_dir/polygons/${class_name}_polygons.geojson"
+    return 0
+}
+
 # ==============================================================================
 # MAIN PROCESSING LOOP
 # ==============================================================================
@@ -384,6 +314,7 @@ log "HEADER" "PROCESSING CLASSES (LIGHTWEIGHT MODE)"
 
 total_processed=0
 total_instances=0
+LAST_INSTANCES_FOUND=0
 classes_to_process=()
 
 # Determine which classes to process
@@ -406,17 +337,15 @@ for class_name in "${classes_to_process[@]}"; do
 
     log "INFO" "🎯 Processing: $class_name"
 
-    if cluster_class_lightweight "$class_name" "$class_file"; then
-        # Count instances found
-        instances_found=$(python3 -c "
-import json
-try:
-    with open('$CLASSES_DIR/${class_name}/centroids/${class_name}_centroids.json', 'r') as f:
-        data = json.load(f)
-    print(data['results']['instances_found'])
-except:
-    print('0')
-" 2>/dev/null || echo "0")
+    if [[ " ${CHM_CLASSES[*]} " == *" $class_name "* ]]; then
+        segment_class=segment_trees_chm
+    else
+        segment_class=cluster_class_lightweight
+    fi
+
+    if $segment_class "$class_name" "$class_file"; then
+        # Instance count reported by the stage 3 centroid module
+        instances_found=$LAST_INSTANCES_FOUND
 
         ((total_processed++))
         ((total_instances += instances_found))
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Stage Output Cache
+Content-addressed cache of pipeline step outputs, keyed by everything that
+determines them, so an unchanged step is skipped
+
+Key of a step (sha256 of):
+1. Input files: content hash up to HASH_MAX_BYTES, size + mtime for larger
+   ones (segment and class LAZ files)
+2. Parameters: the step's own arguments plus the entries of its class in the
+   shared per-class tables (OUTLIER_PARAMS, CLASS_ENGINES, GROUND_CLEARANCE
+   and the ["class"]=value arrays of the stage scripts)
+3. Code version: the AST of the step's Python module and every local module
+   it imports (comments and formatting ignored), the text of its shell
+   script; per-class table entries are left out, so tuning one class does
+   not invalidate the others
+
+Before a step runs its previous outputs are removed; after a successful run
+the outputs it wrote are recorded under the key in
+<root>/.stage_cache/objects, small outputs are also copied there. A later
+run with the same key is a hit when the outputs still match the record or
+can be restored from the copies (switching a parameter back restores the
+earlier outputs without recomputing them).
+
+Usage:
+    python3 stage_cache.py <root> [--clear]
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+import json
+import shutil
+import hashlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STAGE_CACHE_DIRNAME = ".stage_cache"
+RECORD_NAME = "record.json"
+
+# Inputs/outputs up to this size are content hashed, larger ones use size + mtime
+HASH_MAX_BYTES = 16 * 1024 * 1024
+# Outputs up to this size are copied into the object store
+COPY_MAX_BYTES = 64 * 1024 * 1024
+
+# Module-level dicts keyed by class name; a class's entry is a parameter of
+# that class's steps instead of part of the code version
+CLASS_PARAMETER_TABLES = ("OUTLIER_PARAMS", "CLASS_ENGINES", "GROUND_CLEARANCE")
+
+_SHELL_ARRAY = re.compile(r'^\s*declare\s+-A\s+(\w+)=\(')
+_SHELL_CLASS_ENTRY = re.compile(r'^\s*\["([^"]+)"\]=([^#]*)')
+
+_PYTHON_MODULES = {}
+
+def file_fingerprint(path):
+    """Content hash of a small file, size + mtime of a large one, None if missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_size > HASH_MAX_BYTES:
+        return f"stat:{stat.st_size}:{stat.st_mtime_ns}"
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+def resolve_files(patterns):
+    """Sorted files matching the glob patterns ('**' recurses)"""
+    files = set()
+    for pattern in patterns:
+        files.update(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return sorted(files)
+
+def _parse_module(path):
+    """
+    Code hash, local imports and per-class tables of a Python module
+
+    Returns:
+        (code hash, imported module names, {table name: dict})
+    """
+    if path not in _PYTHON_MODULES:
+        with open(path, 'r') as f:
+            tree = ast.parse(f.read(), filename=path)
+
+        body, tables = [], {}
+        for node in tree.body:
+            targets = node.targets if isinstance(node, ast.Assign) else []
+            names = [t.id for t in targets if isinstance(t, ast.Name)]
+            if len(names) == 1 and names[0] in CLASS_PARAMETER_TABLES:
+                try:
+                    tables[names[0]] = ast.literal_eval(node.value)
+                    continue
+                except ValueError:
+                    pass
+            body.append(node)
+
+        imports = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imports.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                imports.add(node.module.split(".")[0])
+
+        code = ast.dump(ast.Module(body=body, type_ignores=[]))
+        _PYTHON_MODULES[path] = (hashlib.sha256(code.encode()).hexdigest(), sorted(imports), tables)
+    return _PYTHON_MODULES[path]
+
+def python_fingerprint(module_files, class_name=None):
+    """
+    Code version of Python entry points and the local modules they import
+
+    Returns:
+        (code: {module: hash}, params: {module.TABLE: entry of class_name})
+    """
+    code, params = {}, {}
+    queue = [os.path.abspath(p) for p in module_files]
+    while queue:
+        path = queue.pop()
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in code or not os.path.exists(path):
+            continue
+        code[name], imports, tables = _parse_module(path)
+        for table, entries in tables.items():
+            if class_name in entries:
+                params[f"{name}.{table}"] = entries[class_name]
+        for module in imports:
+            local = os.path.join(SCRIPT_DIR, f"{module}.py")
+            if module not in code and os.path.exists(local):
+                queue.append(local)
+    return code, params
+
+def shell_fingerprint(script, class_name=None):
+    """
+    Code version of a shell script, without its ["class"]=value array entries
+    when a class is given (the whole text otherwise)
+
+    Returns:
+        (code hash, params: {ARRAY: value for class_name})
+    """
+    lines, params = [], {}
+    array = None
+    with open(script, 'r') as f:
+        for line in f:
+            match = _SHELL_ARRAY.match(line)
+            if match:
+                array = match.group(1)
+            entry = _SHELL_CLASS_ENTRY.match(line) if class_name else None
+            if entry:
+                if entry.group(1) == class_name:
+                    params[array] = entry.group(2).strip()
+                continue
+            lines.append(line)
+    return hashlib.sha256("".join(lines).encode()).hexdigest(), params
+
+def step_key(spec, root):
+    """
+    Cache key of a step
+
+    Args:
+        spec: {"inputs": [patterns], "outputs": [patterns], "params": dict,
+               "python": [module files], "shell": [scripts], "class": name}
+        root: Directory file names are recorded relative to
+
+    Returns:
+        hex key
+    """
+    class_name = spec.get("class")
+    outputs = set(resolve_files(spec.get("outputs", [])))
+    inputs = {os.path.relpath(p, root): file_fingerprint(p)
+              for p in resolve_files(spec.get("inputs", [])) if p not in outputs}
+
+    code, params = python_fingerprint(spec.get("python", []), class_name)
+    for script in spec.get("shell", []):
+        name = os.path.basename(script)
+        code[name], script_params = shell_fingerprint(script, class_name)
+        params.update({f"{name}.{k}": v for k, v in script_params.items()})
+    params.update(spec.get("params", {}))
+
+    document = json.dumps({"class": class_name, "inputs": inputs, "params": params, "code": code},
+                          sort_keys=True, default=str)
+    return hashlib.sha256(document.encode()).hexdigest()
+
+def _object_dir(root, key):
+    return os.path.join(root, STAGE_CACHE_DIRNAME, "objects", key[:2], key)
+
+def clear_outputs(spec):
+    """
+    Remove the current outputs of a step before it runs, so a run writing
+    fewer files than the previous one (e.g. no features found) does not leave
+    stale outputs to be recorded under its key
+
+    Returns:
+        number of files removed
+    """
+    removed = 0
+    for path in resolve_files(spec.get("outputs", [])):
+        os.remove(path)
+        removed += 1
+    return removed
+
+def lookup(root, key):
+    """
+    Make the outputs recorded under the key current
+
+    Outputs matching the step's patterns that are not in the record (left by
+    a run with other inputs or parameters) are removed.
+
+    Returns:
+        True on a hit (outputs match the record, restored from the object
+        store where they did not), False when the step has to run
+    """
+    object_dir = _object_dir(root, key)
+    try:
+        with open(os.path.join(object_dir, RECORD_NAME), 'r') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    restore = []
+    for name, fingerprint in record["outputs"].items():
+        path = os.path.join(root, name)
+        if file_fingerprint(path) == fingerprint:
+            continue
+        stored = os.path.join(object_dir, "files", name)
+        if file_fingerprint(stored) != fingerprint:
+            return False
+        restore.append((stored, path))
+
+    recorded = {os.path.join(root, name) for name in record["outputs"]}
+    for path in resolve_files(record.get("spec", {}).get("outputs", [])):
+        if path not in recorded:
+            os.remove(path)
+
+    for stored, path in restore:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copy2(stored, path)
+    return True
+
+def store(root, key, spec):
+    """
+    Record the step's current outputs under the key
+
+    Returns:
+        number of outputs recorded
+    """
+    object_dir = _object_dir(root, key)
+    outputs = {}
+    for path in resolve_files(spec.get("outputs", [])):
+        name = os.path.relpath(path, root)
+        outputs[name] = file_fingerprint(path)
+        if os.path.getsize(path) <= COPY_MAX_BYTES:
+            stored = os.path.join(object_dir, "files", name)
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            shutil.copy2(path, stored)
+
+    os.makedirs(object_dir, exist_ok=True)
+    record_file = os.path.join(object_dir, RECORD_NAME)
+    with open(f"{record_file}.tmp", 'w') as f:
+        json.dump({"spec": spec, "outputs": outputs}, f, indent=2)
+    os.replace(f"{record_file}.tmp", record_file)
+    return len(outputs)
+
+def cache_size(root):
+    """(records, bytes) in the object store of a root"""
+    records, total = 0, 0
+    for dirpath, _, filenames in os.walk(os.path.join(root, STAGE_CACHE_DIRNAME)):
+        records += RECORD_NAME in filenames
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return records, total
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 stage_cache.py <root> [--clear]")
+        print("Examples:")
+        print("  python3 stage_cache.py outlast/chunks")
+        print("  python3 stage_cache.py outlast/chunks --clear")
+        sys.exit(1)
+
+    root = os.path.abspath(sys.argv[1])
+    records, total = cache_size(root)
+    print(f"📊 {records:,} cached steps, {total / 1024 / 1024:.1f} MB in {os.path.join(root, STAGE_CACHE_DIRNAME)}")
+    if "--clear" in sys.argv[2:]:
+        shutil.rmtree(os.path.join(root, STAGE_CACHE_DIRNAME), ignore_errors=True)
+        print(f"🗑️  Cache cleared")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Tile-Parallel DBSCAN
+Splits the XY extent into tiles with an eps-wide halo and clusters them in a
+process pool; labels are identical to a global grid_dbscan()/sklearn run
+
+1. Core pass: each tile counts neighborhoods of the points it owns. An owned
+   point's eps-neighborhood lies entirely inside tile + halo, so its core flag
+   is exact
+2. Cluster pass: each tile links the (global) core points of tile + halo into
+   local components
+3. Union-find: a core point seen by several tiles joins their local components;
+   clusters are numbered by their lowest-index core point
+4. Border points take the lowest global label among adjacent core points
+
+Tiling is XY only, so 3D inputs (wires) work unchanged.
+"""
+
+import os
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from grid_dbscan import grid_dbscan, core_mask
+
+# Below this size a single global grid_dbscan run is faster than tiling
+MIN_TILED_POINTS = 200_000
+
+# Tiles per worker, for load balancing across uneven point density
+TILES_PER_WORKER = 4
+
+# Worker budget of a tiled_dbscan call; callers that run extractors in their
+# own process pool set it (set_worker_budget) so nested pools do not
+# oversubscribe the CPUs (1 = serial grid_dbscan)
+WORKER_BUDGET_ENV = "TILED_DBSCAN_WORKERS"
+
+def set_worker_budget(workers):
+    """Process pool initializer: cap tiled_dbscan workers (an outer budget wins)"""
+    os.environ.setdefault(WORKER_BUDGET_ENV, str(max(int(workers), 1)))
+
+def worker_budget():
+    """Default tiled_dbscan pool size: the budget set by the caller, else the CPU count"""
+    try:
+        return max(int(os.environ[WORKER_BUDGET_ENV]), 1)
+    except (KeyError, ValueError):
+        return os.cpu_count() or 1
+
+def make_tiles(points, eps, tile_size=None, n_tiles=16):
+    """
+    Split points into XY tiles with an eps halo
+
+    Args:
+        points: (N, d) coordinates
+        eps: Halo width
+        tile_size: Tile side in meters (default: extent split into ~n_tiles)
+        n_tiles: Target tile count when tile_size is not given
+
+    Returns:
+        tiles: list of (member indices, owned mask); members cover tile + halo
+    """
+    xy = points[:, :2]
+    lo = xy.min(axis=0)
+    extent = np.maximum(xy.max(axis=0) - lo, 1e-9)
+
+    if tile_size is None:
+        tile_size = np.sqrt(extent[0] * extent[1] / n_tiles)
+        tile_size = max(tile_size, extent.max() / n_tiles)
+    # The halo must fit inside the 3x3 tile block around each tile
+    tile_size = max(float(tile_size), float(eps))
+
+    ij = np.floor((xy - lo) / tile_size).astype(np.int64)
+    nx, ny = ij.max(axis=0) + 1
+    tile_id = ij[:, 0] * ny + ij[:, 1]
+    order = np.argsort(tile_id, kind='stable')
+    bounds = np.searchsorted(tile_id[order], np.arange(nx * ny + 1))
+
+    tiles = []
+    for i, j in itertools.product(range(nx), range(ny)):
+        t = i * ny + j
+        if bounds[t] == bounds[t + 1]:
+            continue
+
+        candidates = np.concatenate([order[bounds[a * ny + b]:bounds[a * ny + b + 1]]
+                                     for a in range(max(i - 1, 0), min(i + 2, nx))
+                                     for b in range(max(j - 1, 0), min(j + 2, ny))])
+        x0, y0 = lo + np.array([i, j]) * tile_size
+        cx, cy = xy[candidates, 0], xy[candidates, 1]
+        in_halo = ((cx >= x0 - eps) & (cx <= x0 + tile_size + eps) &
+                   (cy >= y0 - eps) & (cy <= y0 + tile_size + eps))
+        members = np.sort(candidates[in_halo])
+        tiles.append((members, tile_id[members] == t))
+
+    return tiles
+
+def _tile_core(tile_points, owned, eps, min_samples):
+    return core_mask(tile_points, eps, min_samples)[owned]
+
+def _tile_clusters(tile_points, tile_core, owned, eps, min_samples):
+    """
+    Local components of a tile's core points and border candidates of its owned points
+
+    Returns:
+        core_idx, core_labels: tile-local core point indices and component labels
+        border_idx, border_labels: (owned non-core point, adjacent component) pairs
+    """
+    labels, _ = grid_dbscan(tile_points, eps, min_samples, core=tile_core)
+    core_idx = np.flatnonzero(tile_core)
+    core_labels = labels[core_idx]
+
+    border_idx = np.zeros(0, dtype=np.int64)
+    border_labels = np.zeros(0, dtype=np.int64)
+    candidates = np.flatnonzero(owned & ~tile_core)
+    if len(candidates) and len(core_idx):
+        neighbors = cKDTree(tile_points[core_idx]).query_ball_point(tile_points[candidates], eps)
+        lengths = np.fromiter((len(x) for x in neighbors), dtype=np.int64, count=len(candidates))
+        flat = np.fromiter(itertools.chain.from_iterable(neighbors), dtype=np.int64, count=lengths.sum())
+        pairs = np.unique(np.column_stack((np.repeat(candidates, lengths), core_labels[flat])), axis=0)
+        border_idx, border_labels = pairs[:, 0], pairs[:, 1]
+
+    return core_idx, core_labels, border_idx, border_labels
+
+def tiled_dbscan(points, eps, min_samples, tile_size=None, max_workers=None, index=None):
+    """
+    DBSCAN over XY tiles in a process pool
+
+    Args:
+        points: (N, d) coordinates
+        eps, min_samples: DBSCAN parameters
+        tile_size: Tile side in meters (default: ~TILES_PER_WORKER tiles per worker)
+        max_workers: Process pool size (default: worker_budget())
+        index: Optional outlier_filter.SubsetIndex over these points, used when
+               the run falls back to a single grid_dbscan (tiles build their own)
+
+    Returns:
+        labels: (N,) cluster labels, -1 for noise
+        core_mask: (N,) True for core points
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    n = len(points)
+    if max_workers is None:
+        max_workers = worker_budget()
+
+    if n == 0 or (tile_size is None and (n < MIN_TILED_POINTS or max_workers == 1)):
+        return grid_dbscan(points, eps, min_samples, index=index)
+
+    tiles = make_tiles(points, eps, tile_size, max_workers * TILES_PER_WORKER)
+    if len(tiles) == 1:
+        return grid_dbscan(points, eps, min_samples, index=index)
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(tiles))) as executor:
+        # Pass 1: exact core flags for owned points
+        core = np.zeros(n, dtype=bool)
+        futures = [executor.submit(_tile_core, points[members], owned, eps, min_samples)
+                   for members, owned in tiles]
+        for (members, owned), future in zip(tiles, futures):
+            core[members[owned]] = future.result()
+
+        # Pass 2: local core components + border candidates per tile
+        futures = [executor.submit(_tile_clusters, points[members], core[members], owned, eps, min_samples)
+                   for members, owned in tiles]
+        results = [future.result() for future in futures]
+
+    # Union-find over (tile, local component) nodes joined through shared core points
+    node_offset = 0
+    core_ids, core_nodes, border_ids, border_nodes = [], [], [], []
+    for (members, _), (core_idx, core_labels, border_idx, border_labels) in zip(tiles, results):
+        core_ids.append(members[core_idx])
+        core_nodes.append(core_labels + node_offset)
+        border_ids.append(members[border_idx])
+        border_nodes.append(border_labels + node_offset)
+        node_offset += int(core_labels.max()) + 1 if len(core_labels) else 0
+
+    core_ids = np.concatenate(core_ids)
+    core_nodes = np.concatenate(core_nodes)
+    order = np.argsort(core_ids, kind='stable')
+    core_ids, core_nodes = core_ids[order], core_nodes[order]
+    same_point = core_ids[1:] == core_ids[:-1]
+    graph = coo_matrix((np.ones(same_point.sum(), dtype=np.int8),
+                        (core_nodes[:-1][same_point], core_nodes[1:][same_point])),
+                       shape=(node_offset, node_offset))
+    component = connected_components(graph, directed=False)[1]
+
+    # Number clusters by their lowest-index core point (core_ids is sorted)
+    first_core = np.full(node_offset, n, dtype=np.int64)
+    np.minimum.at(first_core, component[core_nodes], core_ids)
+    present = np.flatnonzero(first_core < n)
+    cluster_of_component = np.full(node_offset, -1, dtype=np.int64)
+    cluster_of_component[present[np.argsort(first_core[present])]] = np.arange(len(present))
+
+    labels = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    labels[core_ids] = cluster_of_component[component[core_nodes]]
+
+    # Border points: lowest global label among adjacent components
+    border_ids = np.concatenate(border_ids)
+    if len(border_ids):
+        border_nodes = np.concatenate(border_nodes)
+        np.minimum.at(labels, border_ids, cluster_of_component[component[border_nodes]])
+
+    labels[labels == np.iinfo(np.int64).max] = -1
+    return labels, core
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Tree Crown Segmentation (Canopy Height Model)
+Individual trees of 7_Trees from a CHM raster instead of 2D DBSCAN /
+filters.cluster, so adjacent crowns are split at their valleys
+
+1. CHM: highest point per 0.5m cell minus the chunk DTM (ground_model), or
+   without one the lowest tree point within TREE_GROUND_WINDOW_M, Gaussian-smoothed
+2. Treetops: cells equal to the maximum of their TREETOP_WINDOW_M window and
+   above TREE_MIN_HEIGHT_M (plateaus merged into one marker)
+3. Marker-controlled watershed on the inverted CHM (priority flood from the
+   treetops, highest canopy first), cells below TREE_MIN_HEIGHT_M are background
+4. Points inherit the crown of their cell; centroids use the Stage 3 schema,
+   crown outlines are traced from the label raster
+
+Outputs (per chunk):
+    7_Trees/centroids/7_Trees_centroids.json
+    7_Trees/polygons/7_Trees_polygons.geojson
+
+Usage:
+    python3 tree_segmentation.py <chunk_path>
+"""
+
+import os
+import sys
+import json
+import heapq
+import numpy as np
+from scipy import ndimage
+from point_cache import load_xyz
+from extractor_common import resolve_chunk_path, class_file
+from raster_footprints import trace_component, SQUARE
+from stage3_centroids import compute_cluster_stats, centroids_document
+from geometry_metrics import ring_metrics
+from ground_model import load_ground_model
+from spatial_tiler import keep_owned_centroids
+
+TREE_CLASS = "7_Trees"
+
+# CHM raster cell size (m)
+TREE_CHM_CELL_SIZE = 0.5
+
+# Window for the local ground level under the canopy (m)
+TREE_GROUND_WINDOW_M = 10.0
+
+# Gaussian smoothing of the CHM (cells)
+TREE_CHM_SIGMA = 1.0
+
+# Local-maximum window for treetop detection (m, about the smallest crown diameter)
+TREETOP_WINDOW_M = 3.0
+
+# Canopy below this height is background (m)
+TREE_MIN_HEIGHT_M = 2.0
+
+# Crowns with fewer points are dropped
+TREE_MIN_POINTS = 30
+
+def _cell_window(size_m, cell_size):
+    """Odd window size in cells covering size_m"""
+    return max(int(round(size_m / cell_size)) // 2 * 2 + 1, 3)
+
+def canopy_height_model(points, cell_size=TREE_CHM_CELL_SIZE, ground_window_m=TREE_GROUND_WINDOW_M,
+                        sigma=TREE_CHM_SIGMA, ground=None):
+    """
+    Smoothed canopy height model of the tree points
+
+    Args:
+        ground: Optional chunk GroundModel; without one the ground is the
+                lowest tree point within ground_window_m
+
+    Returns:
+        chm: (rows, cols) heights above the local ground, 0 for empty cells
+        origin: (x, y) of the lower-left grid corner
+        cells: (N, 2) row/col of every point
+    """
+    margin = 2
+    origin = np.floor(points[:, :2].min(axis=0) / cell_size) * cell_size - margin * cell_size
+    cells = np.floor((points[:, :2] - origin) / cell_size).astype(np.int64)
+    cols, rows = cells.max(axis=0) + 1 + margin
+    flat = cells[:, 1] * cols + cells[:, 0]
+
+    top = np.full(rows * cols, -np.inf)
+    bottom = np.full(rows * cols, np.inf)
+    np.maximum.at(top, flat, points[:, 2])
+    np.minimum.at(bottom, flat, points[:, 2])
+    top, bottom = top.reshape(rows, cols), bottom.reshape(rows, cols)
+
+    occupied = np.isfinite(top)
+    if ground is not None:
+        r, c = np.mgrid[0:rows, 0:cols]
+        centers = origin + (np.column_stack((c.ravel(), r.ravel())) + 0.5) * cell_size
+        ground_level = ground.ground_z(centers).reshape(rows, cols)
+    else:
+        ground_level = ndimage.minimum_filter(bottom, size=_cell_window(ground_window_m, cell_size), mode='nearest')
+    chm = np.where(occupied, top - np.where(np.isfinite(ground_level), ground_level, 0.0), 0.0)
+    if sigma > 0:
+        chm = ndimage.gaussian_filter(chm, sigma)
+    return chm, origin, cells[:, ::-1]
+
+def detect_treetops(chm, cell_size=TREE_CHM_CELL_SIZE, window_m=TREETOP_WINDOW_M, min_height=TREE_MIN_HEIGHT_M):
+    """
+    Treetop markers: local maxima of the CHM above min_height
+
+    Returns:
+        markers: (rows, cols) int32, 1..n per treetop (touching maxima merged), 0 elsewhere
+        n_treetops
+    """
+    local_max = chm == ndimage.maximum_filter(chm, size=_cell_window(window_m, cell_size), mode='constant')
+    markers, n_treetops = ndimage.label(local_max & (chm >= min_height), structure=SQUARE)
+    return markers.astype(np.int32), n_treetops
+
+def watershed_crowns(chm, markers, min_height=TREE_MIN_HEIGHT_M):
+    """
+    Marker-controlled watershed of the inverted CHM (priority flood)
+
+    Crowns grow from their treetops, always claiming the highest unlabeled
+    canopy cell next to a crown first, so neighboring crowns meet at the
+    valley between them.
+
+    Returns:
+        crowns: (rows, cols) crown label per cell (treetop id), 0 for background
+    """
+    rows, cols = chm.shape
+    width = cols + 2
+    # One-cell background border: neighbor lookups need no bounds checks
+    canopy = np.zeros((rows + 2, width), dtype=bool)
+    canopy[1:-1, 1:-1] = chm >= min_height
+    height = np.zeros(canopy.shape)
+    height[1:-1, 1:-1] = chm
+    labels = np.zeros(canopy.shape, dtype=np.int32)
+    labels[1:-1, 1:-1] = np.where(canopy[1:-1, 1:-1], markers, 0)
+
+    canopy_flat = canopy.ravel().tolist()
+    height_flat = height.ravel().tolist()
+    labels_flat = labels.ravel().tolist()
+    offsets = [dr * width + dc for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+
+    # (negated height, insertion order, cell): highest first, FIFO among equal heights
+    queue = [(-height_flat[i], order, i) for order, i in enumerate(np.flatnonzero(labels).tolist())]
+    heapq.heapify(queue)
+    order = len(queue)
+    while queue:
+        _, _, i = heapq.heappop(queue)
+        label = labels_flat[i]
+        for offset in offsets:
+            j = i + offset
+            if canopy_flat[j] and not labels_flat[j]:
+                labels_flat[j] = label
+                order += 1
+                heapq.heappush(queue, (-height_flat[j], order, j))
+
+    return np.asarray(labels_flat, dtype=np.int32).reshape(canopy.shape)[1:-1, 1:-1]
+
+def segment_crowns(points, cell_size=TREE_CHM_CELL_SIZE, min_height=TREE_MIN_HEIGHT_M, ground=None):
+    """
+    Crown label of every tree point
+
+    Args:
+        ground: Optional chunk GroundModel for the CHM
+
+    Returns:
+        point_labels: (N,) crown id per point (0 = not in a crown)
+        crowns: (rows, cols) crown label raster
+        chm: (rows, cols) smoothed canopy height model
+        origin: (x, y) of the raster's lower-left corner
+    """
+    chm, origin, cells = canopy_height_model(points, cell_size, ground=ground)
+    markers, _ = detect_treetops(chm, cell_size, min_height=min_height)
+    crowns = watershed_crowns(chm, markers, min_height)
+    return crowns[cells[:, 0], cells[:, 1]], crowns, chm, origin
+
+def crown_polygons(crowns, chm, origin, cell_size, crown_ids):
+    """
+    Outline, treetop and height of the given crowns
+
+    Returns:
+        crown_info: dict mapping crown id to {coords, treetop, height_m, area_m2}
+    """
+    crown_info = {}
+    windows = ndimage.find_objects(crowns)
+    tops = ndimage.maximum_position(chm, crowns, crown_ids)
+    heights = ndimage.maximum(chm, crowns, crown_ids)
+    cell_counts = np.bincount(crowns.ravel(), minlength=int(crowns.max()) + 1)
+
+    for crown_id, top, height in zip(crown_ids, tops, heights):
+        window = windows[crown_id - 1]
+        if window is None:
+            continue
+        mask = crowns[window] == crown_id
+        window_origin = origin + np.array([window[1].start, window[0].start]) * cell_size
+        crown_info[crown_id] = {
+            "coords": trace_component(mask, window_origin, cell_size, tolerance=cell_size),
+            "treetop": origin + (np.array([top[1], top[0]]) + 0.5) * cell_size,
+            "height_m": float(height),
+            "area_m2": float(cell_counts[crown_id] * cell_size ** 2)
+        }
+    return crown_info
+
+def segment_trees(chunk_path, points_3d=None):
+    """
+    Segment the tree crowns of one chunk and write centroids and crown polygons
+
+    Args:
+        chunk_path: Path to chunk directory (e.g., /path/to/chunk_1 or /path/to/chunk_1/compressed/filtred_by_classes)
+        points_3d: Optional preloaded (N, 3) tree points (skips loading 7_Trees.laz)
+
+    Returns:
+        Number of trees found
+    """
+    try:
+        classes_base, chunk_name = resolve_chunk_path(chunk_path)
+        if classes_base is None:
+            print(f"❌ Invalid path structure. Expected chunk directory or filtred_by_classes directory")
+            return 0
+
+        laz_file = class_file(classes_base, TREE_CLASS)
+        centroids_dir = f"{classes_base}/{TREE_CLASS}/centroids"
+        polygons_dir = f"{classes_base}/{TREE_CLASS}/polygons"
+        centroids_file = f"{centroids_dir}/{TREE_CLASS}_centroids.json"
+        polygons_file = f"{polygons_dir}/{TREE_CLASS}_polygons.geojson"
+
+        print(f"\n🌳 === CHM TREE CROWN SEGMENTATION ===")
+        print(f"📍 Chunk: {chunk_name}")
+        print(f"📂 Base path: {classes_base}")
+        print(f"🎯 Method: Canopy height model ({TREE_CHM_CELL_SIZE}m) + treetops + marker watershed")
+
+        if points_3d is None:
+            if not os.path.exists(laz_file):
+                print(f"❌ No tree data found: {laz_file}")
+                return 0
+            points_3d = load_xyz(laz_file)
+
+        print(f"📊 Input points: {len(points_3d):,}")
+        if len(points_3d) < TREE_MIN_POINTS * 2:
+            print(f"❌ Too few points: {len(points_3d)}")
+            return 0
+
+        # Steps 1-3: CHM, treetops, watershed
+        print(f"\n🔄 Step 1: Canopy height model, treetops and watershed")
+        point_labels, crowns, chm, origin = segment_crowns(points_3d, ground=load_ground_model(classes_base))
+        print(f"  📊 CHM: {chm.shape[1]}x{chm.shape[0]} cells, max height {chm.max():.1f}m")
+        print(f"  📊 Crowns: {int(crowns.max())} treetops, {np.count_nonzero(point_labels):,} points in crowns")
+
+        # Step 4: Centroids (Stage 3 schema) and crown outlines
+        print(f"\n🔄 Step 2: Crown centroids and outlines")
+        centroids, clustered_points = compute_cluster_stats(points_3d, point_labels, TREE_MIN_POINTS)
+        # Tiled chunk: trees centered in the buffer belong to the neighbor tile
+        centroids, dropped = keep_owned_centroids(centroids, classes_base)
+        if dropped:
+            clustered_points = sum(c["point_count"] for c in centroids)
+            print(f"  ✂️  {dropped} buffer trees left to the neighbor tiles")
+        crown_info = crown_polygons(crowns, chm, origin, TREE_CHM_CELL_SIZE,
+                                    [centroid["cluster_id"] for centroid in centroids])
+
+        crown_features = []
+        for centroid in centroids:
+            info = crown_info.get(centroid["cluster_id"])
+            if info is None:
+                continue
+            centroid["treetop_x"] = round(float(info["treetop"][0]), 3)
+            centroid["treetop_y"] = round(float(info["treetop"][1]), 3)
+            centroid["tree_height_m"] = round(info["height_m"], 2)
+            centroid["crown_area_m2"] = round(info["area_m2"], 2)
+            centroid["crown_diameter_m"] = round(2.0 * np.sqrt(info["area_m2"] / np.pi), 2)
+
+            if info["coords"] is None:
+                continue
+            metrics = ring_metrics(info["coords"])
+            crown_features.append({
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [info["coords"]]
+                },
+                "properties": {
+                    "polygon_id": len(crown_features) + 1,
+                    "object_id": centroid["object_id"],
+                    "class": TREE_CLASS,
+                    "chunk": chunk_name,
+                    "area_m2": round(metrics["area_m2"], 2),
+                    "perimeter_m": round(metrics["perimeter_m"], 2),
+                    "point_count": centroid["point_count"],
+                    "tree_height_m": centroid["tree_height_m"],
+                    "crown_diameter_m": centroid["crown_diameter_m"],
+                    "extraction_method": "tree_segmentation_chm"
+                }
+            })
+
+        if not centroids:
+            print(f"❌ No tree crowns found")
+            return 0
+
+        mins, maxs = points_3d.min(axis=0), points_3d.max(axis=0)
+        bounds = tuple(round(float(v), 3) for v in (mins[0], maxs[0], mins[1], maxs[1], mins[2], maxs[2]))
+        document = centroids_document(TREE_CLASS, chunk_name, centroids, clustered_points, len(points_3d), bounds,
+                                      clustering_method="chm_watershed",
+                                      parameters={
+                                          "chm_cell_size": TREE_CHM_CELL_SIZE,
+                                          "treetop_window_m": TREETOP_WINDOW_M,
+                                          "min_height_m": TREE_MIN_HEIGHT_M,
+                                          "min_points": TREE_MIN_POINTS
+                                      })
+
+        os.makedirs(centroids_dir, exist_ok=True)
+        with open(centroids_file, 'w') as f:
+            json.dump(document, f, indent=2)
+
+        os.makedirs(polygons_dir, exist_ok=True)
+        with open(polygons_file, 'w') as f:
+            json.dump({
+                "type": "FeatureCollection",
+                "features": crown_features,
+                "properties": {
+                    "class": TREE_CLASS,
+                    "chunk": chunk_name,
+                    "extraction_method": "tree_segmentation_chm",
+                    "results": {
+                        "input_points": len(points_3d),
+                        "clustered_points": clustered_points,
+                        "crowns_extracted": len(crown_features)
+                    }
+                }
+            }, f, indent=2)
+
+        heights = [centroid["tree_height_m"] for centroid in centroids if "tree_height_m" in centroid]
+        print(f"\n✅ SUCCESS: {len(centroids)} trees")
+        if heights:
+            print(f"📊 Height: {min(heights):.1f}-{max(heights):.1f}m, coverage {document['results']['coverage_percent']}%")
+        print(f"📁 Centroids: {centroids_file}")
+        print(f"📁 Crowns: {polygons_file}")
+
+        return len(centroids)
+
+    except Exception as e:
+        print(f"❌ ERROR: {e}")
+        return 0
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 tree_segmentation.py <chunk_path>")
+        print("Examples:")
+        print("  python3 tree_segmentation.py /path/to/chunk_1")
+        print("  python3 tree_segmentation.py /path/to/chunk_1/compressed/filtred_by_classes")
+        sys.exit(1)
+
+    chunk_path = sys.argv[1]
+
+    # Validate path exists
+    if not os.path.exists(chunk_path):
+        print(f"❌ Path not found: {chunk_path}")
+        sys.exit(1)
+
+    result = segment_trees(chunk_path)
+
+    if result > 0:
+        print(f"\n🎉 Success! Segmented {result} trees")
+    else:
+        print(f"\n❌ Failed to segment trees")
+        sys.exit(1)
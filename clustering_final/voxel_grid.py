@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Packed Voxel Grid
+Voxel downsampling shared by all extractors and the road sampling helper
+
+Row-wise np.unique(..., axis=0) on (ix, iy, iz) does a lexicographic sort of
+a structured view with several N x 3 temporaries. Here each voxel index is
+packed into one uint64 key relative to the chunk's lowest voxel and grouped
+with a single 1-D sort:
+
+    key = ((ix - ix0) * ny + (iy - iy0)) * nz + (iz - iz0)
+
+The grid stays aligned to world coordinates (floor(p / voxel_size)), so the
+packed key order equals the old lexicographic order and results are unchanged.
+"""
+
+import numpy as np
+
+VOXEL_MODES = ("first", "centroid")
+
+def voxel_keys(points, voxel_size):
+    """
+    Pack voxel indices into one uint64 key per point
+
+    Args:
+        points: (N, d) coordinates, d <= 3
+        voxel_size: Voxel edge length in meters
+
+    Returns:
+        keys: (N,) uint64 voxel keys, ordered like the (ix, iy, iz) tuples
+    """
+    lo = np.floor(points.min(axis=0) / voxel_size).astype(np.int64)
+    hi = np.floor(points.max(axis=0) / voxel_size).astype(np.int64)
+    dims = (hi - lo + 1).astype(object)  # Python ints, no overflow in the check
+    if np.prod(dims) >= 2 ** 64:
+        raise ValueError(f"Voxel grid {list(dims)} at {voxel_size}m does not fit a 64-bit key")
+
+    keys = np.zeros(len(points), dtype=np.uint64)
+    for axis in range(points.shape[1]):
+        index = np.floor(points[:, axis] / voxel_size).astype(np.int64)
+        index -= lo[axis]
+        keys *= np.uint64(dims[axis])
+        keys += index.astype(np.uint64)
+    return keys
+
+def voxel_groups(points, voxel_size):
+    """
+    Group points by voxel with one sort
+
+    Returns:
+        first_index: (V,) index of the first point in each voxel
+        inverse: (N,) voxel number of every point
+        counts: (V,) points per voxel
+        Voxels are numbered in key order.
+    """
+    keys = voxel_keys(points, voxel_size)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    counts = np.diff(np.append(starts, len(points)))
+
+    inverse = np.empty(len(points), dtype=np.int64)
+    inverse[order] = np.repeat(np.arange(len(starts)), counts)
+    return order[starts], inverse, counts
+
+def voxel_downsample(points, voxel_size, mode="first", return_counts=False):
+    """
+    One point per occupied voxel
+
+    Args:
+        points: (N, d) coordinates
+        voxel_size: Voxel edge length in meters
+        mode: "first" keeps the first point of each voxel,
+              "centroid" replaces each voxel by the mean of its points
+        return_counts: Also return the number of points per voxel
+
+    Returns:
+        voxel_points: (V, d) points in voxel key order
+        counts: (V,) points per voxel (only if return_counts)
+    """
+    if mode not in VOXEL_MODES:
+        raise ValueError(f"Unknown voxel mode '{mode}' (available: {list(VOXEL_MODES)})")
+
+    if len(points) == 0:
+        return (points, np.zeros(0, dtype=np.int64)) if return_counts else points
+
+    first_index, inverse, counts = voxel_groups(points, voxel_size)
+
+    if mode == "first":
+        voxel_points = points[first_index]
+    else:
+        voxel_points = np.column_stack([np.bincount(inverse, weights=points[:, axis], minlength=len(counts))
+                                        for axis in range(points.shape[1])]) / counts[:, None]
+
+    return (voxel_points, counts) if return_counts else voxel_points
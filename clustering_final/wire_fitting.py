@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Batched Wire Span Fitting
+Principal axis, catenary and sag of every wire cluster of a chunk at once
+
+1. Points are grouped per cluster label; the 2D principal axis of every span
+   comes from grouped second moments (closed-form 2x2 eigenvector), so no
+   per-cluster PCA or sklearn estimator runs in a Python loop
+2. Heights along the axis are fitted with a least-squares parabola for all
+   spans together (one batched 3x3 solve)
+3. Spans that sag are refined to a catenary z = z_c + (cosh(k*s + phi) -
+   cosh(phi)) / k with a few vectorized Gauss-Newton steps (parabola start)
+4. Sag, clearance above ground and fit residuals are read off the fitted
+   curves at evenly spaced stations
+
+Every step is a grouped NumPy reduction over all points, so the cost is
+linear in points and hundreds of spans fit in milliseconds.
+"""
+
+import numpy as np
+
+# Quality filters for wire lines
+WIRE_MIN_POINTS = 20
+WIRE_MIN_LENGTH = 5.0      # m
+WIRE_MIN_ASPECT = 3.0      # length : width
+WIRE_MIN_WIDTH = 0.1       # width floor in the aspect ratio (m)
+
+# Maximum vertices of an output line
+WIRE_LINE_VERTICES = 50
+
+# Catenary refinement: Gauss-Newton steps, and the parabola curvature (1/m)
+# below which a span is kept as a parabola (effectively straight)
+CATENARY_ITERATIONS = 8
+CATENARY_MIN_CURVATURE = 1e-5
+
+# Stations per span for sag, clearance and curve heights
+SPAN_STATIONS = 33
+
+def _group_sum(values, group, n_groups):
+    return np.bincount(group, weights=values, minlength=n_groups)
+
+def _solve_batched(matrices, vectors):
+    """Solve S small systems, with a tiny ridge so degenerate spans do not fail"""
+    scale = np.abs(matrices).max(axis=(1, 2), keepdims=True) + 1e-12
+    ridge = np.eye(matrices.shape[1]) * scale * 1e-12
+    return np.linalg.solve(matrices + ridge, vectors[..., None])[..., 0]
+
+def _normal_equations(columns, target, group, n_groups):
+    """Per-group least squares of target on the given columns (J^T J, J^T r)"""
+    n = len(columns)
+    matrices = np.empty((n_groups, n, n))
+    vectors = np.empty((n_groups, n))
+    for i in range(n):
+        vectors[:, i] = _group_sum(columns[i] * target, group, n_groups)
+        for j in range(i, n):
+            matrices[:, i, j] = matrices[:, j, i] = _group_sum(columns[i] * columns[j], group, n_groups)
+    return _solve_batched(matrices, vectors)
+
+def catenary_z(s, z_c, phi, k):
+    """Catenary height at axis positions s (z_c at s = 0, slope sinh(phi) there)"""
+    return z_c + (np.cosh(k * s + phi) - np.cosh(phi)) / k
+
+def _curve_z(s, group, fit):
+    """Fitted height of every (position, span) pair, catenary or parabola"""
+    is_catenary = fit["is_catenary"][group]
+    z = fit["parabola"][group, 0] + fit["parabola"][group, 1] * s + fit["parabola"][group, 2] * s ** 2
+    if is_catenary.any():
+        g = group[is_catenary]
+        z[is_catenary] = catenary_z(s[is_catenary], fit["z_c"][g], fit["phi"][g], fit["k"][g])
+    return z
+
+def fit_catenaries(s, z, group, n_groups, parabola, iterations=CATENARY_ITERATIONS):
+    """
+    Refine parabola fits of sagging spans to catenaries (vectorized Gauss-Newton)
+
+    Args:
+        s: (N,) axis positions relative to each span's middle
+        z: (N,) heights
+        group: (N,) span index of every point
+        n_groups: Number of spans
+        parabola: (S, 3) z = p0 + p1*s + p2*s^2 per span
+
+    Returns:
+        z_c, phi, k: (S,) catenary parameters
+        is_catenary: (S,) bool, False where the span does not sag
+    """
+    # Catenary with the parabola's height, slope and curvature at s = 0
+    phi = np.arcsinh(parabola[:, 1])
+    k = 2 * parabola[:, 2] / np.cosh(phi)
+    z_c = parabola[:, 0].copy()
+    is_catenary = k > CATENARY_MIN_CURVATURE
+
+    active = is_catenary[group]
+    s, z, group = s[active], z[active], group[active]
+    if len(s) == 0:
+        return z_c, phi, k, is_catenary
+
+    def sse(z_c, phi, k):
+        residual = z - catenary_z(s, z_c[group], phi[group], k[group])
+        return _group_sum(residual ** 2, group, n_groups)
+
+    current = sse(z_c, phi, k)
+    for _ in range(iterations):
+        g = k[group] * s + phi[group]
+        kk = k[group]
+        residual = z - catenary_z(s, z_c[group], phi[group], kk)
+        d_phi = (np.sinh(g) - np.sinh(phi[group])) / kk
+        d_k = s * np.sinh(g) / kk - (np.cosh(g) - np.cosh(phi[group])) / kk ** 2
+        step = _normal_equations((np.ones_like(s), d_phi, d_k), residual, group, n_groups)
+
+        # Accept the step only where it keeps a sagging curve and lowers the error
+        new_z_c, new_phi, new_k = z_c + step[:, 0], phi + step[:, 1], k + step[:, 2]
+        valid = is_catenary & (new_k > CATENARY_MIN_CURVATURE)
+        new_k = np.where(valid, new_k, k)
+        with np.errstate(over='ignore', invalid='ignore'):
+            candidate = sse(new_z_c, new_phi, new_k)
+        better = valid & (candidate < current)
+        if not better.any():
+            break
+        z_c = np.where(better, new_z_c, z_c)
+        phi = np.where(better, new_phi, phi)
+        k = np.where(better, new_k, k)
+        current = np.where(better, candidate, current)
+
+    return z_c, phi, k, is_catenary
+
+def fit_spans(points, labels, ground=None, max_vertices=WIRE_LINE_VERTICES, stations=SPAN_STATIONS):
+    """
+    Axis, curve and quality metrics of every labelled wire cluster
+
+    Args:
+        points: (N, 3) wire points
+        labels: (N,) cluster labels, -1 for noise
+        ground: Optional GroundModel, for clearance above ground
+        max_vertices: Maximum vertices per output line
+        stations: Curve stations per span for sag and clearance
+
+    Returns:
+        spans: dict of (S,) arrays - label, point_count, length_m, width_m,
+               aspect_ratio, min_height_m, max_height_m, avg_height_m,
+               sag_m, clearance_m (NaN without ground), catenary_a_m (NaN
+               for parabola spans), fit_rmse_m, is_catenary - plus
+               line_coordinates: list of (V, 2) point positions ordered
+               along each span's axis
+    """
+    points = np.asarray(points, dtype=np.float64)
+    labels = np.asarray(labels)
+    keep = labels >= 0
+    span_labels, group = np.unique(labels[keep], return_inverse=True)
+    n_spans = len(span_labels)
+    points = points[keep]
+    if n_spans == 0:
+        empty = np.zeros(0)
+        return {"label": span_labels, "point_count": np.zeros(0, dtype=np.int64), "length_m": empty,
+                "width_m": empty, "aspect_ratio": empty, "min_height_m": empty, "max_height_m": empty,
+                "avg_height_m": empty, "sag_m": empty, "clearance_m": empty, "catenary_a_m": empty,
+                "fit_rmse_m": empty, "is_catenary": np.zeros(0, dtype=bool), "line_coordinates": []}
+
+    counts = np.bincount(group, minlength=n_spans)
+    centroid = np.column_stack([_group_sum(points[:, i], group, n_spans) for i in range(3)]) / counts[:, None]
+
+    # Principal axis from the grouped 2x2 covariance
+    dx, dy = (points[:, :2] - centroid[group, :2]).T
+    sxx = _group_sum(dx * dx, group, n_spans)
+    sxy = _group_sum(dx * dy, group, n_spans)
+    syy = _group_sum(dy * dy, group, n_spans)
+    angle = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    direction = np.column_stack((np.cos(angle), np.sin(angle)))
+
+    t = dx * direction[group, 0] + dy * direction[group, 1]
+    w = dy * direction[group, 0] - dx * direction[group, 1]
+
+    # Points ordered by span, then along the axis
+    order = np.lexsort((t, group))
+    starts = np.cumsum(counts) - counts
+    t_sorted = t[order]
+    t_min, t_max = t_sorted[starts], t_sorted[starts + counts - 1]
+    w_sorted = w[order]
+    width = np.maximum.reduceat(w_sorted, starts) - np.minimum.reduceat(w_sorted, starts)
+    length = t_max - t_min
+    z_sorted = points[order, 2]
+
+    # Parabola in positions relative to the span middle, scaled to [-1, 1]
+    middle = 0.5 * (t_min + t_max)
+    half = np.maximum(0.5 * length, 1e-6)
+    s = t - middle[group]
+    u = s / half[group]
+    p = _normal_equations((np.ones_like(u), u, u * u), points[:, 2], group, n_spans)
+    parabola = np.column_stack((p[:, 0], p[:, 1] / half, p[:, 2] / half ** 2))
+
+    z_c, phi, k, is_catenary = fit_catenaries(s, points[:, 2], group, n_spans, parabola)
+    fit = {"parabola": parabola, "z_c": z_c, "phi": phi, "k": k, "is_catenary": is_catenary}
+
+    residual = points[:, 2] - _curve_z(s, group, fit)
+    rmse = np.sqrt(_group_sum(residual ** 2, group, n_spans) / counts)
+
+    # Curve stations: sag below the chord, clearance above ground
+    fraction = np.linspace(0.0, 1.0, stations)
+    station_group = np.repeat(np.arange(n_spans), stations)
+    station_s = np.repeat(t_min - middle, stations) + np.tile(fraction, n_spans) * np.repeat(length, stations)
+    station_z = _curve_z(station_s, station_group, fit).reshape(n_spans, stations)
+    chord = station_z[:, :1] + fraction * (station_z[:, -1:] - station_z[:, :1])
+    sag = np.maximum((chord - station_z).max(axis=1), 0.0)
+
+    clearance = np.full(n_spans, np.nan)
+    if ground is not None:
+        station_t = station_s + np.repeat(middle, stations)
+        station_xy = np.repeat(centroid[:, :2], stations, axis=0) + station_t[:, None] * np.repeat(direction, stations, axis=0)
+        above = station_z.ravel() - ground.ground_z(station_xy)
+        clearance = above.reshape(n_spans, stations).min(axis=1)
+
+    # Up to max_vertices points per span, evenly spaced along the axis order
+    n_vertices = np.minimum(counts, max_vertices)
+    vertex_span = np.repeat(np.arange(n_spans), n_vertices)
+    rank = np.arange(n_vertices.sum()) - np.repeat(np.cumsum(n_vertices) - n_vertices, n_vertices)
+    local = rank * (counts[vertex_span] - 1) // np.maximum(n_vertices[vertex_span] - 1, 1)
+    vertices = points[order[starts[vertex_span] + local], :2]
+
+    with np.errstate(divide='ignore'):
+        catenary_a = np.where(is_catenary, 1.0 / k, np.nan)
+
+    return {
+        "label": span_labels,
+        "point_count": counts,
+        "length_m": length,
+        "width_m": width,
+        "aspect_ratio": length / np.maximum(width, WIRE_MIN_WIDTH),
+        "min_height_m": np.minimum.reduceat(z_sorted, starts),
+        "max_height_m": np.maximum.reduceat(z_sorted, starts),
+        "avg_height_m": centroid[:, 2],
+        "sag_m": sag,
+        "clearance_m": clearance,
+        "catenary_a_m": catenary_a,
+        "fit_rmse_m": rmse,
+        "is_catenary": is_catenary,
+        "line_coordinates": np.split(vertices, np.cumsum(n_vertices)[:-1]),
+    }
+
+def _rounded(value):
+    """JSON value of a metric: rounded float, None for NaN"""
+    return None if np.isnan(value) else round(float(value), 2)
+
+def wire_line_features(spans, chunk_name):
+    """
+    GeoJSON LineString features (11_Wires_lines.geojson schema) of the spans
+    that pass the wire quality filters
+    """
+    features = []
+    for i in range(len(spans["label"])):
+        point_count = int(spans["point_count"][i])
+        length = float(spans["length_m"][i])
+        aspect_ratio = float(spans["aspect_ratio"][i])
+        print(f"  ⚡ Wire line {i+1}: {point_count} points")
+
+        if point_count < WIRE_MIN_POINTS:
+            print(f"    ❌ Too few points: {point_count} (need ≥{WIRE_MIN_POINTS})")
+            continue
+
+        if length < WIRE_MIN_LENGTH:
+            print(f"    ❌ Line too short: {length:.1f}m (need ≥{WIRE_MIN_LENGTH:.0f}m)")
+            continue
+
+        if aspect_ratio < WIRE_MIN_ASPECT:
+            print(f"    ❌ Not linear enough: {aspect_ratio:.1f}:1 (need ≥{WIRE_MIN_ASPECT:.0f}:1)")
+            continue
+
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": spans["line_coordinates"][i].tolist()
+            },
+            "properties": {
+                "line_id": len(features) + 1,
+                "class": "11_Wires",
+                "chunk": chunk_name,
+                "length_m": round(length, 2),
+                "width_m": round(float(spans["width_m"][i]), 2),
+                "point_count": point_count,
+                "aspect_ratio": round(aspect_ratio, 2),
+                "min_height_m": round(float(spans["min_height_m"][i]), 2),
+                "max_height_m": round(float(spans["max_height_m"][i]), 2),
+                "avg_height_m": round(float(spans["avg_height_m"][i]), 2),
+                "sag_m": round(float(spans["sag_m"][i]), 2),
+                "clearance_m": _rounded(spans["clearance_m"][i]),
+                "catenary_a_m": _rounded(spans["catenary_a_m"][i]),
+                "fit_model": "catenary" if spans["is_catenary"][i] else "parabola",
+                "fit_rmse_m": round(float(spans["fit_rmse_m"][i]), 3),
+                "extraction_method": "python_wire_enhanced"
+            }
+        })
+
+        print(f"    ✅ Wire line {len(features)}: {length:.1f}m long, {aspect_ratio:.1f}:1 ratio, "
+              f"sag {spans['sag_m'][i]:.2f}m")
+
+    return features